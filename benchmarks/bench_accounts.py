@@ -0,0 +1,79 @@
+"""
+Reprices several accounts holding the same inventory against the local warframe.market stand-in,
+once account by account and once with the order books shared between them
+
+Usage: python -m benchmarks.bench_accounts [--accounts 3] [--size 50] [--latency 0.05]
+"""
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+from benchmarks.bench_reprice import make_inventory
+from benchmarks.fake_market import FakeMarket
+from database import google_sheets
+from database.local import ItemCatalogue
+from database.price_cache import PriceCache
+from database.price_history import PriceHistory
+from main import Account, reprice, reprice_accounts
+from warframe_market.client import MarketClient, set_client
+from warframe_market.governor import RateGovernor
+
+
+def run_once(args: argparse.Namespace, accounts: list[Account], shared: bool) -> None:
+    with FakeMarket(latency=args.latency, accounts={account.email: account.profile for account in accounts}) \
+            as market, tempfile.TemporaryDirectory() as workdir:
+        set_client(MarketClient(market.base_url, token_cache=None, governor=RateGovernor()))
+        for account in accounts:
+            google_sheets._snapshots[account.sheet] = {
+                'sheet': account.sheet,
+                'spreadsheet_id': account.sheet,
+                'modified_time': '',
+                'fetched_at': time.time(),
+                'ranges': make_inventory(args.size),
+            }
+        price_caches = {account.profile: PriceCache(os.path.join(workdir, f'{account.profile}.sqlite'))
+                        for account in accounts}
+        history = PriceHistory(os.path.join(workdir, 'history'))
+        catalogue = ItemCatalogue(os.path.join(workdir, 'items.db'))
+
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            if shared:
+                reprice_accounts(accounts, price_caches, price_history=history, catalogue=catalogue)
+            else:
+                for account in accounts:
+                    reprice(account.email, account.password, account.profile, account.num,
+                            price_cache=price_caches[account.profile], price_history=history,
+                            catalogue=catalogue, sheet=account.sheet)
+        elapsed = time.perf_counter() - start
+
+        listed = {account.profile: 0 for account in accounts}
+        for order in market.orders.values():
+            listed[order['user']['ingame_name']] += 1
+        mutations = sum(market.counts[name] for name in ('create_order', 'update_order', 'delete_order'))
+        print(f'{"shared" if shared else "separate":>9} {elapsed:>8.2f}s {market.counts["item_orders"]:>12} '
+              f'{market.counts["item"]:>9} {mutations:>10} {sum(market.counts.values()):>9}  '
+              + ', '.join(f'{profile}={count}' for profile, count in listed.items()))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Multi-account repricing benchmark')
+    parser.add_argument('--accounts', type=int, default=3, help='Number of accounts')
+    parser.add_argument('--size', type=int, default=50, help='Sellable items per account')
+    parser.add_argument('--num', type=int, default=20, help='Number of orders to keep listed per account')
+    parser.add_argument('--latency', type=float, default=0.05, help='Seconds the stand-in adds to every response')
+    args = parser.parse_args()
+
+    accounts = [Account(f'bench{number}@example.com', 'password', f'Benchmark{number}', f'Bench sheet {number}',
+                        args.num) for number in range(args.accounts)]
+    print(f'{"books":>9} {"wall":>9} {"item_orders":>12} {"item_ids":>9} {"mutations":>10} {"requests":>9}  '
+          f'listed per profile')
+    for shared in (False, True):
+        run_once(args, accounts, shared)
+
+
+if __name__ == '__main__':
+    main()
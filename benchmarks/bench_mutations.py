@@ -0,0 +1,86 @@
+"""
+Replaces a full set of listings on the local warframe.market stand-in, sending the mutations
+one at a time and through the concurrent pipeline, with some of them failing with server errors
+
+Usage: python -m benchmarks.bench_mutations [--orders 100] [--latency 0.05] [--error-rate 0.1] [--concurrency 1 4 8]
+                                            [--fail-after]
+"""
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+from collections import Counter
+
+from benchmarks.fake_market import FakeMarket, item_id_for
+from database.local import ItemCatalogue
+from database.reconcile import OrderUpdate, ReconciliationPlan, apply_reconciliation
+from warframe_market import warframe_market
+from warframe_market.client import MarketClient, set_client
+from warframe_market.governor import RateGovernor
+
+PROFILE = 'Benchmark'
+
+
+def make_plan(market: FakeMarket, orders: int) -> ReconciliationPlan:
+    """
+    Lists `orders` items, then plans to delete half of them, reprice the rest and list as many new items
+    """
+
+    for number in range(orders):
+        item = f'bench_old_{number:04d}'
+        market.items[item_id_for(item)] = item
+        market.handle('create_order', {}, {'item_id': item_id_for(item), 'platinum': 10, 'quantity': 1},
+                      PROFILE)
+    existing = warframe_market.get_existing_orders(PROFILE)
+
+    plan = ReconciliationPlan()
+    plan.to_delete = existing[:orders // 2]
+    plan.to_update = [OrderUpdate(order, order.platinum + 5, 2) for order in existing[orders // 2:]]
+    plan.to_create = [[f'bench_new_{number:04d}', 20, 1] for number in range(orders // 2)]
+    return plan
+
+
+def run_once(args: argparse.Namespace, concurrency: int, workdir: str) -> None:
+    with FakeMarket(latency=args.latency, error_rate=args.error_rate, fail_after=args.fail_after) as market:
+        set_client(MarketClient(market.base_url, token_cache=None, governor=RateGovernor()))
+        token = warframe_market.login_to_warframe_market('bench@example.com', 'password')
+        plan = make_plan(market, args.orders)
+        catalogue = ItemCatalogue(os.path.join(workdir, f'items_{concurrency}.db'))
+        for item, _, _ in plan.to_create:
+            catalogue.add(item, item_id_for(item))
+            market.items[item_id_for(item)] = item
+
+        market.reset_counts()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            report = apply_reconciliation(token, plan, catalogue, concurrency=concurrency, profile=PROFILE)
+        elapsed = time.perf_counter() - start
+
+        listed = sum(order['platinum'] != 10 for order in market.orders.values())
+        created = Counter(order['item']['url_name'] for order in market.orders.values() if order['platinum'] == 20)
+        print(f'{concurrency:>11} {elapsed:>8.2f}s {len(report.succeeded):>9} {len(report.failed):>6} '
+              f'{sum(result.attempts - 1 for result in report.results):>7} {market.counts["500"]:>5} '
+              f'{listed:>7}/{args.orders} {sum(count - 1 for count in created.values()):>10}')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Order mutation pipeline benchmark')
+    parser.add_argument('--orders', type=int, default=100, help='Number of listings to replace')
+    parser.add_argument('--latency', type=float, default=0.05, help='Seconds the stand-in adds to every response')
+    parser.add_argument('--error-rate', type=float, default=0.1, help='Share of mutations answering 500')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8], help='Mutations in flight')
+    parser.add_argument('--fail-after', action='store_true',
+                        help='Failing mutations are applied before the 500 (creates must not be sent twice)')
+    args = parser.parse_args()
+
+    print(f'{"concurrency":>11} {"time":>9} {"succeeded":>9} {"failed":>6} {"retries":>7} {"500s":>5} '
+          f'{"listed":>11} {"duplicates":>10}')
+    with tempfile.TemporaryDirectory() as workdir:
+        for concurrency in args.concurrency:
+            run_once(args, concurrency, workdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+Compares the full-decode order-book path with the streaming parser
+
+Usage: python -m benchmarks.bench_order_parser
+"""
+import json
+import random
+import time
+import tracemalloc
+
+from warframe_market.order_stream import CHUNK_SIZE, lowest_sell_price
+
+PROFILE = 'Kaeriyana'
+SIZES = [1_000, 10_000, 100_000]
+STATUSES = ['ingame', 'online', 'offline']
+
+
+def make_order_book(size: int, seed: int = 0) -> bytes:
+    """
+    Builds a synthetic /items/{item}/orders response with the same shape as warframe.market
+
+    Args:
+        size (int): Number of orders
+        seed (int): Random seed
+
+    Returns:
+        bytes: JSON response body
+    """
+
+    rng = random.Random(seed)
+    orders = []
+    for number in range(size):
+        orders.append({
+            'platinum': rng.randint(1, 500),
+            'quantity': rng.randint(1, 20),
+            'order_type': rng.choice(['sell', 'buy']),
+            'user': {
+                'reputation': rng.randint(0, 500),
+                'locale': 'en',
+                'avatar': None,
+                'last_seen': '2022-01-30T12:00:00.000+00:00',
+                'ingame_name': PROFILE if number % 50 == 0 else f'Trader{number}',
+                'id': f'{number:024x}',
+                'region': 'en',
+                'status': rng.choice(STATUSES),
+            },
+            'platform': 'pc',
+            'region': 'en',
+            'creation_date': '2022-01-30T12:00:00.000+00:00',
+            'last_update': '2022-01-30T12:00:00.000+00:00',
+            'visible': True,
+            'id': f'{number + size:024x}',
+        })
+    return json.dumps({'payload': {'orders': orders}}).encode()
+
+
+def chunked(body: bytes, size: int = CHUNK_SIZE):
+    for start in range(0, len(body), size):
+        yield body[start:start + size]
+
+
+def full_decode(chunks, profile: str) -> int:
+    """
+    The previous implementation: read the whole body, decode it, then scan for the minimum
+    """
+
+    data = json.loads(b''.join(chunks))
+    lowest_price = None
+    for order in data['payload']['orders']:
+        if order['order_type'] == 'sell' \
+                and order['user']['status'] == 'ingame' \
+                and order['user']['ingame_name'] != profile:
+            price = int(order['platinum'])
+            if lowest_price is None or price < lowest_price:
+                lowest_price = price
+    return lowest_price
+
+
+def measure(parser, body: bytes, repeat: int = 3) -> tuple[int, float, int]:
+    """
+    Returns the result, the best wall time and the peak memory of a parser
+    Memory is traced in a separate run so tracing does not skew the timings
+    """
+
+    elapsed = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = parser(chunked(body), PROFILE)
+        elapsed = min(elapsed, time.perf_counter() - start)
+
+    tracemalloc.start()
+    parser(chunked(body), PROFILE)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main() -> None:
+    print(f'{"orders":>8} {"body":>9} {"parser":>10} {"time":>10} {"peak memory":>12}')
+    for size in SIZES:
+        body = make_order_book(size)
+        results = set()
+        for name, parser in (('full', full_decode), ('streaming', lowest_sell_price)):
+            result, elapsed, peak = measure(parser, body)
+            results.add(result)
+            print(f'{size:>8} {len(body) / 1e6:>7.1f}MB {name:>10} {elapsed * 1000:>8.1f}ms {peak / 1e6:>10.2f}MB')
+        assert len(results) == 1, f'Parsers disagree: {results}'
+
+
+if __name__ == '__main__':
+    main()
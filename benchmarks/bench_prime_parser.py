@@ -0,0 +1,110 @@
+"""
+Compares answering the three Prime worksheet queries by reparsing the rows for each query
+with deriving them from the one-pass part table
+
+Usage: python -m benchmarks.bench_prime_parser [--sizes 1000 10000 100000]
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+from database.google_sheets import PRIME_COLUMNS, PRIME_PART_COLUMNS, PRIME_STATUS_COLUMN, parse_prime_parts
+
+SIZES = [1_000, 10_000, 100_000]
+PARTS = ['Blueprint', 'Chassis', 'Systems', 'Neuroptics', 'Barrel', 'Receiver', 'Stock', 'Upper Limb']
+STATUSES = ['YES', 'BUILD', 'NO', '']
+
+
+def make_rows(size: int, seed: int = 0) -> list[list[str]]:
+    """
+    Builds a synthetic Prime range with the same layout as the worksheet
+
+    Args:
+        size (int): Number of rows (prime sets)
+        seed (int): Random seed
+
+    Returns:
+        list[list[str]]: Rows as returned by the Sheets API
+    """
+
+    rng = random.Random(seed)
+    rows = []
+    for number in range(size):
+        row = [f'Bench Set {number}'] + [''] * (PRIME_COLUMNS - 1)
+        for column in PRIME_PART_COLUMNS:
+            if column == PRIME_PART_COLUMNS[0] or rng.random() < 0.75:
+                row[column] = rng.choice(PARTS)
+                row[column + 1] = str(rng.choice([0, 0, 1, 2, 5]))
+        row[PRIME_STATUS_COLUMN] = rng.choice(STATUSES)
+        rows.append(row)
+    return rows
+
+
+def per_query(rows: list[list[str]]) -> tuple[list[str], dict[str, int], list[str]]:
+    """
+    The previous implementation: every query walks the rows and builds the part names again
+    """
+
+    def names(include):
+        for row in rows:
+            base_name = row[0].replace(' ', '_')
+            for column in PRIME_PART_COLUMNS:
+                quantity = int(row[column + 1]) if len(row[column + 1]) else 0
+                if len(row[column]) and include(row, quantity):
+                    yield f'{base_name}_prime_{row[column].replace(" ", "_")}'.lower(), quantity
+
+    all_items = [name for name, _ in names(lambda row, quantity: True)]
+    to_sell = dict(names(lambda row, quantity: row[PRIME_STATUS_COLUMN] != 'BUILD' and quantity > 0))
+    to_buy = [name for name, _ in names(lambda row, quantity: row[PRIME_STATUS_COLUMN] != 'YES' and quantity == 0)]
+    return all_items, to_sell, to_buy
+
+
+def from_table(rows: list[list[str]], parts: list = None) -> tuple[list[str], dict[str, int], list[str]]:
+    """
+    Parses the rows once (unless a parsed table is passed) and derives the three queries from it
+    """
+
+    parts = parts if parts is not None else parse_prime_parts(rows)
+    all_items = [part.name for part in parts]
+    to_sell = {part.name: part.quantity for part in parts
+               if part.status != 'BUILD' and part.quantity is not None and part.quantity > 0}
+    to_buy = [part.name for part in parts if part.status != 'YES' and part.quantity == 0]
+    return all_items, to_sell, to_buy
+
+
+def best_time(function, repeat: int = 3) -> float:
+    elapsed = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = min(elapsed, time.perf_counter() - start)
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Prime worksheet parser benchmark')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help='Numbers of rows to run')
+    args = parser.parse_args()
+
+    print(f'{"rows":>8} {"parts":>8} {"per query":>10} {"table":>10} {"cached":>10} {"table memory":>13}')
+    for size in args.sizes:
+        rows = make_rows(size)
+
+        tracemalloc.start()
+        parts = parse_prime_parts(rows)
+        table_memory, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        assert per_query(rows) == from_table(rows), 'Parsers disagree'
+        timings = (
+            best_time(lambda: per_query(rows)),
+            best_time(lambda: from_table(rows)),
+            best_time(lambda: from_table(rows, parts)),
+        )
+        print(f'{size:>8} {len(parts):>8} ' + ' '.join(f'{elapsed * 1000:>8.1f}ms' for elapsed in timings) +
+              f' {table_memory / 1e6:>11.2f}MB')
+
+
+if __name__ == '__main__':
+    main()
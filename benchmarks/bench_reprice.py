@@ -0,0 +1,141 @@
+"""
+Runs the main.py repricing workflow end to end against the local warframe.market stand-in
+Google Sheets is replaced by a synthetic in-memory inventory snapshot
+
+Usage: python -m benchmarks.bench_reprice [--sizes 20 50 100] [--latency 0.05] [--rate-limit 3] [--live-feed]
+                                          [--incremental] [--later 2700]
+"""
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.fake_feed import FeedServer, synthetic_events
+from benchmarks.fake_market import MAX_MOD_RANK, MOD_PREFIX, FakeMarket
+from database import google_sheets
+from database.google_sheets import get_items_to_sell, get_mods_to_sell, get_prime_items_to_sell
+from database.local import ItemCatalogue
+from database.price_cache import DEFAULT_TTL, PriceCache
+from database.price_history import PriceHistory
+from database.reprice_state import RepriceState
+from main import reprice
+from warframe_market.client import MarketClient, set_client
+from warframe_market.order_stream import split_ranked_item
+
+PROFILE = 'Benchmark'
+SIZES = [20, 50, 100]
+
+
+def make_inventory(size: int) -> dict[str, list[list[str]]]:
+    """
+    Builds inventory ranges holding `size` sellable items: half prime parts, a tenth mods and the rest standard items
+
+    Args:
+        size (int): Number of sellable items
+
+    Returns:
+        dict[str, list[list[str]]]: Rows per range, as returned by load_inventory_snapshot
+    """
+
+    mods = size // 10
+    standard = size // 2 - mods
+    items = [[f'bench_item_{number:04d}', str(number % 5 + 1)] for number in range(standard)]
+    # Each mod is held at two ranks, which are priced from one order book
+    mod_rows = [[f'{MOD_PREFIX}{number // 2:04d}', '1', str(number % 2 * MAX_MOD_RANK)] for number in range(mods)]
+
+    prime = []
+    for number in range((size - standard - mods + 2) // 3):
+        prime.append([f'Bench{number:04d}', 'Blueprint', '1', '', 'Chassis', '2', '', 'Systems', '1', '',
+                      'Neuroptics', '0', '', '', '', '', 'YES', ''])
+
+    return {
+        google_sheets.INVENTORY_RANGES[0]: prime,
+        google_sheets.INVENTORY_RANGES[1]: items,
+        google_sheets.INVENTORY_RANGES[2]: mod_rows,
+    }
+
+
+def age_run(state: RepriceState, inventory: dict[str, list[list[str]]], seconds: float, changes: int = 3) -> None:
+    """
+    Makes the recorded run look `seconds` older and changes the quantity of a few standard items in the sheet
+    """
+
+    for entry in state.prices.values():
+        entry[1] -= seconds
+    for row in inventory[google_sheets.INVENTORY_RANGES[1]][:changes]:
+        row[1] = str(int(row[1]) + 1)
+
+
+def run_once(market: FakeMarket, workdir: str, num: int, live_feed: str = None, state: RepriceState = None,
+             incremental: bool = False, ttl: float = DEFAULT_TTL) -> tuple[float, int]:
+    market.reset_counts()
+    tracemalloc.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        reprice('bench@example.com', 'password', PROFILE, num,
+                price_cache=PriceCache(os.path.join(workdir, 'price_cache.sqlite'), ttl=ttl),
+                price_history=PriceHistory(os.path.join(workdir, 'history')),
+                catalogue=ItemCatalogue(os.path.join(workdir, 'items.db')), live_feed=live_feed,
+                state=state, incremental=incremental)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='End-to-end repricing benchmark')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help='Inventory sizes to run')
+    parser.add_argument('--num', type=int, default=20, help='Number of orders to keep listed')
+    parser.add_argument('--latency', type=float, default=0.05, help='Seconds the stand-in adds to every response')
+    parser.add_argument('--rate-limit', type=float, default=None, help='Requests per second allowed by the stand-in')
+    parser.add_argument('--book-size', type=int, default=200, help='Orders per item order book')
+    parser.add_argument('--live-feed', action='store_true', help='Serve order books from a local live feed')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Only price the items that may have changed since the previous run')
+    parser.add_argument('--later', type=float, default=45 * 60,
+                        help='Seconds between the warm run and the last one (the price cache has expired by then)')
+    args = parser.parse_args()
+
+    print(f'{"items":>6} {"run":>5} {"wall":>8} {"requests":>9} {"429s":>5} {"peak memory":>12}  per endpoint')
+    for size in args.sizes:
+        with FakeMarket(latency=args.latency, rate_limit=args.rate_limit, book_size=args.book_size,
+                        profile=PROFILE) as market, tempfile.TemporaryDirectory() as workdir:
+            set_client(MarketClient(market.base_url, token_cache=os.path.join(workdir, 'token.json')))
+            inventory = make_inventory(size)
+            google_sheets._snapshots[google_sheets.SHEET] = {
+                'sheet': google_sheets.SHEET,
+                'spreadsheet_id': 'benchmark',
+                'modified_time': '',
+                'fetched_at': time.time(),
+                'ranges': inventory,
+            }
+            state = RepriceState()
+            feed = None
+            if args.live_feed:
+                inventory = get_items_to_sell() | get_prime_items_to_sell() | get_mods_to_sell()
+                items = list({split_ranked_item(item)[0] for item in inventory})
+                feed = FeedServer(synthetic_events(items, 0, book_size=args.book_size)).start()
+            live_feed = ':'.join(map(str, feed.address)) if feed is not None else None
+
+            # The second run starts with a warm price cache, token and catalogue, and existing orders.
+            # The last one comes `later` seconds after: the price cache expired and a few quantities changed
+            for run in ('cold', 'warm', 'later'):
+                if run == 'later':
+                    age_run(state, inventory, args.later)
+                elapsed, peak = run_once(market, workdir, args.num, live_feed, state, args.incremental,
+                                         0 if run == 'later' else DEFAULT_TTL)
+                counts = dict(market.counts)
+                rejected = counts.pop('429', 0)
+                endpoints = ', '.join(f'{endpoint}={count}' for endpoint, count in sorted(counts.items()))
+                print(f'{size:>6} {run:>5} {elapsed:>7.2f}s {sum(counts.values()):>9} {rejected:>5} '
+                      f'{peak / 1e6:>10.2f}MB  {endpoints}')
+            if feed is not None:
+                feed.stop()
+
+
+if __name__ == '__main__':
+    main()
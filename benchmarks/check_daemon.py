@@ -0,0 +1,108 @@
+"""
+Runs the repricing daemon against the local warframe.market stand-in and checks that once every item has been
+priced, our orders on the market are exactly the best deals, also when items leave the sheet before their first check
+
+Usage: python -m benchmarks.check_daemon [--size 30] [--num 10] [--duration 3]
+"""
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+from benchmarks.bench_reprice import make_inventory
+from benchmarks.fake_market import FakeMarket
+from daemon import RepricingDaemon, RequestBudget
+from database import google_sheets
+from database.local import ItemCatalogue
+from database.price_history import PriceHistory
+from warframe_market.client import MarketClient, set_client
+from warframe_market.order_stream import ranked_item
+from warframe_market.warframe_market import set_sleeps_enabled
+
+PROFILE = 'Benchmark'
+CHECK_INTERVAL = 0.05  # Seconds between two checks of the same item
+
+
+class SheetEditingDaemon(RepricingDaemon):
+    """
+    Daemon whose sheet loses its first rows right after start-up, before any item is checked
+    """
+
+    def __init__(self, *args, removed: int = 0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.removed = removed
+
+    def start(self) -> None:
+        super().start()
+        if self.removed:
+            ranges = google_sheets._snapshots[google_sheets.SHEET]['ranges']
+            for name in google_sheets.INVENTORY_RANGES[1:]:
+                del ranges[name][:self.removed]
+            self.refresh_inventory()
+
+
+def listed_orders(market: FakeMarket) -> dict[str, tuple[int, int]]:
+    return {(order['item']['url_name'] if order['mod_rank'] is None
+             else ranked_item(order['item']['url_name'], order['mod_rank'])): (order['platinum'], order['quantity'])
+            for order in market.orders.values() if order['user']['ingame_name'] == PROFILE}
+
+
+def run_case(args: argparse.Namespace, removed: int) -> list[str]:
+    with FakeMarket(profile=PROFILE) as market, tempfile.TemporaryDirectory() as workdir:
+        set_client(MarketClient(market.base_url, token_cache=None))
+        google_sheets._snapshots[google_sheets.SHEET] = {
+            'sheet': google_sheets.SHEET,
+            'spreadsheet_id': 'check',
+            'modified_time': '',
+            'fetched_at': time.time(),
+            'ranges': make_inventory(args.size),
+        }
+        daemon = SheetEditingDaemon('check@example.com', 'password', PROFILE, num=args.num,
+                                    budget=RequestBudget(per_minute=10 ** 6),
+                                    history=PriceHistory(os.path.join(workdir, 'history')),
+                                    catalogue=ItemCatalogue(os.path.join(workdir, 'items.db')),
+                                    min_interval=CHECK_INTERVAL, max_interval=CHECK_INTERVAL, removed=removed)
+        with contextlib.redirect_stdout(io.StringIO()):
+            daemon.run(args.duration)
+
+        problems = []
+        if daemon._unpriced:
+            problems.append(f'{len(daemon._unpriced)} items still hold the orders back: {sorted(daemon._unpriced)}')
+        unpriced = set(daemon.inventory) - set(daemon.prices)
+        if unpriced:
+            problems.append(f'{len(unpriced)} items were never priced: {sorted(unpriced)}')
+        wanted = {item: (int(price), int(quantity)) for item, price, quantity in daemon.best_deals()}
+        if not wanted:
+            problems.append('no deals to list')
+        listed = listed_orders(market)
+        if listed != wanted:
+            problems.append(f'orders on the market do not match the best deals: {listed} != {wanted}')
+        return problems
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Repricing daemon check')
+    parser.add_argument('--size', type=int, default=30, help='Sellable items in the sheet')
+    parser.add_argument('--num', type=int, default=10, help='Number of orders to keep listed')
+    parser.add_argument('--duration', type=float, default=3, help='Seconds each daemon runs')
+    args = parser.parse_args()
+
+    # The stand-in is not rate limited and the daemon keeps to its own budget
+    set_sleeps_enabled(False)
+    failures = 0
+    cases = {'steady sheet': 0, 'rows removed before the first check': 2}
+    for name, removed in cases.items():
+        problems = run_case(args, removed)
+        if problems:
+            failures += 1
+            print(f'{name}: {"; ".join(problems)}')
+
+    print(f'{len(cases)} daemon runs checked, {failures} failures')
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Checks that order-book snapshots answer like the streaming summaries (summarize_sell_orders and
+summarize_sell_orders_by_rank) and like brute-force queries over the decoded orders, for several profiles
+
+Usage: python -m benchmarks.check_order_books [--books 60] [--seed 0]
+"""
+import argparse
+import json
+import random
+
+from warframe_market.order_books import STATUSES, OrderBookSnapshot
+from warframe_market.order_stream import summarize_sell_orders, summarize_sell_orders_by_rank
+
+PROFILES = ['Ours0', 'Ours1', 'Ours2']
+STATUS_FILTERS = [('ingame',), ('ingame', 'online'), None]
+
+
+def make_orders(rng: random.Random) -> list[dict]:
+    """
+    Builds the orders of a synthetic book: both sides, every status, mod ranks, repeated prices and our own orders
+    """
+
+    orders = []
+    for number in range(rng.choice([0, 1, 5, 40, 300])):
+        seller = rng.choice(PROFILES) if rng.random() < 0.15 else f'Trader{rng.randint(0, 60)}'
+        order = {
+            'platinum': rng.randint(1, 40),
+            'quantity': rng.randint(1, 9),
+            'order_type': rng.choice(['sell', 'sell', 'buy']),
+            'user': {'ingame_name': seller, 'status': rng.choice(STATUSES)},
+            'id': f'{number:024x}',
+        }
+        if rng.random() < 0.5:
+            order['mod_rank'] = rng.choice([0, 5, 10])
+        orders.append(order)
+    return orders
+
+
+def matching(orders: list[dict], side: str, profile: str, rank: int, statuses: tuple[str, ...]) -> list[dict]:
+    return [order for order in orders
+            if order['order_type'] == side
+            and order['user']['ingame_name'] != profile
+            and (statuses is None or order['user']['status'] in statuses)
+            and (rank is None or int(order.get('mod_rank') or 0) == rank)]
+
+
+def check_book(orders: list[dict], book: OrderBookSnapshot, profile: str) -> list[str]:
+    problems = []
+    body = json.dumps({'payload': {'orders': orders}}).encode()
+    chunks = [body[start:start + 97] for start in range(0, len(body), 97)]
+    if book.summary(profile) != summarize_sell_orders(chunks, profile):
+        problems.append('summary differs from summarize_sell_orders')
+    if book.summaries_by_rank(profile) != summarize_sell_orders_by_rank(chunks, profile):
+        problems.append('summaries_by_rank differs from summarize_sell_orders_by_rank')
+
+    for rank in (None, 0, 5, 10):
+        for statuses in STATUS_FILTERS:
+            sells = sorted(matching(orders, 'sell', profile, rank, statuses), key=lambda order: order['platinum'])
+            buys = matching(orders, 'buy', profile, rank, statuses)
+            prices = [order['platinum'] for order in sells]
+            where = f'rank {rank}, statuses {statuses}'
+
+            for k in range(1, 5):
+                if book.kth_cheapest(k, profile, rank, statuses) != (prices[k - 1] if len(prices) >= k else None):
+                    problems.append(f'kth_cheapest({k}) ({where})')
+            bid = max((order['platinum'] for order in buys), default=None)
+            if book.highest_bid(profile, rank, statuses) != bid:
+                problems.append(f'highest_bid ({where})')
+            lowest = prices[0] if prices else None
+            spread = lowest - bid if lowest is not None and bid is not None else None
+            if book.spread(profile, rank, statuses) != spread:
+                problems.append(f'spread ({where})')
+            for price in {*prices[:3], 0, 20, 41}:
+                depth = sum(order['quantity'] for order in sells if order['platinum'] <= price)
+                if book.depth(price, profile, rank, statuses) != depth:
+                    problems.append(f'depth({price}) ({where})')
+
+            offer = book.cheapest_offer(profile, rank, statuses)
+            # Sellers tied at the lowest price may come in any order, the offer only has to be one of them
+            offers = {(order['user']['ingame_name'], order['platinum'], order['quantity'])
+                      for order in sells if order['platinum'] == lowest}
+            if (offer is None) != (lowest is None) or (offer is not None and offer not in offers):
+                problems.append(f'cheapest_offer ({where})')
+    return problems
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Order-book snapshot check')
+    parser.add_argument('--books', type=int, default=60, help='Number of synthetic order books')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    failures = 0
+    for number in range(args.books):
+        orders = make_orders(rng)
+        book = OrderBookSnapshot(orders)
+        for profile in [*PROFILES, None]:
+            problems = check_book(orders, book, profile)
+            if problems:
+                failures += 1
+                print(f'Book {number} ({len(orders)} orders) as {profile}: {"; ".join(problems)}')
+
+    print(f'{args.books} order books checked for {len(PROFILES)} profiles and without one, {failures} failures')
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Checks that the streaming order parser decodes exactly what json.loads does, wherever the response is split
+into chunks (inside keys, strings, numbers and multi-byte characters), and that truncated responses are rejected
+
+Usage: python -m benchmarks.check_order_stream [--books 20] [--seed 0]
+"""
+import argparse
+import json
+import random
+
+from benchmarks.bench_order_parser import make_order_book
+from warframe_market.order_stream import CHUNK_SIZE, iter_orders
+
+FIXED_CHUNK_SIZES = [1, 2, 3, 5, 7, 8, 13, 64, 1000, 4096, CHUNK_SIZE]
+NAMES = ['Tënno', 'Ordis "the" Cephalon', 'Лотос', '忍者🥷', 'back\\slash', 'orders']
+
+
+def make_books(count: int, seed: int) -> list[bytes]:
+    """
+    Builds response bodies of different sizes and layouts: compact, indented, empty and with unusual names
+    """
+
+    rng = random.Random(seed)
+    books = [json.dumps({'payload': {'orders': []}}).encode()]
+    for number in range(count):
+        body = json.loads(make_order_book(rng.randint(1, 60), seed + number))
+        for order in body['payload']['orders']:
+            if rng.random() < 0.3:
+                order['user']['ingame_name'] = rng.choice(NAMES)
+            if rng.random() < 0.3:
+                order['mod_rank'] = rng.randint(0, 10)
+        indent = rng.choice([None, 2, '\t'])
+        books.append(json.dumps(body, indent=indent, ensure_ascii=rng.random() < 0.5).encode())
+    return books
+
+
+def random_chunks(body: bytes, rng: random.Random) -> list[bytes]:
+    chunks = []
+    start = 0
+    while start < len(body):
+        size = rng.randint(1, 50)
+        chunks.append(body[start:start + size])
+        start += size
+    return chunks
+
+
+def fixed_chunks(body: bytes, size: int) -> list[bytes]:
+    return [body[start:start + size] for start in range(0, len(body), size)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Streaming order parser check')
+    parser.add_argument('--books', type=int, default=20, help='Number of synthetic order books')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    splits = failures = 0
+    for body in make_books(args.books, args.seed):
+        expected = json.loads(body)['payload']['orders']
+        layouts = [fixed_chunks(body, size) for size in FIXED_CHUNK_SIZES]
+        layouts += [random_chunks(body, rng) for _ in range(10)]
+        for chunks in layouts:
+            splits += 1
+            if list(iter_orders(chunks)) != expected:
+                failures += 1
+                print(f'Mismatch: {len(body)} byte body split into {len(chunks)} chunks')
+
+        # Cut before the closing bracket of the order list, so the response is incomplete
+        for cut in sorted(rng.sample(range(1, body.rindex(b']')), min(10, body.rindex(b']') - 1))):
+            splits += 1
+            try:
+                list(iter_orders(fixed_chunks(body[:cut], 7)))
+            except ValueError:
+                continue
+            failures += 1
+            print(f'Accepted a body truncated at {cut} of {len(body)} bytes')
+
+    print(f'{splits} splits of {args.books + 1} order books checked, {failures} failures')
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Checks plan_reconciliation on random sets of existing orders and wanted deals: applying the plan must leave
+exactly one order per deal at its price and quantity, and every order the plan touches must need it.
+Mods are listed per rank, while arcanes (rankable items held on the Items sheet) are matched whatever their rank
+
+Usage: python -m benchmarks.check_reconcile [--cases 2000] [--seed 0]
+"""
+import argparse
+import random
+from collections import Counter
+
+from database.reconcile import ReconciliationPlan, plan_reconciliation
+from warframe_market.order_stream import ranked_item
+from warframe_market.warframe_market import ExistingPrimeOrder
+
+ITEMS = [f'check_item_{number}' for number in range(12)]
+MODS = [f'check_mod_{number}' for number in range(4)]
+ARCANES = [f'check_arcane_{number}' for number in range(3)]
+
+
+def key_of(order: ExistingPrimeOrder) -> str:
+    """
+    Key of the deal an order stands for: mods by name and rank, everything else by name
+    """
+
+    return ranked_item(order.item_url, order.mod_rank) if order.item_url in MODS else order.item_url
+
+
+def make_case(rng: random.Random) -> tuple[list[ExistingPrimeOrder], list[list[str, int, int]]]:
+    """
+    Builds existing orders (some items listed twice, mods and arcanes at several ranks) and the deals we want listed
+    """
+
+    keys = ITEMS + ARCANES + [ranked_item(mod, rank) for mod in MODS for rank in (0, 3, 10)]
+    orders = []
+    for number in range(rng.randint(0, 25)):
+        key = rng.choice(keys)
+        item, _, rank = key.partition('@')
+        if item in ARCANES:
+            # warframe.market reports a rank for arcanes, which the Items sheet does not hold
+            rank = rng.choice(['0', '3', ''])
+        orders.append(ExistingPrimeOrder(f'{number:024x}', rng.randint(1, 3), rng.randint(5, 15), f'id_{item}', item,
+                                         mod_rank=int(rank) if rank else None))
+
+    deals = []
+    for key in rng.sample(keys, rng.randint(0, len(keys))):
+        listed = [order for order in orders if key_of(order) == key]
+        if listed and rng.random() < 0.5:
+            # Already listed at the wanted price and quantity
+            price, quantity = listed[0].platinum, listed[0].quantity
+        else:
+            price, quantity = rng.randint(5, 15), rng.randint(1, 3)
+        # Deals may carry prices and quantities read back as strings
+        deals.append([key, str(price) if rng.random() < 0.2 else price, quantity])
+    return orders, deals
+
+
+def check(orders: list[ExistingPrimeOrder], deals: list[list[str, int, int]], plan: ReconciliationPlan) -> list[str]:
+    problems = []
+    wanted = {key: (int(price), int(quantity)) for key, price, quantity in deals}
+
+    # Every existing order is either kept, updated or deleted, exactly once
+    handled = Counter(order.order_id for order in plan.unchanged + plan.to_delete)
+    handled.update(update.order.order_id for update in plan.to_update)
+    if handled != Counter(order.order_id for order in orders):
+        problems.append('existing orders are not each handled exactly once')
+
+    # Applying the plan leaves one order per deal, at its price and quantity
+    listed = {key_of(order): [(order.platinum, order.quantity)] for order in plan.unchanged}
+    for update in plan.to_update:
+        listed.setdefault(key_of(update.order), []).append((update.price, update.quantity))
+    for key, price, quantity in plan.to_create:
+        listed.setdefault(key, []).append((price, quantity))
+    if listed != {key: [value] for key, value in wanted.items()}:
+        problems.append(f'orders after the plan do not match the deals: {listed} != {wanted}')
+
+    # Nothing is touched without a reason
+    existing_keys = {key_of(order) for order in orders}
+    if any(key in existing_keys for key, _, _ in plan.to_create):
+        problems.append('an order is created for an item that is already listed')
+    if any((update.order.platinum, update.order.quantity) == (update.price, update.quantity)
+           for update in plan.to_update):
+        problems.append('an order is updated to the price and quantity it already has')
+    kept = {key_of(order) for order in plan.unchanged} | {key_of(update.order) for update in plan.to_update}
+    if any(key_of(order) in wanted and key_of(order) not in kept for order in plan.to_delete):
+        problems.append('the only order of a wanted item is deleted')
+    return problems
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Order reconciliation check')
+    parser.add_argument('--cases', type=int, default=2000, help='Number of random cases')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    failures = 0
+    mutations = Counter()
+    for case in range(args.cases):
+        orders, deals = make_case(rng)
+        plan = plan_reconciliation(orders, deals)
+        mutations.update(create=len(plan.to_create), update=len(plan.to_update), delete=len(plan.to_delete),
+                         unchanged=len(plan.unchanged))
+        problems = check(orders, deals, plan)
+        if problems:
+            failures += 1
+            print(f'Case {case}: {"; ".join(problems)}')
+
+    print(f'{args.cases} cases checked ({", ".join(f"{kind} {count}" for kind, count in sorted(mutations.items()))}), '
+          f'{failures} failures')
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""
+Local stand-in for a push-based order-book feed, replaying recorded events to LiveFeed subscribers
+
+Usage: python -m benchmarks.fake_feed --events recording.jsonl [--port 8765] [--interval 0.01]
+       python -m benchmarks.fake_feed --synthetic 1000 --record recording.jsonl
+"""
+import argparse
+import json
+import random
+import socketserver
+import threading
+import time
+
+from benchmarks.fake_market import FakeMarket
+
+STATUSES = ['ingame', 'online', 'offline']
+
+
+def load_events(path: str) -> list[dict]:
+    with open(path, 'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def save_events(path: str, events: list[dict]) -> None:
+    with open(path, 'w') as f:
+        for event in events:
+            f.write(json.dumps(event, separators=(',', ':')) + '\n')
+
+
+def synthetic_events(items: list[str], updates: int, seed: int = 0, book_size: int = 50) -> list[dict]:
+    """
+    Builds a recording: one snapshot per item followed by random add, update, remove and status events
+
+    Args:
+        items (list[str]): Item names
+        updates (int): Number of events after the snapshots
+        seed (int): Random seed
+        book_size (int): Orders per initial snapshot
+
+    Returns:
+        list[dict]: Events in replay order
+    """
+
+    rng = random.Random(seed)
+    with FakeMarket(book_size=book_size) as market:
+        books = {item: {order['id']: order for order in market.order_book(item)['payload']['orders']}
+                 for item in items}
+    events = [{'type': 'snapshot', 'item': item, 'orders': list(book.values())} for item, book in books.items()]
+    users = sorted({order['user']['ingame_name'] for book in books.values() for order in book.values()})
+
+    for number in range(updates):
+        item = rng.choice(items)
+        book = books[item]
+        kind = rng.choice(['add', 'update', 'remove', 'status'])
+        if kind == 'status':
+            events.append({'type': 'status', 'user': rng.choice(users), 'status': rng.choice(STATUSES)})
+            continue
+        if kind in ('update', 'remove') and book:
+            order = book[rng.choice(list(book))]
+            if kind == 'remove':
+                del book[order['id']]
+                events.append({'type': 'remove', 'item': item, 'order': {'id': order['id']}})
+                continue
+            order = order | {'platinum': max(1, order['platinum'] + rng.randint(-10, 10))}
+        else:
+            kind = 'add'
+            template = book[rng.choice(list(book))] if book else next(iter(books[items[0]].values()))
+            order = template | {'id': f'{number:024x}', 'platinum': rng.randint(1, 300),
+                                'order_type': rng.choice(['sell', 'buy'])}
+        book[order['id']] = order
+        events.append({'type': kind, 'item': item, 'order': order})
+    return events
+
+
+class FeedServer:
+    """
+    TCP server replaying a recording to every subscriber, one JSON message per line
+    Only events for the subscribed items (and status events) are sent; the connection stays open afterwards
+    """
+
+    def __init__(self, events: list[dict], host: str = '127.0.0.1', port: int = 0, interval: float = 0.0):
+        self.events = events
+        self.interval = interval
+        self.replayed = threading.Event()
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self) -> None:
+                subscription = json.loads(self.rfile.readline())
+                items = set(subscription.get('items', []))
+                try:
+                    for event in server.events:
+                        if event['type'] != 'status' and event['item'] not in items:
+                            continue
+                        self.wfile.write((json.dumps(event, separators=(',', ':')) + '\n').encode())
+                        if server.interval:
+                            self.wfile.flush()
+                            time.sleep(server.interval)
+                    self.wfile.flush()
+                    server.replayed.set()
+                    # Keep the subscription open until the client goes away
+                    while self.rfile.read(1):
+                        pass
+                except OSError:
+                    pass
+
+        self._server = socketserver.ThreadingTCPServer((host, port), Handler)
+        self._server.daemon_threads = True
+
+    @property
+    def address(self) -> tuple[str, int]:
+        return self._server.server_address[:2]
+
+    def start(self) -> 'FeedServer':
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> 'FeedServer':
+        return self.start()
+
+    def __exit__(self, *_) -> None:
+        self.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Replay order-book events to live feed subscribers')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--events', help='Recording to replay (JSON lines)')
+    parser.add_argument('--synthetic', type=int, default=0, help='Generate this many events instead')
+    parser.add_argument('--items', nargs='+', default=['mirage_prime_systems', 'nekros_prime_systems'])
+    parser.add_argument('--record', help='Save the (generated) events to this file')
+    parser.add_argument('--interval', type=float, default=0.0, help='Seconds between replayed events')
+    args = parser.parse_args()
+
+    events = load_events(args.events) if args.events else synthetic_events(args.items, args.synthetic)
+    if args.record:
+        save_events(args.record, events)
+
+    server = FeedServer(events, args.host, args.port, args.interval)
+    print(f'Replaying {len(events)} events on {args.host}:{args.port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,335 @@
+"""
+Local stand-in for the parts of the warframe.market API used by warframe_market.py
+
+Usage: python -m benchmarks.fake_market [--port 8080] [--latency 0.05] [--rate-limit 3] [--error-rate 0.1]
+"""
+import argparse
+import base64
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+API_PREFIX = '/v1'
+MOD_PREFIX = 'bench_mod_'  # Order books of these items carry a mod_rank, like mods on warframe.market
+MAX_MOD_RANK = 5
+DEFAULT_BOOK_SIZE = 200
+STATUSES = ['ingame', 'online', 'offline']
+MUTATIONS = ('create_order', 'update_order', 'delete_order')
+
+ROUTES = [
+    ('POST', re.compile(r'^/auth/signin$'), 'signin'),
+    ('GET', re.compile(r'^/profile/(?P<profile>[^/]+)/orders$'), 'profile_orders'),
+    ('POST', re.compile(r'^/profile/orders$'), 'create_order'),
+    ('PUT', re.compile(r'^/profile/orders/(?P<order_id>[^/]+)$'), 'update_order'),
+    ('DELETE', re.compile(r'^/profile/orders/(?P<order_id>[^/]+)$'), 'delete_order'),
+    ('GET', re.compile(r'^/items/(?P<item>[^/]+)/orders$'), 'item_orders'),
+    ('GET', re.compile(r'^/items/(?P<item>[^/]+)$'), 'item'),
+    ('GET', re.compile(r'^/v2/versions$'), 'versions'),
+    ('GET', re.compile(r'^/v2/items$'), 'catalogue'),
+]
+
+
+def item_id_for(item: str) -> str:
+    return hashlib.md5(item.encode()).hexdigest()[:24]
+
+
+def now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec='milliseconds')
+
+
+def fake_token(profile: str, lifetime: float = 3600) -> str:
+    def encode(part: dict) -> str:
+        return base64.urlsafe_b64encode(json.dumps(part).encode()).decode().rstrip('=')
+    return f'JWT {encode({"alg": "HS256", "typ": "JWT"})}.{encode({"sub": profile, "exp": time.time() + lifetime})}.fake'
+
+
+def token_profile(authorization: str) -> str:
+    """
+    Returns the profile a fake token was issued to, or None for a missing or malformed token
+    """
+    try:
+        payload = authorization.split()[-1].split('.')[1]
+        return json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))['sub']
+    except (AttributeError, IndexError, KeyError, ValueError):
+        return None
+
+
+class FakeMarket:
+    """
+    Threaded HTTP server answering like warframe.market, with configurable latency, rate limit
+    and share of order mutations failing with a server error (before or, with fail_after, after being applied)
+    Several accounts can sign in (accounts maps emails to profiles); their listings show up in the order books
+    Counts requests per endpoint so benchmarks can report how many calls a workflow makes
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0, rate_limit: float = None,
+                 book_size: int = DEFAULT_BOOK_SIZE, profile: str = 'Benchmark', error_rate: float = 0.0,
+                 seed: int = 0, accounts: dict[str, str] = None, fail_after: bool = False):
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.error_rate = error_rate
+        self.fail_after = fail_after
+        self.book_size = book_size
+        self.profile = profile
+        self.accounts = accounts or {}
+        self.counts = Counter()
+        self.orders: dict[str, dict] = {}
+        self.items: dict[str, str] = {}
+
+        self._lock = threading.Lock()
+        self._tokens = rate_limit or 0
+        self._refilled = time.monotonic()
+        self._order_ids = 0
+        self._random = random.Random(seed)
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: threading.Thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}{API_PREFIX}'
+
+    def start(self) -> 'FakeMarket':
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> 'FakeMarket':
+        return self.start()
+
+    def __exit__(self, *_) -> None:
+        self.stop()
+
+    def reset_counts(self) -> None:
+        with self._lock:
+            self.counts.clear()
+
+    def _allow(self) -> bool:
+        if not self.rate_limit:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.rate_limit, self._tokens + (now - self._refilled) * self.rate_limit)
+            self._refilled = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def _fails(self) -> bool:
+        if not self.error_rate:
+            return False
+        with self._lock:
+            if self._random.random() >= self.error_rate:
+                return False
+            self.counts['500'] += 1
+            return True
+
+    def _register(self, item: str) -> str:
+        item_id = item_id_for(item)
+        with self._lock:
+            self.items[item_id] = item
+        return item_id
+
+    def order_book(self, item: str) -> dict:
+        """
+        Deterministic synthetic order book for an item
+        """
+        self._register(item)
+        rng = random.Random(zlib.crc32(item.encode()))
+        base_price = rng.randint(5, 300)
+        orders = []
+        for number in range(self.book_size):
+            orders.append({
+                'platinum': max(1, base_price + rng.randint(-base_price // 3, base_price)),
+                'quantity': rng.randint(1, 10),
+                'order_type': rng.choice(['sell', 'sell', 'buy']),
+                'user': {
+                    'reputation': rng.randint(0, 200),
+                    'locale': 'en',
+                    'avatar': None,
+                    'last_seen': '2022-01-30T12:00:00.000+00:00',
+                    'ingame_name': f'Trader{number}',
+                    'id': f'{number:024x}',
+                    'region': 'en',
+                    'status': rng.choice(STATUSES),
+                },
+                'platform': 'pc',
+                'region': 'en',
+                'creation_date': '2022-01-30T12:00:00.000+00:00',
+                'last_update': '2022-01-30T12:00:00.000+00:00',
+                'visible': True,
+                'id': f'{rng.getrandbits(96):024x}',
+            })
+            if item.startswith(MOD_PREFIX):
+                orders[-1]['mod_rank'] = rng.randint(0, MAX_MOD_RANK)
+        return {'payload': {'orders': orders}}
+
+    def handle(self, endpoint: str, params: dict, body: dict, user: str) -> tuple[int, dict, dict]:
+        """
+        Returns status, payload and extra headers for a routed request (user is the signed in profile or None)
+        """
+        if endpoint == 'signin':
+            profile = self.accounts.get(body.get('email'), self.profile)
+            return 200, {'payload': {'user': {'ingame_name': profile}}}, {'Authorization': fake_token(profile)}
+
+        if endpoint == 'profile_orders':
+            with self._lock:
+                sell_orders = [order for order in self.orders.values()
+                               if order['user']['ingame_name'] == params['profile']]
+            return 200, {'payload': {'sell_orders': sell_orders, 'buy_orders': []}}, {}
+
+        if endpoint == 'item_orders':
+            book = self.order_book(params['item'])
+            with self._lock:
+                book['payload']['orders'] += [dict(order) for order in self.orders.values()
+                                              if order['item']['url_name'] == params['item']]
+            return 200, book, {}
+
+        if endpoint in ('versions', 'catalogue'):
+            with self._lock:
+                items = sorted(self.items.items(), key=lambda pair: pair[1])
+            version = hashlib.md5(json.dumps(items).encode()).hexdigest()
+            if endpoint == 'versions':
+                return 200, {'data': {'collections': {'items': version}}}, {}
+            data = [{'id': item_id, 'slug': item, 'i18n': {'en': {'name': item.replace('_', ' ').title()}},
+                     'tags': ['prime'] if '_prime_' in item else [], 'ducats': 45 if '_prime_' in item else None}
+                    for item_id, item in items]
+            return 200, {'data': data}, {'ETag': f'"{version}"'}
+
+        if endpoint == 'item':
+            item_id = self._register(params['item'])
+            return 200, {'payload': {'item': {'id': item_id, 'items_in_set': []}}}, {}
+
+        if user is None:
+            return 401, {'error': 'unauthorized'}, {}
+
+        if endpoint == 'create_order':
+            with self._lock:
+                self._order_ids += 1
+                order = {
+                    'id': f'{self._order_ids:024x}',
+                    'platinum': body['platinum'],
+                    'quantity': body['quantity'],
+                    'order_type': body.get('order_type', 'sell'),
+                    'mod_rank': body.get('mod_rank'),
+                    'creation_date': now_iso(),
+                    'last_update': now_iso(),
+                    'item': {'id': body['item_id'], 'url_name': self.items.get(body['item_id'], body['item_id'])},
+                    'user': {'ingame_name': user, 'status': 'ingame'},
+                }
+                self.orders[order['id']] = order
+            return 200, {'payload': {'order': order}}, {}
+
+        with self._lock:
+            order = self.orders.get(params['order_id'])
+            if order is None or order['user']['ingame_name'] != user:
+                return 404, {'error': 'order not found'}, {}
+            if endpoint == 'update_order':
+                for field in ('platinum', 'quantity', 'mod_rank', 'visible'):
+                    if field in body:
+                        order[field] = body[field]
+                order['last_update'] = now_iso()
+                return 200, {'payload': {'order': order}}, {}
+            del self.orders[params['order_id']]
+            return 200, {'payload': {'order_id': params['order_id']}}, {}
+
+    def _handler(self) -> type:
+        market = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *_) -> None:
+                pass
+
+            def _dispatch(self) -> None:
+                length = int(self.headers.get('Content-Length') or 0)
+                raw_body = self.rfile.read(length) if length else b''
+                path = self.path.split('?')[0]
+                if path.startswith(API_PREFIX):
+                    path = path[len(API_PREFIX):]
+
+                for method, pattern, endpoint in ROUTES:
+                    match = pattern.match(path)
+                    if method == self.command and match:
+                        break
+                else:
+                    return self._send(404, {'error': 'not found'}, {})
+
+                if market.latency:
+                    time.sleep(market.latency)
+                if not market._allow():
+                    with market._lock:
+                        market.counts['429'] += 1
+                    return self._send(429, {'error': 'too many requests'}, {'Retry-After': '1'})
+                fails = endpoint in MUTATIONS and market._fails()
+                if fails and not market.fail_after:
+                    return self._send(500, {'error': 'internal server error'}, {})
+
+                with market._lock:
+                    market.counts[endpoint] += 1
+                body = json.loads(raw_body) if raw_body else {}
+                user = token_profile(self.headers.get('Authorization'))
+                status, payload, headers = market.handle(endpoint, match.groupdict(), body, user)
+                if fails:
+                    # Applied, but the client is told it failed (e.g. a gateway timeout)
+                    return self._send(500, {'error': 'internal server error'}, {})
+                if status == 200 and 'ETag' in headers and headers['ETag'] == self.headers.get('If-None-Match'):
+                    return self._send(304, None, headers)
+                self._send(status, payload, headers)
+
+            def _send(self, status: int, payload: dict, headers: dict) -> None:
+                data = json.dumps(payload).encode() if payload is not None else b''
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = do_PUT = do_DELETE = _dispatch
+
+        return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Local warframe.market stand-in')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every response')
+    parser.add_argument('--rate-limit', type=float, default=None, help='Requests per second before answering 429')
+    parser.add_argument('--book-size', type=int, default=DEFAULT_BOOK_SIZE, help='Orders per item order book')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of order mutations answering 500')
+    parser.add_argument('--fail-after', action='store_true', help='Apply failing mutations before answering 500')
+    args = parser.parse_args()
+
+    market = FakeMarket(args.host, args.port, args.latency, args.rate_limit, args.book_size,
+                        error_rate=args.error_rate, fail_after=args.fail_after)
+    print(f'Serving fake warframe.market on {market.base_url} (set WARFRAME_MARKET_API to use it)')
+    try:
+        market.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(dict(market.counts))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,275 @@
+import argparse
+import heapq
+import math
+import os
+import time
+
+from dotenv import load_dotenv
+
+from database.google_sheets import OwnedItem
+from database.google_sheets import get_prime_items_to_sell, get_items_to_sell, get_mods_to_sell
+from database.google_sheets import load_inventory_snapshot
+from database.local import ItemCatalogue, get_catalogue
+from database.price_history import PriceHistory
+from database.reconcile import plan_reconciliation, apply_reconciliation
+from warframe_market import warframe_market
+from warframe_market.client import TOKEN_EXPIRY_MARGIN, token_expiry
+from warframe_market.live_feed import LiveFeed, connect_live_feed
+from warframe_market.order_stream import split_ranked_item
+from warframe_market.warframe_market import ExistingPrimeOrder
+
+NUM_DEALS = 20
+DEFAULT_BUDGET = 60  # Requests per minute, shared by price checks and order mutations
+MIN_INTERVAL = 2 * 60
+MAX_INTERVAL = 60 * 60
+INVENTORY_REFRESH = 5 * 60
+VOLATILITY_REFRESH = 10 * 60
+VOLATILITY_WEIGHT = 10  # A 10% typical move between snapshots doubles the refresh rate
+VALUE_WEIGHT = 3  # The most valuable item is refreshed up to 4x as often as a worthless one
+
+
+class RequestBudget:
+    """
+    Token bucket limiting how many requests the daemon sends per minute
+    """
+
+    def __init__(self, per_minute: float = DEFAULT_BUDGET):
+        self.rate = per_minute / 60
+        self.capacity = max(1.0, per_minute / 6)
+        self.tokens = self.capacity
+        self._refilled = time.monotonic()
+
+    def acquire(self, count: int = 1) -> None:
+        """
+        Blocks until count requests can be sent
+
+        Args:
+            count (int): Number of requests about to be sent
+        """
+
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self._refilled) * self.rate)
+            self._refilled = now
+            if self.tokens >= min(count, self.capacity):
+                self.tokens -= count
+                return
+            time.sleep((min(count, self.capacity) - self.tokens) / self.rate)
+
+
+class RepricingDaemon:
+    """
+    Keeps our sell orders competitive by repricing items on a schedule
+    The login, inventory and current orders stay in memory between checks; volatile and valuable
+    items are checked often and stable, cheap ones rarely, all within one request budget
+    """
+
+    def __init__(self, email: str, password: str, profile: str, num: int = NUM_DEALS,
+                 budget: RequestBudget = None, history: PriceHistory = None, catalogue: ItemCatalogue = None,
+                 min_interval: float = MIN_INTERVAL, max_interval: float = MAX_INTERVAL, live_feed: str = None):
+        self.email = email
+        self.password = password
+        self.profile = profile
+        self.num = num
+        self.budget = budget or RequestBudget()
+        self.history = history if history is not None else PriceHistory()
+        self.catalogue = catalogue if catalogue is not None else get_catalogue()
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.live_feed_address = live_feed
+        self.feed: LiveFeed = None
+
+        self.token: str = None
+        self.inventory: OwnedItem = {}
+        self.orders: list[ExistingPrimeOrder] = []
+        self.prices: dict[str, int] = {}
+        self.volatility: dict[str, float] = {}
+        self._schedule: list[tuple[float, str]] = []
+        self._scheduled: set[str] = set()
+        self._unpriced: set[str] = None
+        self._inventory_loaded = 0.0
+        self._volatility_loaded = 0.0
+
+    def start(self) -> None:
+        """
+        Logs in and loads the inventory and our current orders
+        """
+
+        self.budget.acquire()
+        self.token = warframe_market.login_to_warframe_market(self.email, self.password)
+        self.refresh_orders()
+        self.refresh_inventory()
+        warframe_market.add_order_book_listener(self.history.record)
+        if self.live_feed_address:
+            # Items added to the inventory later are not subscribed and keep being polled
+            items = {split_ranked_item(item)[0] for item in self.inventory}
+            self.feed = connect_live_feed(self.live_feed_address, items)
+            warframe_market.set_live_feed(self.feed)
+
+    def refresh_token(self) -> None:
+        """
+        Signs in again when the token is about to expire, so that a long-running daemon keeps sending mutations
+        A token rejected before its expiry is replaced by the client on the first 401
+        """
+
+        if self.token is not None and token_expiry(self.token) - TOKEN_EXPIRY_MARGIN > time.time():
+            return
+        self.budget.acquire()
+        token = warframe_market.login_to_warframe_market(self.email, self.password)
+        if token is not None:
+            self.token = token
+
+    def stop(self) -> None:
+        warframe_market.remove_order_book_listener(self.history.record)
+        if self.feed is not None:
+            warframe_market.set_live_feed(None)
+            self.feed.close()
+
+    def refresh_orders(self) -> None:
+        self.budget.acquire()
+        orders = warframe_market.get_existing_orders(self.profile)
+        if orders is not None:
+            self.orders = orders
+
+    def refresh_inventory(self) -> None:
+        """
+        Reloads the inventory (served from the local snapshot while it is fresh) and schedules new items
+        """
+
+        load_inventory_snapshot()
+        self.inventory = get_items_to_sell() | get_prime_items_to_sell() | get_mods_to_sell()
+        self._inventory_loaded = time.monotonic()
+        if self._unpriced is None:
+            # Orders are left alone until every item has been priced once, to avoid churn on startup
+            self._unpriced = set(self.inventory)
+        else:
+            # Items gone before their first check would otherwise hold the orders back for good
+            self._unpriced &= set(self.inventory)
+
+        for item in list(self.prices):
+            if item not in self.inventory:
+                del self.prices[item]
+        now = time.monotonic()
+        for item in self.inventory:
+            if item not in self._scheduled:
+                self._schedule_at(item, now)
+
+    def refresh_volatility(self) -> None:
+        items = list(self.inventory)
+        stats = self.history.stats(items, percentiles=())
+        self.volatility = {item: float(value) for item, value in zip(items, stats.volatility) if not math.isnan(value)}
+        self._volatility_loaded = time.monotonic()
+
+    def interval_for(self, item: str) -> float:
+        """
+        Returns how long to wait before checking an item again
+
+        Args:
+            item (str): Item name (e.g. mirage_prime_systems)
+
+        Returns:
+            float: Seconds until the next check, between min_interval and max_interval
+        """
+
+        top_price = max(self.prices.values(), default=0)
+        value_share = self.prices.get(item, 0) / top_price if top_price else 0
+        urgency = 1 + VOLATILITY_WEIGHT * self.volatility.get(item, 0) + VALUE_WEIGHT * value_share
+        return min(self.max_interval, max(self.min_interval, self.max_interval / urgency))
+
+    def best_deals(self) -> list[list[str, int, int]]:
+        deals = [[item, price, self.inventory[item]] for item, price in self.prices.items() if item in self.inventory]
+        return heapq.nlargest(self.num, deals, key=lambda deal: deal[1])
+
+    def check(self, item: str) -> None:
+        """
+        Reprices one item and sends the order mutations this makes necessary
+
+        Args:
+            item (str): Item name (e.g. mirage_prime_systems)
+        """
+
+        price = warframe_market.find_lowest_price_locally(self.profile, item)
+        if price is None:
+            self.budget.acquire()
+            price = warframe_market.find_lowest_price_for_item(self.profile, item)
+        first_pass = bool(self._unpriced)
+        self._unpriced.discard(item)
+        if price is None or (self.prices.get(item) == price and not first_pass):
+            return
+        self.prices[item] = price
+        if self._unpriced:
+            return
+
+        plan = plan_reconciliation(self.orders, self.best_deals())
+        if not plan.mutations:
+            return
+        print(f'{item}: {price}p - creating {len(plan.to_create)}, updating {len(plan.to_update)}, '
+              f'deleting {len(plan.to_delete)}')
+        self.refresh_token()
+        self.budget.acquire(plan.mutations)
+        report = apply_reconciliation(self.token, plan, self.catalogue, profile=self.profile)
+
+        # Failed updates leave the orders in an unknown state, so they are read back as well
+        if plan.to_create or plan.to_delete or report.failed:
+            self.refresh_orders()
+        else:
+            for update in plan.to_update:
+                update.order.platinum, update.order.quantity = update.price, update.quantity
+
+    def run(self, duration: float = None) -> None:
+        """
+        Runs the scheduler until interrupted (or for duration seconds)
+
+        Args:
+            duration (float): Stop after this many seconds (runs forever when omitted)
+        """
+
+        self.start()
+        deadline = time.monotonic() + duration if duration is not None else math.inf
+        try:
+            while self._schedule and time.monotonic() < deadline:
+                if time.monotonic() - self._inventory_loaded > INVENTORY_REFRESH:
+                    self.refresh_inventory()
+                if time.monotonic() - self._volatility_loaded > VOLATILITY_REFRESH:
+                    self.refresh_volatility()
+
+                due, item = heapq.heappop(self._schedule)
+                self._scheduled.discard(item)
+                if item not in self.inventory:
+                    continue
+
+                wait = min(due, deadline) - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+                    if time.monotonic() >= deadline:
+                        break
+
+                self.check(item)
+                self._schedule_at(item, time.monotonic() + self.interval_for(item))
+        finally:
+            self.stop()
+
+    def _schedule_at(self, item: str, when: float) -> None:
+        heapq.heappush(self._schedule, (when, item))
+        self._scheduled.add(item)
+
+
+if __name__ == '__main__':
+    load_dotenv()
+    parser = argparse.ArgumentParser(description='Continuously reprice warframe.market sell orders')
+    parser.add_argument('--num', type=int, default=NUM_DEALS, help='Number of orders to keep listed')
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET, help='Requests per minute')
+    parser.add_argument('--min-interval', type=float, default=MIN_INTERVAL, help='Seconds between checks of the busiest items')
+    parser.add_argument('--max-interval', type=float, default=MAX_INTERVAL, help='Seconds between checks of the quietest items')
+    parser.add_argument('--live-feed', default=os.environ.get('LIVE_FEED'), help='Order-book feed server (host:port)')
+    parser.add_argument('--duration', type=float, default=None, help='Stop after this many seconds')
+    args = parser.parse_args()
+
+    daemon = RepricingDaemon(os.environ.get('EMAIL'), os.environ.get('PASSWORD'), os.environ.get('PROFILE_NAME'),
+                             num=args.num, budget=RequestBudget(args.budget),
+                             min_interval=args.min_interval, max_interval=args.max_interval,
+                             live_feed=args.live_feed)
+    try:
+        daemon.run(args.duration)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,111 @@
+import asyncio
+from dataclasses import dataclass, field
+
+from database.query import DEFAULT_CONCURRENCY
+from warframe_market import warframe_market
+from warframe_market.order_books import OrderBookSnapshot
+
+
+@dataclass
+class PartOffer:
+    """
+    Cheapest seller in game of a missing prime part
+    """
+    item: str
+    price: int = None  # None when the part could not be priced or nobody is selling it in game
+    seller: str = None
+    quantity: int = 0
+    error: str = None
+
+
+@dataclass
+class SetToComplete:
+    """
+    Prime set with missing parts, and what buying them costs
+    """
+    name: str
+    parts: list[PartOffer] = field(default_factory=list)
+
+    @property
+    def complete(self) -> bool:
+        """
+        Whether every missing part can be bought right now
+        """
+
+        return all(part.price is not None for part in self.parts)
+
+    @property
+    def cost(self) -> int:
+        return sum(part.price for part in self.parts if part.price is not None)
+
+
+async def fetch_order_books(items: list[str], concurrency: int = DEFAULT_CONCURRENCY) -> dict[str, OrderBookSnapshot]:
+    """
+    Fetches the order books of several items, keeping several requests in flight (paced by the rate governor)
+    Books already fetched during the run are read from the shared books instead
+
+    Args:
+        items (list[str]): Names of the items (e.g. mirage_prime_systems)
+        concurrency (int): Maximum number of order-book requests in flight
+
+    Returns:
+        dict[str, OrderBookSnapshot]: Snapshot per item (None when it could not be fetched)
+    """
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(item: str) -> OrderBookSnapshot:
+        async with semaphore:
+            return await asyncio.to_thread(warframe_market.get_order_book_snapshot, item)
+
+    books = await asyncio.gather(*(fetch(item) for item in items))
+    return dict(zip(items, books))
+
+
+def cheapest_part_offer(item: str, book: OrderBookSnapshot, profile: str = None) -> PartOffer:
+    if book is None:
+        return PartOffer(item, error='could not be priced')
+    offer = book.cheapest_offer(profile)
+    if offer is None:
+        return PartOffer(item, error='nobody is selling in game')
+    seller, price, quantity = offer
+    return PartOffer(item, price, seller, quantity)
+
+
+def scan_sets_to_complete(profile: str, missing: dict[str, list[str]],
+                          concurrency: int = DEFAULT_CONCURRENCY) -> list[SetToComplete]:
+    """
+    Finds the cheapest seller in game of every missing part and ranks the sets by what completing them costs
+
+    Args:
+        profile (str): Our profile name on warframe.market (our own orders are left out)
+        missing (dict[str, list[str]]): Missing parts per set, as returned by get_prime_sets_to_complete
+        concurrency (int): Maximum number of order-book requests in flight
+
+    Returns:
+        list[SetToComplete]: Sets that can be completed now, cheapest first, then the ones missing a seller
+    """
+
+    items = list(dict.fromkeys(item for parts in missing.values() for item in parts))
+    books = asyncio.run(fetch_order_books(items, concurrency))
+    sets = [SetToComplete(name, [cheapest_part_offer(item, books[item], profile) for item in parts])
+            for name, parts in missing.items()]
+    return sorted(sets, key=lambda prime_set: (not prime_set.complete, prime_set.cost, prime_set.name))
+
+
+def print_buy_report(sets: list[SetToComplete]) -> None:
+    """
+    Prints the sets to complete with the price and seller of each missing part
+    """
+
+    for prime_set in sets:
+        total = f'{prime_set.cost}p' if prime_set.complete else 'incomplete'
+        print(f'{prime_set.name + "_prime":<45} {total:>10}')
+        for part in prime_set.parts:
+            if part.price is None:
+                print(f'  {part.item:<43} {part.error}')
+            else:
+                print(f'  {part.item:<43} {part.price:>9}p {part.seller} (x{part.quantity})')
+    available = [prime_set for prime_set in sets if prime_set.complete]
+    print(f'{len(available)} of {len(sets)} sets can be completed now for '
+          f'{sum(prime_set.cost for prime_set in available)}p in total')
@@ -0,0 +1,261 @@
+"""
+Local copy of the warframe.market item list, kept in SQLite
+
+Usage: python -m database.catalogue [--force] [--lookup NAME ...]
+"""
+import argparse
+import difflib
+import json
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+
+CATALOGUE = 'database/catalogue.sqlite'
+SYNC_INTERVAL = 24 * 60 * 60
+FUZZY_CUTOFF = 0.75
+
+
+@dataclass
+class CatalogueItem:
+    url_name: str
+    item_id: str
+    name: str = None
+    ducats: int = None
+    max_rank: int = None
+    tags: list[str] = field(default_factory=list)
+
+
+def normalize_name(name: str) -> str:
+    """
+    Turns a display name into the URL name format (e.g. "Mirage Prime Systems" -> mirage_prime_systems)
+
+    Args:
+        name (str): Item name as typed in the inventory or shown in game
+
+    Returns:
+        str: Lower case name with words joined by underscores
+    """
+
+    name = name.strip().lower().replace('&', 'and')
+    name = re.sub(r"['’]", '', name)
+    return re.sub(r'[^a-z0-9]+', '_', name).strip('_')
+
+
+def parse_market_item(item: dict) -> CatalogueItem:
+    """
+    Converts an item from the warframe.market item list (v2, or v1 without ducats, ranks and tags)
+
+    Args:
+        item (dict): Item as returned by /items
+
+    Returns:
+        CatalogueItem: The catalogue entry
+    """
+
+    if 'slug' in item:
+        return CatalogueItem(item['slug'], item['id'], item.get('i18n', {}).get('en', {}).get('name'),
+                             item.get('ducats'), item.get('maxRank'), item.get('tags', []))
+    return CatalogueItem(item['url_name'], item['id'], item.get('item_name'))
+
+
+class ItemDatabase:
+    """
+    Indexed catalogue of every tradable item: URL name, ID, display name, ducats, max mod rank and tags
+    Filled by sync() from a single download of the item list, so lookups never need the network
+    """
+
+    def __init__(self, path: str = CATALOGUE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._url_names: list[str] = None
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute('CREATE TABLE IF NOT EXISTS items ('
+                             'url_name TEXT PRIMARY KEY, item_id TEXT NOT NULL, name TEXT, '
+                             'normalized TEXT NOT NULL, ducats INTEGER, max_rank INTEGER, tags TEXT NOT NULL)')
+            self._db.execute('CREATE UNIQUE INDEX IF NOT EXISTS items_item_id ON items (item_id)')
+            self._db.execute('CREATE INDEX IF NOT EXISTS items_normalized ON items (normalized)')
+            self._db.execute('CREATE TABLE IF NOT EXISTS sync (key TEXT PRIMARY KEY, value TEXT)')
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM items').fetchone()[0]
+
+    def __contains__(self, item: str) -> bool:
+        return self.get(item) is not None
+
+    def get(self, item: str) -> CatalogueItem:
+        """
+        Finds an item by URL name, falling back to its normalized display name
+
+        Args:
+            item (str): URL name (e.g. mirage_prime_systems) or display name (e.g. Mirage Prime Systems)
+
+        Returns:
+            CatalogueItem: The item or None if it is unknown
+        """
+
+        with self._lock:
+            row = self._db.execute('SELECT * FROM items WHERE url_name = ?', (item,)).fetchone()
+            if row is None:
+                row = self._db.execute('SELECT * FROM items WHERE normalized = ? LIMIT 1',
+                                       (normalize_name(item),)).fetchone()
+        return self._item(row)
+
+    def get_id(self, item: str) -> str:
+        found = self.get(item)
+        return found.item_id if found is not None else None
+
+    def get_by_id(self, item_id: str) -> CatalogueItem:
+        with self._lock:
+            return self._item(self._db.execute('SELECT * FROM items WHERE item_id = ?', (item_id,)).fetchone())
+
+    def tagged(self, *tags: str) -> list[CatalogueItem]:
+        """
+        Returns the items carrying all the given tags (e.g. 'prime', 'component')
+        """
+
+        with self._lock:
+            rows = self._db.execute('SELECT * FROM items ORDER BY url_name').fetchall()
+        items = [self._item(row) for row in rows]
+        return [item for item in items if set(tags) <= set(item.tags)]
+
+    def fuzzy(self, item: str, limit: int = 5, cutoff: float = FUZZY_CUTOFF) -> list[str]:
+        """
+        Suggests URL names close to a misspelled item name
+
+        Args:
+            item (str): Item name as typed (e.g. 'mirage prime sytems')
+            limit (int): Maximum number of suggestions
+            cutoff (float): Minimum similarity between 0 and 1
+
+        Returns:
+            list[str]: URL names, best match first
+        """
+
+        if self._url_names is None:
+            with self._lock:
+                self._url_names = [row[0] for row in self._db.execute('SELECT url_name FROM items')]
+        return difflib.get_close_matches(normalize_name(item), self._url_names, n=limit, cutoff=cutoff)
+
+    def upsert(self, items: list[CatalogueItem]) -> int:
+        """
+        Stores items, only rewriting the rows whose content changed
+
+        Args:
+            items (list[CatalogueItem]): Items to store
+
+        Returns:
+            int: Number of rows added or changed
+        """
+
+        rows = [(item.url_name, item.item_id, item.name, normalize_name(item.name or item.url_name),
+                 item.ducats, item.max_rank, json.dumps(item.tags)) for item in items]
+        with self._lock, self._db:
+            before = self._db.total_changes
+            # An ID can move to a new URL name when warframe.market renames an item
+            self._db.executemany('DELETE FROM items WHERE item_id = ? AND url_name != ?',
+                                 [(row[1], row[0]) for row in rows])
+            self._db.executemany(
+                'INSERT INTO items VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (url_name) DO UPDATE SET '
+                'item_id = excluded.item_id, name = excluded.name, normalized = excluded.normalized, '
+                'ducats = excluded.ducats, max_rank = excluded.max_rank, tags = excluded.tags '
+                'WHERE (item_id, name, normalized, ducats, max_rank, tags) IS NOT '
+                '(excluded.item_id, excluded.name, excluded.normalized, excluded.ducats, '
+                'excluded.max_rank, excluded.tags)',
+                rows)
+            changed = self._db.total_changes - before
+        self._url_names = None
+        return changed
+
+    def synced_at(self) -> float:
+        value = self._get_sync('synced_at')
+        return float(value) if value is not None else 0.0
+
+    def needs_sync(self, interval: float = SYNC_INTERVAL) -> bool:
+        return time.time() - self.synced_at() >= interval
+
+    def sync(self, force: bool = False) -> int:
+        """
+        Brings the catalogue up to date with warframe.market
+        The item list version is checked first and the list is only downloaded when it changed
+
+        Args:
+            force (bool): Download the item list even if the version did not change
+
+        Returns:
+            int: Number of items added or changed, or None when warframe.market could not be reached
+        """
+
+        from warframe_market import warframe_market
+
+        version = warframe_market.get_catalogue_version()
+        if not force and version is not None and version == self._get_sync('version') and len(self):
+            self._set_sync(synced_at=time.time())
+            return 0
+
+        result = warframe_market.get_all_items_from_market(None if force else self._get_sync('etag'))
+        if result is None:
+            return None
+        items, etag = result
+
+        changed = self.upsert([parse_market_item(item) for item in items]) if items is not None else 0
+        self._set_sync(version=version, etag=etag, synced_at=time.time())
+        return changed
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def _get_sync(self, key: str) -> str:
+        with self._lock:
+            row = self._db.execute('SELECT value FROM sync WHERE key = ?', (key,)).fetchone()
+        return row[0] if row is not None else None
+
+    def _set_sync(self, **values) -> None:
+        with self._lock, self._db:
+            self._db.executemany('INSERT OR REPLACE INTO sync VALUES (?, ?)',
+                                 [(key, None if value is None else str(value)) for key, value in values.items()])
+
+    @staticmethod
+    def _item(row: tuple) -> CatalogueItem:
+        if row is None:
+            return None
+        url_name, item_id, name, _, ducats, max_rank, tags = row
+        return CatalogueItem(url_name, item_id, name, ducats, max_rank, json.loads(tags))
+
+
+def sync_catalogue(path: str = CATALOGUE, force: bool = False, interval: float = SYNC_INTERVAL) -> int:
+    """
+    Syncs the local catalogue when it is older than interval (or when forced)
+
+    Returns:
+        int: Number of items added or changed (0 when the catalogue was recent enough)
+    """
+
+    database = ItemDatabase(path)
+    try:
+        if not force and not database.needs_sync(interval):
+            return 0
+        return database.sync(force)
+    finally:
+        database.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Sync the local warframe.market item catalogue')
+    parser.add_argument('--force', action='store_true', help='Download the item list even if it did not change')
+    parser.add_argument('--lookup', nargs='*', default=[], help='Item names to look up after syncing')
+    args = parser.parse_args()
+
+    database = ItemDatabase()
+    changed = database.sync(args.force)
+    if changed is None:
+        print(f'Could not sync the catalogue, keeping {len(database)} known items')
+    else:
+        print(f'Catalogue synced: {len(database)} items, {changed} added or changed')
+    for name in args.lookup:
+        found = database.get(name)
+        print(f'{name}: {found}' if found else f'{name}: not found, did you mean {database.fuzzy(name)}?')
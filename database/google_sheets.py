@@ -1,5 +1,17 @@
-import gspread
-from typing import TypedDict
+import json
+import os
+import re
+import time
+
+from typing import TYPE_CHECKING, TypedDict
+
+from warframe_market.cassette import get_cassette
+from warframe_market.metrics import instrumented
+from warframe_market.order_stream import ranked_item
+
+if TYPE_CHECKING:
+    # gspread pulls in the whole google-auth stack, it is only imported once Sheets are actually read
+    import gspread
 
 
 class OwnedItem(TypedDict):
@@ -10,16 +22,145 @@ class OwnedItem(TypedDict):
 SHEET = 'Warframe'
 PRIME_WORKSHEET = 'Prime' 
 PRIME_RANGE = 'A2:R109'
+PRIME_COLUMNS = 18
+PRIME_PART_COLUMNS = (1, 4, 7, 10, 13)  # Blueprint and four components, each followed by its quantity
+PRIME_STATUS_COLUMN = 16
 ITEM_WORKSHEET = 'Items'
 ITEM_RANGE = 'A1:B100'
 MODS_WORKSHEET = 'Mods'
-MODS_RANGE = 'A1:B100'
+MODS_RANGE = 'A1:C100'  # Name, quantity and rank (blank means unranked)
 KEY = 'database/sheets.json'
+SNAPSHOT = 'database/inventory_snapshot.json'
+SNAPSHOT_TTL = 15 * 60
+
+INVENTORY_RANGES = [
+    f'{PRIME_WORKSHEET}!{PRIME_RANGE}',
+    f'{ITEM_WORKSHEET}!{ITEM_RANGE}',
+    f'{MODS_WORKSHEET}!{MODS_RANGE}',
+]
+
+_service_account: 'gspread.Client' = None
+_snapshots: dict[str, dict] = {}
+
+
+def get_service_account() -> 'gspread.Client':
+    """
+    Authenticates against Google Sheets once and reuses the client afterwards
+
+    Returns:
+        gspread.Client: Authenticated client
+    """
+
+    global _service_account
+    if _service_account is None:
+        import gspread
+        _service_account = gspread.service_account(filename=KEY)
+    return _service_account
+
+
+@instrumented('sheets_snapshot')
+def load_inventory_snapshot(sheet: str = SHEET, ttl: float = SNAPSHOT_TTL, force: bool = False) -> dict[str, list[list[str]]]:
+    """
+    Returns the Prime, Items and Mods ranges of the inventory
+    A local snapshot is used while it is younger than ttl. Once it expires the spreadsheet is only
+    downloaded again (in a single batch request) if it was modified since the snapshot was taken
+
+    Args:
+        sheet (str): Google Sheet name (each sheet has its own snapshot)
+        ttl (float): Seconds a snapshot is trusted without asking Google
+        force (bool): Download the ranges even if the snapshot is still valid
+
+    Returns:
+        dict[str, list[list[str]]]: Rows per range (e.g. 'Prime!A2:R109': [[...], [...]])
+    """
+
+    cassette = get_cassette()
+    if cassette is not None and cassette.replaying:
+        return {name: cassette.sheet(cassette_range(sheet, name)) for name in INVENTORY_RANGES}
+
+    snapshot = _snapshots.get(sheet) or _read_snapshot(sheet)
+    if snapshot is not None and (snapshot.get('sheet') != sheet or set(snapshot['ranges']) != set(INVENTORY_RANGES)):
+        snapshot = None
+
+    if not force and snapshot is not None and time.time() - snapshot['fetched_at'] < ttl:
+        _snapshots[sheet] = snapshot
+        _record_ranges(snapshot['ranges'], sheet)
+        return snapshot['ranges']
+
+    from gspread.urls import DRIVE_FILES_API_V3_URL, SPREADSHEET_VALUES_BATCH_URL
+
+    sa = get_service_account()
+    spreadsheet_id = snapshot['spreadsheet_id'] if snapshot else sa.open(sheet).id
+    modified_time = sa.request('get', DRIVE_FILES_API_V3_URL + f'/{spreadsheet_id}',
+                               params={'fields': 'modifiedTime'}).json()['modifiedTime']
+
+    if force or snapshot is None or snapshot['modified_time'] != modified_time:
+        response = sa.request('get', SPREADSHEET_VALUES_BATCH_URL % spreadsheet_id,
+                              params={'ranges': INVENTORY_RANGES}).json()
+        ranges = {name: value_range.get('values', [])
+                  for name, value_range in zip(INVENTORY_RANGES, response['valueRanges'])}
+    else:
+        ranges = snapshot['ranges']
+
+    _snapshots[sheet] = {
+        'sheet': sheet,
+        'spreadsheet_id': spreadsheet_id,
+        'modified_time': modified_time,
+        'fetched_at': time.time(),
+        'ranges': ranges,
+    }
+    _write_snapshot(_snapshots[sheet])
+    _record_ranges(ranges, sheet)
+    return ranges
+
+
+def snapshot_path(sheet: str = SHEET) -> str:
+    """
+    Returns the snapshot file of a Google Sheet (the default sheet keeps the original file name)
+    """
+
+    if sheet == SHEET:
+        return SNAPSHOT
+    root, extension = os.path.splitext(SNAPSHOT)
+    return f'{root}_{re.sub(r"[^a-z0-9]+", "_", sheet.lower()).strip("_")}{extension}'
 
 
+def cassette_range(sheet: str, range_name: str) -> str:
+    """
+    Returns the name a range is recorded under, prefixed with the sheet for all but the default sheet
+    """
+
+    return range_name if sheet == SHEET else f'{sheet}/{range_name}'
+
+
+def _record_ranges(ranges: dict[str, list[list[str]]], sheet: str = SHEET) -> None:
+    cassette = get_cassette()
+    if cassette is not None and not cassette.replaying:
+        for name, values in ranges.items():
+            cassette.record_sheet(cassette_range(sheet, name), values)
+
+
+def _read_snapshot(sheet: str = SHEET) -> dict:
+    try:
+        with open(snapshot_path(sheet), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_snapshot(snapshot: dict) -> None:
+    path = snapshot_path(snapshot['sheet'])
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w') as f:
+        json.dump(snapshot, f)
+    os.replace(temporary, path)
+
+
+@instrumented('sheets_read')
 def read_data_from_sheet(sheet: str = SHEET, worksheet: str = PRIME_WORKSHEET, cell_range: str = PRIME_RANGE) -> list[list[str]]:
     """
     Reads the Google Sheet that contains the information on prime items
+    Inventory ranges are served from the local snapshot (see load_inventory_snapshot)
 
     Args:
         sheet (str): Google Sheet name
@@ -29,178 +170,162 @@ def read_data_from_sheet(sheet: str = SHEET, worksheet: str = PRIME_WORKSHEET, c
     Returns:
         list[list[str]]: [description]
     """
-    sa = gspread.service_account(filename=KEY)
-    sheet = sa.open(sheet)
-    worksheet = sheet.worksheet(worksheet)
-    records = worksheet.get(cell_range)
+    range_name = f'{worksheet}!{cell_range}'
+    if range_name in INVENTORY_RANGES:
+        return load_inventory_snapshot(sheet)[range_name]
+
+    cassette = get_cassette()
+    if cassette is not None and cassette.replaying:
+        return cassette.sheet(cassette_range(sheet, range_name))
+
+    sa = get_service_account()
+    records = sa.open(sheet).worksheet(worksheet).get(cell_range)
+    _record_ranges({range_name: records}, sheet)
     return records
 
 
-def get_all_prime_items() -> list[str]:
+class PrimePart:
+    """
+    One part (blueprint or component) of a prime set, as listed on the Prime worksheet
+    """
+
+    __slots__ = ('name', 'set_name', 'quantity', 'status')
+
+    def __init__(self, name: str, set_name: str, quantity: int, status: str):
+        self.name = name
+        self.set_name = set_name
+        self.quantity = quantity  # None when the quantity cell is blank
+        self.status = status
+
+    def __repr__(self) -> str:
+        return f'PrimePart({self.name!r}, quantity={self.quantity}, status={self.status!r})'
+
+
+_prime_parts: tuple[list[list[str]], list[PrimePart]] = None
+
+
+def parse_prime_parts(records: list[list[str]]) -> list[PrimePart]:
+    """
+    Parses the Prime worksheet into one entry per part, in a single pass
+    Each row holds the set name, then (part, quantity, spare) cells for the blueprint and up to
+    four components, and the build status in column Q
+
+    Args:
+        records (list[list[str]]): Rows of the Prime range
+
+    Returns:
+        list[PrimePart]: Parts in sheet order
+    """
+
+    parts = []
+    for row in records:
+        if len(row) < PRIME_COLUMNS:
+            # The Sheets API drops trailing empty cells
+            row = row + [''] * (PRIME_COLUMNS - len(row))
+        set_name = row[0].replace(' ', '_').lower()
+        status = row[PRIME_STATUS_COLUMN]
+        for column in PRIME_PART_COLUMNS:
+            part = row[column]
+            if part:
+                quantity = row[column + 1]
+                parts.append(PrimePart(f'{set_name}_prime_{part.replace(" ", "_").lower()}', set_name,
+                                       int(quantity) if quantity else None, status))
+    return parts
+
+
+def get_prime_parts(sheet: str = SHEET) -> list[PrimePart]:
+    """
+    Returns the parsed Prime worksheet
+    The table is only rebuilt when the inventory snapshot changed since the last call
+
+    Args:
+        sheet (str): Google Sheet holding the inventory
+
+    Returns:
+        list[PrimePart]: Parts in sheet order
+    """
+
+    global _prime_parts
+    records = read_data_from_sheet(sheet=sheet, worksheet=PRIME_WORKSHEET, cell_range=PRIME_RANGE)
+    if _prime_parts is None or _prime_parts[0] is not records:
+        _prime_parts = (records, parse_prime_parts(records))
+    return _prime_parts[1]
+
+
+def get_all_prime_items(sheet: str = SHEET) -> list[str]:
     """
     Returns names compatible with Warframe Market for the prime parts
 
+    Args:
+        sheet (str): Google Sheet holding the inventory
+
     Returns:
         [list[str]]: List containing prime part names (e.g guandao_prime_blueprint)
     """
-    records = read_data_from_sheet(sheet=SHEET, worksheet=PRIME_WORKSHEET, cell_range=PRIME_RANGE)
-    all_items = []
-        
-    for row in records:      
-        base_name = row[0].replace(" ", "_")
-        blueprint = row[1]
-        first_component = row[4]
-        second_component = row[7]
-        third_component = row[10]
-        fourth_component = row[13]
-    
-        # Blueprint
-        if len(blueprint):
-            if base_name.lower() == 'kavasa':
-                continue
-            item_name = f'{base_name}_prime_{blueprint.replace(" ", "_")}'.lower()
-            all_items.append(item_name)
-        
-        # First component
-        if len(first_component):
-            item_name = f'{base_name}_prime_{first_component.replace(" ", "_")}'.lower()
-            all_items.append(item_name)
-            
-        # Second component
-        if len(second_component):
-            item_name = f'{base_name}_prime_{second_component.replace(" ", "_")}'.lower()
-            all_items.append(item_name)
-            
-        # Third component
-        if len(third_component):
-            item_name = f'{base_name}_prime_{third_component.replace(" ", "_")}'.lower()
-            all_items.append(item_name)
-
-        # Fourth component
-        if len(fourth_component):
-            item_name = f'{base_name}_prime_{fourth_component.replace(" ", "_")}'.lower()
-            all_items.append(item_name)
-
-    return all_items
-
-
-def get_prime_items_to_sell() -> OwnedItem:
+
+    return [part.name for part in get_prime_parts(sheet) if part.set_name != 'kavasa']
+
+
+def get_prime_items_to_sell(sheet: str = SHEET) -> OwnedItem:
     """
     Returns the names and quantity of prime parts that we can sell
     These are parts that we have already used / built
-    
+
+    Args:
+        sheet (str): Google Sheet holding the inventory
+
     Returns:
         str: Item and quantity (e.g 'zakti_prime_barrel': 4)
     """
-    records = read_data_from_sheet(sheet=SHEET, worksheet=PRIME_WORKSHEET, cell_range=PRIME_RANGE)
-    owned_items = {} 
-        
-    for row in records:
-        if row[16] == 'BUILD':
-            continue
-        base_name = row[0].replace(" ", "_")
-        blueprint = row[1]
-        blueprint_quantity = int(row[2]) if len(row[2]) else 0
-        first_component = row[4]
-        first_component_quantity = int(row[5]) if len(row[5]) else 0
-        second_component = row[7]
-        second_component_quantity = int(row[8]) if len(row[8]) else 0
-        third_component = row[10]
-        third_component_quantity = int(row[11]) if len(row[11]) else 0
-        fourth_component = row[13]
-        fourth_component_quantity = int(row[14]) if len(row[14]) else 0
-
-        # Blueprint
-        if len(blueprint) and blueprint_quantity > 0:
-            item_name = f'{base_name}_prime_{blueprint.replace(" ", "_")}'.lower()
-            owned_items[item_name] = blueprint_quantity
-            
-        # First component
-        if len(first_component) and first_component_quantity > 0:
-            item_name = f'{base_name}_prime_{first_component.replace(" ", "_")}'.lower()
-            owned_items[item_name] = first_component_quantity
-                
-        # Second component
-        if len(second_component) and second_component_quantity > 0:
-            item_name = f'{base_name}_prime_{second_component.replace(" ", "_")}'.lower()
-            owned_items[item_name] = second_component_quantity
-                
-        # Third component
-        if len(third_component) and third_component_quantity > 0:
-            item_name = f'{base_name}_prime_{third_component.replace(" ", "_")}'.lower()
-            owned_items[item_name] = third_component_quantity
-
-        # Fourth component
-        if len(fourth_component) and fourth_component_quantity > 0:
-            item_name = f'{base_name}_prime_{fourth_component.replace(" ", "_")}'.lower()
-            owned_items[item_name] = fourth_component_quantity
 
-    return owned_items
+    return {part.name: part.quantity for part in get_prime_parts(sheet)
+            if part.status != 'BUILD' and part.quantity is not None and part.quantity > 0}
 
 
-def get_prime_items_to_buy() -> list[str]:
+def get_prime_items_to_buy(sheet: str = SHEET) -> list[str]:
     """
     Returns a list of missing prime parts
 
+    Args:
+        sheet (str): Google Sheet holding the inventory
+
     Returns:
         list[str]: List of missing prime parts (e.g. 'mag_prime_systems')
     """
-    records = read_data_from_sheet(sheet=SHEET, worksheet=PRIME_WORKSHEET, cell_range=PRIME_RANGE)
-    needed_items = []
-    
-    for row in records:
-        if row[16] == 'YES':
-            continue
-        
-        base_name = row[0].replace(" ", "_")
-        blueprint = row[1]
-        blueprint_quantity = int(row[2]) if len(row[2]) else -1
-        first_component = row[4]
-        first_component_quantity = int(row[5]) if len(row[5]) else -1
-        second_component = row[7]
-        second_component_quantity = int(row[8]) if len(row[8]) else -1
-        third_component = row[10]
-        third_component_quantity = int(row[11]) if len(row[11]) else -1
-        fourth_component = row[13]
-        fourth_component_quantity = int(row[14]) if len(row[14]) else 0
-
-    # Blueprint
-        if len(blueprint) and blueprint_quantity == 0:
-            item_name = f'{base_name}_prime_{blueprint.replace(" ", "_")}'.lower()
-            needed_items.append(item_name)
-        
-    # First component
-        if len(first_component) and first_component_quantity == 0:
-            item_name = f'{base_name}_prime_{first_component.replace(" ", "_")}'.lower()
-            needed_items.append(item_name)
-            
-    # Second component
-        if len(second_component) and second_component_quantity == 0:
-            item_name = f'{base_name}_prime_{second_component.replace(" ", "_")}'.lower()
-            needed_items.append(item_name)
-            
-    # Third component
-        if len(third_component) and third_component_quantity == 0:
-            item_name = f'{base_name}_prime_{third_component.replace(" ", "_")}'.lower()
-            needed_items.append(item_name)
-
-    # Fourth component
-        if len(fourth_component) and fourth_component_quantity == 0:
-            item_name = f'{base_name}_prime_{fourth_component.replace(" ", "_")}'.lower()
-            needed_items.append(item_name)
-
-    return needed_items
-
-
-def get_items_to_sell() -> OwnedItem:
+
+    return [part.name for part in get_prime_parts(sheet) if part.status != 'YES' and part.quantity == 0]
+
+
+def get_prime_sets_to_complete(sheet: str = SHEET) -> dict[str, list[str]]:
+    """
+    Returns the missing prime parts grouped by set
+
+    Args:
+        sheet (str): Google Sheet holding the inventory
+
+    Returns:
+        dict[str, list[str]]: Set name and its missing parts (e.g. 'mag': ['mag_prime_systems'])
+    """
+
+    sets = {}
+    for part in get_prime_parts(sheet):
+        if part.status != 'YES' and part.quantity == 0:
+            sets.setdefault(part.set_name, []).append(part.name)
+    return sets
+
+
+def get_items_to_sell(sheet: str = SHEET) -> OwnedItem:
     """
     Returns the names and quantity of items that we can sell
     These are parts that we have already used / built
 
+    Args:
+        sheet (str): Google Sheet holding the inventory
+
     Returns:
         str: Item and quantity (e.g 'epitaph set': 4)
     """
-    records = read_data_from_sheet(sheet=SHEET, worksheet=ITEM_WORKSHEET, cell_range=ITEM_RANGE)
+    records = read_data_from_sheet(sheet=sheet, worksheet=ITEM_WORKSHEET, cell_range=ITEM_RANGE)
     owned_items = {}
 
     for row in records:
@@ -213,22 +338,27 @@ def get_items_to_sell() -> OwnedItem:
     return owned_items
 
 
-def get_mods_to_sell() -> OwnedItem:
+def get_mods_to_sell(sheet: str = SHEET) -> OwnedItem:
     """
     Returns the names and quantity of mods that we can sell
+    Mods are keyed by name and rank, so copies at different ranks are listed separately
+
+    Args:
+        sheet (str): Google Sheet holding the inventory
 
     Returns:
-        str: Item and quantity (e.g 'flow': 4)
+        str: Item and quantity (e.g 'flow@0': 4)
     """
-    records = read_data_from_sheet(sheet=SHEET, worksheet=MODS_WORKSHEET, cell_range=MODS_RANGE)
+    records = read_data_from_sheet(sheet=sheet, worksheet=MODS_WORKSHEET, cell_range=MODS_RANGE)
     owned_items = {}
 
     for row in records:
         base_name = row[0]
         quantity = int(row[1])
+        rank = int(row[2]) if len(row) > 2 and len(row[2]) else 0
 
         if len(base_name) and quantity > 0:
-            owned_items[base_name] = quantity
+            owned_items[ranked_item(base_name, rank)] = quantity
 
     return owned_items
 
@@ -1,4 +1,140 @@
 import csv
+import os
+import threading
+
+from database.catalogue import ItemDatabase
+
+ITEM_DATABASE = 'database/prime_items.db'
+NOT_FOUND = 'Not found'
+
+
+class ItemCatalogue:
+    """
+    In-memory index of the local item database
+    The file is read once; lookups work in both directions (name -> ID and ID -> name)
+    Items missing from the file are looked up in the synced catalogue (see database.catalogue) when one is given
+    """
+
+    def __init__(self, path: str = ITEM_DATABASE, database: ItemDatabase = None):
+        self.path = path
+        self.database = database
+        self._ids: dict[str, str] = {}
+        self._names: dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._resolving: dict[str, threading.Lock] = {}
+
+        try:
+            with open(path, 'r', newline='') as f:
+                for row in csv.reader(f, delimiter=','):
+                    if len(row) >= 2:
+                        self._add(row[0], row[1])
+        except FileNotFoundError:
+            pass
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, item: str) -> bool:
+        return self.get_id(item) is not None
+
+    def get_id(self, item: str) -> str:
+        """
+        Find the warframe.market ID of an item
+
+        Args:
+            item (str): Item name (e.g. mirage_prime_systems)
+
+        Returns:
+            str: Item ID (e.g. 5a2feeb1c2c9e90cbdaa23d2) or None if the item is unknown
+        """
+
+        item_id = self._ids.get(item)
+        if item_id is None and self.database is not None:
+            item_id = self.database.get_id(item)
+        return item_id
+
+    def get_name(self, item_id: str) -> str:
+        """
+        Find the item name for a warframe.market ID
+
+        Args:
+            item_id (str): Item ID (e.g. 5a2feeb1c2c9e90cbdaa23d2)
+
+        Returns:
+            str: Item name (e.g. mirage_prime_systems) or None if the ID is unknown
+        """
+
+        name = self._names.get(item_id)
+        if name is None and self.database is not None:
+            found = self.database.get_by_id(item_id)
+            name = found.url_name if found is not None else None
+        return name
+
+    def resolve(self, item: str) -> str:
+        """
+        Find the ID of an item, asking warframe.market when it is neither in the local database nor the catalogue
+        IDs found on the market are saved so the same item never costs a request twice,
+        concurrent lookups of the same item wait for a single request
+
+        Args:
+            item (str): Item name (e.g. mirage_prime_systems)
+
+        Returns:
+            str: Item ID or None if warframe.market does not know the item either
+        """
+
+        item_id = self.get_id(item)
+        if item_id is not None:
+            return item_id
+
+        from warframe_market import warframe_market
+
+        with self._lock:
+            lock = self._resolving.setdefault(item, threading.Lock())
+        with lock:
+            item_id = self.get_id(item)
+            if item_id is None:
+                item_id = warframe_market.get_item_id_from_market(item)
+                if item_id:
+                    self.add(item, item_id)
+        return item_id
+
+    def add(self, item: str, item_id: str) -> None:
+        """
+        Adds an item to the catalogue and rewrites the database file atomically
+
+        Args:
+            item (str): Item name (e.g. mirage_prime_systems)
+            item_id (str): Item ID (e.g. 5a2feeb1c2c9e90cbdaa23d2)
+        """
+
+        with self._lock:
+            self._add(item, item_id)
+            temporary = f'{self.path}.tmp'
+            with open(temporary, 'w', newline='') as f:
+                csv.writer(f, delimiter=',', lineterminator='\n').writerows(self._ids.items())
+            os.replace(temporary, self.path)
+
+    def _add(self, item: str, item_id: str) -> None:
+        self._ids[item] = item_id
+        self._names[item_id] = item
+
+
+_catalogue: ItemCatalogue = None
+
+
+def get_catalogue() -> ItemCatalogue:
+    """
+    Returns the shared catalogue, loading the local database on first use
+
+    Returns:
+        ItemCatalogue: The shared catalogue
+    """
+
+    global _catalogue
+    if _catalogue is None:
+        _catalogue = ItemCatalogue(database=ItemDatabase())
+    return _catalogue
 
 
 def get_item_id_from_file(item: str) -> str:
@@ -12,9 +148,5 @@ def get_item_id_from_file(item: str) -> str:
         str: Item ID as defined on warframe.warframe_market (e.g. 5a2feeb1c2c9e90cbdaa23d2)
     """
 
-    with open('database/prime_items.db', 'r', newline='') as f:
-        csv_reader = csv.reader(f, delimiter=',')
-        for row in csv_reader:
-            if item == row[0]:
-                return row[1]
-    return "Not found"
+    item_id = get_catalogue().get_id(item)
+    return item_id if item_id is not None else NOT_FOUND
@@ -0,0 +1,202 @@
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+PRICE_CACHE = 'database/price_cache.sqlite'
+DEFAULT_TTL = 10 * 60
+DEFAULT_MAX_ENTRIES = 5000
+
+
+def price_cache_path(profile: str = None) -> str:
+    """
+    Returns the cache file of a profile (prices leave out the profile's own orders, so they are not shared)
+
+    Args:
+        profile (str): Profile name, or None for the single-profile cache
+
+    Returns:
+        str: Path of the SQLite file
+    """
+
+    if profile is None:
+        return PRICE_CACHE
+    root, extension = os.path.splitext(PRICE_CACHE)
+    return f'{root}_{profile.lower()}{extension}'
+
+
+class PriceCache:
+    """
+    Lowest prices per item (keyed by URL name) persisted in SQLite between runs
+    Entries expire after ttl seconds and the least recently used ones are evicted past max_entries
+    With stale_while_revalidate, expired prices are still returned while a refresh runs in the background
+    """
+
+    def __init__(self, path: str = PRICE_CACHE, ttl: float = DEFAULT_TTL, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 stale_while_revalidate: bool = False):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stale_while_revalidate = stale_while_revalidate
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+
+        self._lock = threading.Lock()
+        self._refreshing: set[str] = set()
+        self._executor: ThreadPoolExecutor = None
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute('CREATE TABLE IF NOT EXISTS prices ('
+                             'item TEXT PRIMARY KEY, price INTEGER NOT NULL, '
+                             'fetched_at REAL NOT NULL, accessed_at REAL NOT NULL)')
+            self._db.execute('CREATE INDEX IF NOT EXISTS prices_accessed_at ON prices (accessed_at)')
+
+    def peek(self, item: str) -> tuple[int, float]:
+        """
+        Returns the cached entry for item without touching statistics or recency
+
+        Args:
+            item (str): Item name (e.g. mirage_prime_systems)
+
+        Returns:
+            tuple[int, float]: Price and the time it was fetched, or None if the item was never priced
+        """
+
+        with self._lock:
+            return self._db.execute('SELECT price, fetched_at FROM prices WHERE item = ?', (item,)).fetchone()
+
+    def get(self, item: str) -> int:
+        """
+        Returns the cached price for item if it is still fresh
+
+        Args:
+            item (str): Item name (e.g. mirage_prime_systems)
+
+        Returns:
+            int: Cached price or None if missing or expired
+        """
+
+        entry = self.peek(item)
+        if entry is None or time.time() - entry[1] >= self.ttl:
+            return None
+        self._touch(item)
+        return entry[0]
+
+    def set(self, item: str, price: int) -> None:
+        """
+        Stores a freshly fetched price
+
+        Args:
+            item (str): Item name (e.g. mirage_prime_systems)
+            price (int): Lowest price on warframe.market
+        """
+
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute('INSERT OR REPLACE INTO prices VALUES (?, ?, ?, ?)', (item, price, now, now))
+            self._db.execute('DELETE FROM prices WHERE item IN ('
+                             'SELECT item FROM prices ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+                             (self.max_entries,))
+
+    def lookup(self, item: str, refresh: Callable[[], int] = None) -> int:
+        """
+        Returns the cached price for item and records a hit or a miss
+        In stale-while-revalidate mode an expired price is returned and refreshed in the background
+
+        Args:
+            item (str): Item name (e.g. mirage_prime_systems)
+            refresh (Callable[[], int]): Fetches the current price, used to revalidate stale entries
+
+        Returns:
+            int: Cached price or None on a miss
+        """
+
+        entry = self.peek(item)
+        if entry is not None:
+            price, fetched_at = entry
+            if time.time() - fetched_at < self.ttl:
+                self.hits += 1
+                self._touch(item)
+                return price
+            if self.stale_while_revalidate and refresh is not None:
+                self.stale_hits += 1
+                self._touch(item)
+                self.revalidate(item, refresh)
+                return price
+
+        self.misses += 1
+        return None
+
+    def get_or_fetch(self, item: str, fetch: Callable[[], int]) -> int:
+        """
+        Returns the price of item, calling fetch only when the cache cannot answer
+
+        Args:
+            item (str): Item name (e.g. mirage_prime_systems)
+            fetch (Callable[[], int]): Fetches the current price from warframe.market
+
+        Returns:
+            int: Price of the item (None if fetch failed)
+        """
+
+        price = self.lookup(item, fetch)
+        if price is None:
+            price = fetch()
+            if price is not None:
+                self.set(item, price)
+        return price
+
+    def revalidate(self, item: str, fetch: Callable[[], int]) -> None:
+        """
+        Refreshes the price of item in the background (at most one refresh per item at a time)
+
+        Args:
+            item (str): Item name (e.g. mirage_prime_systems)
+            fetch (Callable[[], int]): Fetches the current price from warframe.market
+        """
+
+        with self._lock:
+            if item in self._refreshing:
+                return
+            self._refreshing.add(item)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='price-refresh')
+
+        def refresh() -> None:
+            try:
+                price = fetch()
+                if price is not None:
+                    self.set(item, price)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(item)
+
+        self._executor.submit(refresh)
+
+    def report(self) -> str:
+        """
+        Returns a one-line summary of the cache statistics for this run
+
+        Returns:
+            str: Summary (e.g. 'Price cache: 12 hits, 3 stale hits, 5 misses (75% served from cache)')
+        """
+
+        lookups = self.hits + self.stale_hits + self.misses
+        ratio = (self.hits + self.stale_hits) / lookups if lookups else 0
+        return (f'Price cache: {self.hits} hits, {self.stale_hits} stale hits, {self.misses} misses '
+                f'({ratio:.0%} served from cache)')
+
+    def close(self) -> None:
+        """
+        Waits for background refreshes to finish and closes the database
+        """
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        self._db.close()
+
+    def _touch(self, item: str) -> None:
+        with self._lock, self._db:
+            self._db.execute('UPDATE prices SET accessed_at = ? WHERE item = ?', (time.time(), item))
@@ -0,0 +1,204 @@
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from warframe_market.order_stream import OrderBookSummary
+
+HISTORY_DIRECTORY = 'database/history'
+DEFAULT_WINDOW = 7 * 24 * 60 * 60
+DEFAULT_PERCENTILES = (25, 50, 75)
+
+SNAPSHOTS_FILE = 'snapshots.bin'
+ITEMS_FILE = 'items.txt'
+
+# One fixed-size record per order-book snapshot, all items appended to the same file
+RECORD = np.dtype([
+    ('item', '<i4'),
+    ('timestamp', '<f8'),
+    ('lowest', '<f4'),
+    ('median', '<f4'),
+    ('volume', '<i4'),
+])
+
+
+@dataclass
+class HistoryStats:
+    """
+    Statistics over a time window, one row per item (in the order the items were requested)
+    Items without snapshots in the window have a count of 0 and NaN statistics
+    """
+    items: list[str]
+    count: np.ndarray
+    percentiles: np.ndarray
+    volatility: np.ndarray
+    highest: np.ndarray
+
+    def as_dict(self) -> dict[str, dict]:
+        return {
+            item: {
+                'count': int(self.count[row]),
+                'percentiles': self.percentiles[row].tolist(),
+                'volatility': float(self.volatility[row]),
+                'highest': float(self.highest[row]),
+            }
+            for row, item in enumerate(self.items)
+        }
+
+
+class PriceHistory:
+    """
+    Append-only time series of order-book snapshots stored as fixed-size binary records
+    Item names are interned to integer IDs so that the whole store is one memory-mapped array
+    """
+
+    def __init__(self, directory: str = HISTORY_DIRECTORY):
+        self.directory = directory
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        self._ids: dict[str, int] = {}
+        try:
+            with open(os.path.join(directory, ITEMS_FILE), 'r') as f:
+                for item in f.read().splitlines():
+                    self._ids[item] = len(self._ids)
+        except FileNotFoundError:
+            pass
+
+    def record(self, item: str, summary: OrderBookSummary, timestamp: float = None) -> None:
+        """
+        Appends an order-book snapshot (usable as a warframe_market order-book listener)
+
+        Args:
+            item (str): Item name (e.g. mirage_prime_systems)
+            summary (OrderBookSummary): Summary of the fetched order book
+            timestamp (float): Unix time of the snapshot (defaults to now)
+        """
+
+        if summary.lowest is None:
+            return
+
+        with self._lock:
+            item_id = self._ids.get(item)
+            if item_id is None:
+                item_id = self._ids[item] = len(self._ids)
+                with open(os.path.join(self.directory, ITEMS_FILE), 'a') as f:
+                    f.write(f'{item}\n')
+
+            row = np.array([(item_id, timestamp or time.time(), summary.lowest, summary.median, summary.volume)],
+                           dtype=RECORD)
+            with open(os.path.join(self.directory, SNAPSHOTS_FILE), 'ab') as f:
+                f.write(row.tobytes())
+
+    def snapshots(self) -> np.ndarray:
+        """
+        Returns every recorded snapshot, oldest first
+
+        Returns:
+            np.ndarray: Read-only records with item, timestamp, lowest, median and volume columns
+        """
+
+        path = os.path.join(self.directory, SNAPSHOTS_FILE)
+        try:
+            length = os.path.getsize(path) // RECORD.itemsize
+        except OSError:
+            length = 0
+        if not length:
+            return np.empty(0, dtype=RECORD)
+        return np.memmap(path, dtype=RECORD, mode='r', shape=(length,))
+
+    def series(self, item: str) -> np.ndarray:
+        """
+        Returns every snapshot of an item, oldest first
+
+        Args:
+            item (str): Item name (e.g. mirage_prime_systems)
+
+        Returns:
+            np.ndarray: Records with item, timestamp, lowest, median and volume columns
+        """
+
+        item_id = self._ids.get(item)
+        data = self.snapshots()
+        if item_id is None:
+            return data[:0]
+        return data[data['item'] == item_id]
+
+    def stats(self, items: list[str], window: float = DEFAULT_WINDOW,
+              percentiles: tuple[float, ...] = DEFAULT_PERCENTILES, now: float = None) -> HistoryStats:
+        """
+        Computes percentiles, volatility and the highest lowest price of many items at once
+        Every statistic is a grouped numpy reduction over the whole store, there is no per-item loop
+
+        Args:
+            items (list[str]): Item names
+            window (float): Only snapshots younger than this many seconds are used
+            percentiles (tuple[float, ...]): Percentiles of the lowest price to compute
+            now (float): End of the window (defaults to now)
+
+        Returns:
+            HistoryStats: Statistics per item
+        """
+
+        data = self.snapshots()
+
+        # Map stored item IDs to rows of the result, -1 for items that were not requested
+        rows = np.full(len(self._ids) + 1, -1, dtype=np.int64)
+        for row, item in enumerate(items):
+            item_id = self._ids.get(item)
+            if item_id is not None:
+                rows[item_id] = row
+        groups = rows[np.minimum(data['item'], len(self._ids))]
+
+        keep = (groups >= 0) & (data['timestamp'] >= (now or time.time()) - window)
+        groups = groups[keep]
+        # Stable sort keeps each item's snapshots in chronological order
+        chronological = np.argsort(groups, kind='stable')
+        groups = groups[chronological]
+        prices = data['lowest'][keep][chronological].astype(np.float64)
+        count = np.bincount(groups, minlength=len(items))
+
+        # Percentiles: sort by (item, price) and interpolate inside each item's slice
+        ordered = prices[np.lexsort((prices, groups))]
+        starts = np.concatenate(([0], np.cumsum(count)[:-1]))
+        result = np.full((len(items), len(percentiles)), np.nan)
+        present = count > 0
+        for column, percentile in enumerate(percentiles):
+            position = starts[present] + (count[present] - 1) * (percentile / 100)
+            lower = np.floor(position).astype(np.int64)
+            upper = np.ceil(position).astype(np.int64)
+            fraction = position - lower
+            result[present, column] = ordered[lower] * (1 - fraction) + ordered[upper] * fraction
+
+        highest = np.full(len(items), np.nan)
+        highest[present] = ordered[starts[present] + count[present] - 1]
+
+        # Volatility: standard deviation of log returns between consecutive snapshots of the same item
+        same_item = groups[1:] == groups[:-1]
+        returns = np.diff(np.log(np.maximum(prices, 1)))[same_item]
+        return_groups = groups[1:][same_item]
+        return_count = np.bincount(return_groups, minlength=len(items))
+        total = np.bincount(return_groups, weights=returns, minlength=len(items))
+        total_squared = np.bincount(return_groups, weights=returns ** 2, minlength=len(items))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = total / return_count
+            volatility = np.sqrt(np.maximum(total_squared / return_count - mean ** 2, 0))
+
+        return HistoryStats(list(items), count, result, volatility, highest)
+
+    def ceilings(self, items: list[str], window: float = DEFAULT_WINDOW) -> dict[str, int]:
+        """
+        Returns the highest lowest price of each item within the window
+
+        Args:
+            items (list[str]): Item names
+            window (float): Only snapshots younger than this many seconds are used
+
+        Returns:
+            dict[str, int]: Ceiling per item, items without history are left out
+        """
+
+        stats = self.stats(items, window, percentiles=())
+        return {item: int(highest) for item, highest, count in zip(items, stats.highest, stats.count) if count}
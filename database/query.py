@@ -1,10 +1,203 @@
-from operator import itemgetter
+import asyncio
+import heapq
+import time
+from typing import TYPE_CHECKING, AsyncIterator
 
 from database.google_sheets import OwnedItem
+from database.price_cache import PriceCache
 from warframe_market import warframe_market
+from warframe_market.order_stream import ranked_item, split_ranked_item
 
+if TYPE_CHECKING:
+    from database.price_history import PriceHistory
 
-def find_most_expensive_items_to_sell(profile: str, item_list: OwnedItem, num: int = 20, ) -> list[list[str, int, int]]:
+DEFAULT_CONCURRENCY = 4
+PRICE_CEILING_HEADROOM = 1.25  # How far above its last known price an item is assumed to be able to go
+
+
+class TopDeals:
+    """
+    Bounded min-heap holding the `num` most expensive deals seen so far
+    Once full, the cheapest kept price is the bar any other item has to beat
+    """
+
+    def __init__(self, num: int):
+        self.num = num
+        self.skipped = 0
+        self._heap: list[tuple[int, str, list[str, int, int]]] = []
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    @property
+    def floor(self) -> int:
+        """
+        Returns the cheapest price in the top `num`, or None while there is still room (or no top is kept)
+        """
+        if not self._heap or len(self._heap) < self.num:
+            return None
+        return self._heap[0][0]
+
+    def push(self, deal: list[str, int, int]) -> None:
+        """
+        Offers a priced deal, keeping it only if it belongs to the top `num`
+
+        Args:
+            deal (list[str, int, int]): Item, price and quantity
+        """
+        # Ties are broken by name rather than arrival order, so the selection does not depend on timing
+        entry = (deal[1], deal[0], deal)
+        if len(self._heap) < self.num:
+            heapq.heappush(self._heap, entry)
+        elif self.num > 0:
+            heapq.heappushpop(self._heap, entry)
+
+    def can_improve(self, ceiling: int) -> bool:
+        """
+        Tells whether an item whose price cannot exceed ceiling could still enter the top `num`
+
+        Args:
+            ceiling (int): Upper bound for the item's price (None when unknown)
+        """
+        if self.num <= 0:
+            # Nothing can enter an empty top
+            return False
+        floor = self.floor
+        return ceiling is None or floor is None or ceiling > floor
+
+    def deals(self) -> list[list[str, int, int]]:
+        """
+        Returns the kept deals, most expensive first
+        """
+        return [deal for _, _, deal in sorted(self._heap, reverse=True)]
+
+
+def price_ceilings(item_list: OwnedItem, cache: PriceCache = None, history: 'PriceHistory' = None) -> dict[str, int]:
+    """
+    Estimates the highest price each item could be listed at from previously fetched prices
+    The recorded history gives the highest recent price, the cache the last known price plus headroom
+
+    Args:
+        item_list (OwnedItem): Items and quantities
+        cache (PriceCache): Cache holding the last known prices (expired entries included)
+        history (PriceHistory): Recorded order-book snapshots
+
+    Returns:
+        dict[str, int]: Price ceiling per item, items never priced before are left out
+    """
+
+    ceilings = history.ceilings(list(item_list)) if history is not None else {}
+    if cache is not None:
+        for item in item_list:
+            entry = cache.peek(item)
+            if entry is not None:
+                ceilings[item] = max(ceilings.get(item, 0), int(entry[0] * PRICE_CEILING_HEADROOM))
+    return ceilings
+
+
+async def scan_lowest_prices(profile: str, item_list: OwnedItem, concurrency: int = DEFAULT_CONCURRENCY,
+                             cache: PriceCache = None, top: TopDeals = None,
+                             ceilings: dict[str, int] = None) -> AsyncIterator[list[str, int, int]]:
+    """
+    Prices every owned item on warframe.market, keeping several requests in flight
+    Results are yielded as soon as they arrive, not in inventory order
+
+    When `top` is given, priced deals are pushed into it straight away and items whose ceiling
+    cannot beat the current top are skipped without a request (and not yielded)
+
+    Args:
+        profile (str): Our profile name on warframe.market
+        item_list (OwnedItem): Items and quantities (e.g. 'zakti_prime_barrel': 4)
+        concurrency (int): Maximum number of order-book requests in flight
+        cache (PriceCache): Cache answering lookups for recently priced items
+        top (TopDeals): Bounded selection of the most expensive deals
+        ceilings (dict[str, int]): Upper bound of the price of each item (see price_ceilings)
+
+    Returns:
+        AsyncIterator[list[str, int, int]]: Deals as they are priced (e.g [item, price, quantity])
+    """
+
+    semaphore = asyncio.Semaphore(concurrency)
+    rank_fetches: dict[str, asyncio.Future] = {}
+    ranked_keys: dict[str, list[str]] = {}
+    for key in item_list:
+        mod, rank = split_ranked_item(key)
+        if rank is not None:
+            ranked_keys.setdefault(mod, []).append(key)
+    ceilings = ceilings or {}
+
+    def priced(item: str, price: int) -> list[str, int, int]:
+        deal = [item, price, item_list[item]]
+        if top is not None and price is not None:
+            top.push(deal)
+        return deal
+
+    async def price_item(item: str) -> list[str, int, int]:
+        price = warframe_market.find_lowest_price_locally(profile, item)
+        if price is not None:
+            return priced(item, price)
+
+        if cache is not None:
+            price = cache.lookup(item, lambda: warframe_market.find_lowest_price_for_item(profile, item))
+            if price is not None:
+                return priced(item, price)
+
+        mod, rank = split_ranked_item(item)
+        if rank is not None:
+            return await price_ranked_item(item, mod, rank)
+
+        async with semaphore:
+            if top is not None and not top.can_improve(ceilings.get(item)):
+                top.skipped += 1
+                return None
+            print(f'Checking {item}...')
+            price = await asyncio.to_thread(warframe_market.find_lowest_price_for_item, profile, item)
+            if cache is not None and price is not None:
+                cache.set(item, price)
+            return priced(item, price)
+
+    async def fetch_ranks(mod: str) -> tuple[bool, dict[int, int]]:
+        async with semaphore:
+            if top is not None and not any(top.can_improve(ceilings.get(key)) for key in ranked_keys[mod]):
+                top.skipped += len(ranked_keys[mod])
+                return True, None
+            print(f'Checking {mod} (all ranks)...')
+            prices = await asyncio.to_thread(warframe_market.find_lowest_prices_by_rank, profile, mod)
+        if cache is not None and prices is not None:
+            for rank, price in prices.items():
+                cache.set(ranked_item(mod, rank), price)
+        return False, prices
+
+    async def price_ranked_item(item: str, mod: str, rank: int) -> list[str, int, int]:
+        # Every rank of a mod is priced from the same order book, fetched once
+        if mod not in rank_fetches:
+            rank_fetches[mod] = asyncio.ensure_future(fetch_ranks(mod))
+        skipped, prices = await rank_fetches[mod]
+        if skipped:
+            return None
+        price = prices.get(rank, warframe_market.NO_SELLER_PRICE) if prices is not None else None
+        if cache is not None and price is not None:
+            cache.set(item, price)
+        return priced(item, price)
+
+    # Likely expensive items go first so the bar rises early and more of the rest can be skipped
+    items = sorted(item_list, key=lambda item: ceilings.get(item, -1), reverse=True)
+    tasks = [asyncio.create_task(price_item(item)) for item in items]
+    try:
+        for next_deal in asyncio.as_completed(tasks):
+            deal = await next_deal
+            if deal is not None:
+                yield deal
+    finally:
+        for task in [*tasks, *rank_fetches.values()]:
+            task.cancel()
+
+
+def find_most_expensive_items_to_sell(profile: str, item_list: OwnedItem, num: int = 20,
+                                      concurrency: int = DEFAULT_CONCURRENCY,
+                                      cache: PriceCache = None,
+                                      history: 'PriceHistory' = None, known: list[list[str, int, int]] = None,
+                                      priced: dict[str, list] = None) -> list[list[str, int, int]]:
     """
     Go through the list of owned items and find the most expensive ones on warframe.warframe_market
     Since we have a limit of 100 orders, we will return 95 (in case we have non-prime orders going)
@@ -13,16 +206,42 @@ def find_most_expensive_items_to_sell(profile: str, item_list: OwnedItem, num: i
         profile (str): Our profile name on warframe.market
         item_list (str): JSON file containing the results from "get_items_to_sell"
         num (int): Number of deals to return
+        concurrency (int): Maximum number of order-book requests in flight
+        cache (PriceCache): Cache answering lookups for recently priced items (also used to skip cheap items)
+        history (PriceHistory): Recorded prices used to skip items that cannot reach the top
+        known (list[list[str, int, int]]): Deals priced beforehand (e.g. by the last run), competing without a lookup
+        priced (dict[str, list]): Filled with every price looked up during the scan and when it was found
+            ([price, unix time]); prices served by the cache keep the time their cache entry was fetched
 
     Returns:
         list[list[str, int, int]]: List of lists (e.g [[item1, price, quantity], [item2, price, quantity]])
     """
 
-    deals_to_make = []
-    for item in item_list:
-        print(f'Checking {item}...')
-        price = warframe_market.find_lowest_price_for_item(profile, item)
-        quantity = item_list[item]
-        deals_to_make.append([item, price, quantity])
+    top = TopDeals(num)
+    for deal in known or []:
+        top.push(deal)
+    ceilings = price_ceilings(item_list, cache, history)
+    started = time.time()
+
+    def found(item: str, price: int) -> list:
+        entry = cache.peek(item) if cache is not None else None
+        if entry is not None:
+            cached_price, fetched_at = entry
+            if cached_price == price:
+                return [price, fetched_at]
+            if fetched_at >= started:
+                # Served stale while the background refresh stored a newer price
+                return [cached_price, fetched_at]
+        return [price, time.time()]
+
+    async def collect() -> None:
+        async for item, price, _ in scan_lowest_prices(profile, item_list, concurrency, cache=cache, top=top,
+                                                       ceilings=ceilings):
+            if priced is not None and price is not None:
+                priced[item] = found(item, price)
+
+    asyncio.run(collect())
+    if top.skipped:
+        print(f'Skipped {top.skipped} items that cannot reach the top {num}')
 
-    return sorted(deals_to_make, key=itemgetter(1), reverse=True)[:num]
+    return top.deals()
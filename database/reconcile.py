@@ -0,0 +1,258 @@
+import asyncio
+from dataclasses import dataclass, field
+from typing import Callable
+
+import requests
+
+from database.local import ItemCatalogue, get_catalogue
+from warframe_market import warframe_market
+from warframe_market.cassette import CassetteMiss
+from warframe_market.order_stream import ranked_names, split_ranked_item
+from warframe_market.warframe_market import ExistingPrimeOrder, NewPrimeOrder
+
+MUTATION_CONCURRENCY = 4
+MUTATION_RETRIES = 3
+RETRY_BACKOFF = 1.0  # Seconds before the first retry, doubled for every further attempt
+REJECTED_STATUSES = (429, 503)  # Answered before the request is processed, so safe to send again
+
+
+@dataclass
+class OrderUpdate:
+    """
+    Existing order whose price or quantity no longer matches the deal
+    """
+    order: ExistingPrimeOrder
+    price: int
+    quantity: int
+
+
+@dataclass
+class ReconciliationPlan:
+    """
+    Minimal set of mutations that turns the current orders into the wanted ones
+    """
+    to_create: list[list[str, int, int]] = field(default_factory=list)
+    to_update: list[OrderUpdate] = field(default_factory=list)
+    to_delete: list[ExistingPrimeOrder] = field(default_factory=list)
+    unchanged: list[ExistingPrimeOrder] = field(default_factory=list)
+
+    @property
+    def mutations(self) -> int:
+        return len(self.to_create) + len(self.to_update) + len(self.to_delete)
+
+
+@dataclass
+class MutationResult:
+    """
+    Outcome of one order mutation sent to warframe.market
+    """
+    action: str  # 'delete', 'update' or 'create'
+    item: str
+    order_id: str = None
+    succeeded: bool = False
+    attempts: int = 0
+    error: str = None
+
+
+@dataclass
+class MutationReport:
+    """
+    Outcome of every mutation of a plan
+    """
+    results: list[MutationResult] = field(default_factory=list)
+
+    @property
+    def succeeded(self) -> list[MutationResult]:
+        return [result for result in self.results if result.succeeded]
+
+    @property
+    def failed(self) -> list[MutationResult]:
+        return [result for result in self.results if not result.succeeded]
+
+    def summary(self) -> str:
+        counts = ', '.join(f'{action} {sum(result.succeeded for result in self.results if result.action == action)}/'
+                           f'{sum(result.action == action for result in self.results)}'
+                           for action in ('delete', 'update', 'create'))
+        retried = sum(result.attempts > 1 for result in self.results)
+        return f'Orders sent: {counts}, {len(self.failed)} failed, {retried} retried'
+
+
+def plan_reconciliation(existing_orders: list[ExistingPrimeOrder],
+                        best_deals: list[list[str, int, int]]) -> ReconciliationPlan:
+    """
+    Compares our current sell orders with the deals we want to list
+    Mods are matched by name and rank, so each rank has its own order. Items whose deals are not rank-qualified
+    are matched by name only, even when their orders carry a rank (e.g. arcanes on the Items sheet)
+
+    Args:
+        existing_orders (list[ExistingPrimeOrder]): Orders as returned by get_existing_orders
+        best_deals (list[list[str, int, int]]): Deals as returned by find_most_expensive_items_to_sell
+
+    Returns:
+        ReconciliationPlan: Orders to create, update and delete
+    """
+
+    plan = ReconciliationPlan()
+    current = {}
+    ranked = ranked_names(item for item, _, _ in best_deals)
+
+    for order in existing_orders:
+        key = order.inventory_key(ranked)
+        if key in current:
+            # Only one order per item is kept, duplicates are removed
+            plan.to_delete.append(order)
+        else:
+            current[key] = order
+
+    for item, price, quantity in best_deals:
+        price, quantity = int(price), int(quantity)
+        order = current.pop(item, None)
+        if order is None:
+            plan.to_create.append([item, price, quantity])
+        elif order.platinum != price or order.quantity != quantity:
+            plan.to_update.append(OrderUpdate(order, price, quantity))
+        else:
+            plan.unchanged.append(order)
+
+    plan.to_delete.extend(current.values())
+    return plan
+
+
+def is_transient(error: Exception, idempotent: bool = True) -> bool:
+    """
+    Tells whether a failed mutation is worth sending again
+
+    Args:
+        error (Exception): Error raised by the mutation
+        idempotent (bool): Whether sending the request twice is harmless (false for creating an order)
+
+    Returns:
+        bool: True for connection problems, timeouts, throttling and server errors. When the request is not
+        idempotent, only for errors raised before the request was processed (429, 503 and connect timeouts)
+    """
+
+    if isinstance(error, CassetteMiss):
+        return False
+    if isinstance(error, requests.HTTPError):
+        status = error.response.status_code if error.response is not None else None
+        if status is None:
+            return False
+        return status in REJECTED_STATUSES if not idempotent else status >= 500 or status == 429
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    # An order may have been created when the connection dropped or the response timed out
+    return idempotent and isinstance(error, (requests.Timeout, requests.ConnectionError))
+
+
+def may_have_landed(error: Exception) -> bool:
+    """
+    Tells whether a failed request may still have been processed by warframe.market
+    (e.g. a 500 or a connection reset after the request was sent)
+    """
+
+    return is_transient(error) and not is_transient(error, idempotent=False)
+
+
+async def _send(result: MutationResult, mutation: Callable[[], str], semaphore: asyncio.Semaphore,
+                retries: int, idempotent: bool = True, landed: Callable[[], bool] = None) -> MutationResult:
+    for attempt in range(retries + 1):
+        if attempt:
+            await asyncio.sleep(RETRY_BACKOFF * 2 ** (attempt - 1))
+        result.attempts += 1
+        try:
+            async with semaphore:
+                if await asyncio.to_thread(mutation) is not None:
+                    result.succeeded, result.error = True, None
+                    return result
+            result.error = 'unexpected response'
+            return result
+        except Exception as err:
+            result.error = str(err) or type(err).__name__
+            if is_transient(err, idempotent):
+                continue
+            if idempotent or landed is None or not may_have_landed(err):
+                return result
+            # Only sent again once our orders show that the first attempt did not go through
+            found = await asyncio.to_thread(landed)
+            if found is None:
+                return result
+            if found:
+                result.succeeded, result.error = True, None
+                return result
+    return result
+
+
+def apply_reconciliation(auth_token: str, plan: ReconciliationPlan, catalogue: ItemCatalogue = None,
+                         concurrency: int = MUTATION_CONCURRENCY, retries: int = MUTATION_RETRIES,
+                         profile: str = None) -> MutationReport:
+    """
+    Sends the mutations of a plan to warframe.market, keeping several requests in flight
+    Deletions and updates go first so that the order limit is never exceeded, then new orders are created.
+    Requests are paced by the rate governor; connection problems, timeouts and server errors are retried.
+    A create that may have gone through is only sent again once the profile's orders show it was not listed
+
+    Args:
+        auth_token (str): JWT Authentication token
+        plan (ReconciliationPlan): Plan as returned by plan_reconciliation
+        catalogue (ItemCatalogue): Catalogue used to find the IDs of new items
+        concurrency (int): Maximum number of mutations in flight
+        retries (int): Attempts added for each mutation failing with a transient error
+        profile (str): Profile whose orders are read to tell whether a failed create went through before
+            sending it again (without it, creates are only retried when they were certainly not processed)
+
+    Returns:
+        MutationReport: The outcome of every mutation
+    """
+
+    if catalogue is None:
+        catalogue = get_catalogue()
+
+    def delete(order: ExistingPrimeOrder) -> Callable[[], str]:
+        print(f'Deleting order {order.order_id} ({order.item_key})')
+        return lambda: warframe_market.delete_existing_order(auth_token, order, raise_errors=True)
+
+    def update(change: OrderUpdate) -> Callable[[], str]:
+        print(f'Updating order {change.order.order_id} ({change.order.item_key}): '
+              f'{change.order.platinum}p x{change.order.quantity} -> {change.price}p x{change.quantity}')
+        return lambda: warframe_market.update_existing_order(auth_token, change.order, change.price, change.quantity,
+                                                             raise_errors=True)
+
+    def created(item: str) -> Callable[[], bool]:
+        def landed() -> bool:
+            orders = warframe_market.get_existing_orders(profile)
+            if orders is None:
+                return None
+            ranked = ranked_names([item])
+            return any(order.inventory_key(ranked) == item for order in orders)
+        return landed
+
+    async def run() -> list[MutationResult]:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def create(item: str, price: int, quantity: int) -> MutationResult:
+            result = MutationResult('create', item)
+            item_name, rank = split_ranked_item(item)
+            item_id = await asyncio.to_thread(catalogue.resolve, item_name)
+            if item_id is None:
+                result.error = 'item ID not found'
+                return result
+            print(f'Adding order: {item_id} ({item})')
+            new_order = NewPrimeOrder(item_id, price, quantity, rank)
+            mutation = lambda: warframe_market.create_new_order(auth_token, new_order, raise_errors=True)
+            return await _send(result, mutation, semaphore, retries, idempotent=False,
+                               landed=created(item) if profile is not None else None)
+
+        removals = [_send(MutationResult('delete', order.item_key, order.order_id), delete(order), semaphore, retries)
+                    for order in plan.to_delete]
+        removals += [_send(MutationResult('update', change.order.item_key, change.order.order_id), update(change),
+                           semaphore, retries) for change in plan.to_update]
+        results = list(await asyncio.gather(*removals))
+        results += await asyncio.gather(*(create(item, int(price), int(quantity))
+                                          for item, price, quantity in plan.to_create))
+        return results
+
+    report = MutationReport(asyncio.run(run()))
+    for result in report.failed:
+        print(f'Could not {result.action} {result.item} ({result.attempts} attempts): {result.error}')
+    print(report.summary())
+    return report
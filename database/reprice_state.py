@@ -0,0 +1,125 @@
+import json
+import os
+import time
+from dataclasses import dataclass, field
+
+from database.google_sheets import OwnedItem
+from database.reconcile import MutationReport, ReconciliationPlan
+from warframe_market.order_stream import ranked_names
+from warframe_market.warframe_market import ExistingPrimeOrder
+
+REPRICE_STATE = 'database/reprice_state.json'
+STALE_AFTER = 6 * 60 * 60  # Unlisted items are priced again after this many seconds
+LISTED_TTL = 30 * 60  # Listed items are checked for undercuts after this many seconds
+
+
+def reprice_state_path(profile: str = None) -> str:
+    """
+    Returns the state file of a profile (None for the single-profile file)
+    """
+
+    if profile is None:
+        return REPRICE_STATE
+    root, extension = os.path.splitext(REPRICE_STATE)
+    return f'{root}_{profile.lower()}{extension}'
+
+
+@dataclass
+class RepriceState:
+    """
+    What the last run saw and did: the inventory, the price of every item (and when it was found)
+    and the orders it left listed. Used to reprice only what may have changed since
+    """
+    inventory: dict[str, int] = field(default_factory=dict)
+    prices: dict[str, list] = field(default_factory=dict)  # Item -> [price, unix time it was found]
+    orders: dict[str, list[int]] = field(default_factory=dict)  # Item key -> [price, quantity] we listed
+    saved_at: float = None
+
+    @classmethod
+    def load(cls, path: str = REPRICE_STATE) -> 'RepriceState':
+        """
+        Reads a saved state, an empty state is returned when the file is missing or unreadable
+        """
+
+        try:
+            with open(path, 'r') as f:
+                return cls(**json.load(f))
+        except (OSError, TypeError, ValueError):
+            return cls()
+
+    def save(self, path: str = REPRICE_STATE) -> None:
+        self.saved_at = time.time()
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(self.__dict__, f)
+        os.replace(temporary, path)
+
+    def items_to_reprice(self, inventory: OwnedItem, existing_orders: list[ExistingPrimeOrder], now: float = None,
+                         stale_after: float = STALE_AFTER, listed_ttl: float = LISTED_TTL) -> dict[str, str]:
+        """
+        Picks the items whose price has to be looked up again, with the reason
+
+        Args:
+            inventory (OwnedItem): Items and quantities we can sell now
+            existing_orders (list[ExistingPrimeOrder]): Our orders as returned by get_existing_orders
+            now (float): Current unix time
+            stale_after (float): Age after which any known price is looked up again
+            listed_ttl (float): Age after which the price of a listed item is checked for undercuts
+
+        Returns:
+            dict[str, str]: Item -> 'new', 'quantity', 'listing', 'undercut' or 'stale'
+        """
+
+        now = time.time() if now is None else now
+        ranked = ranked_names(inventory)
+        listed = {order.inventory_key(ranked): order for order in existing_orders}
+        reasons = {}
+        for item, quantity in inventory.items():
+            price = self.prices.get(item)
+            order = listed.get(item)
+            placed = self.orders.get(item)
+            if price is None or item not in self.inventory:
+                reasons[item] = 'new'
+            elif self.inventory[item] != quantity:
+                reasons[item] = 'quantity'
+            elif placed is not None and (order is None or [order.platinum, order.quantity] != placed):
+                # Sold, edited or removed outside of this tool since the last run
+                reasons[item] = 'listing'
+            elif order is not None and now - price[1] >= listed_ttl:
+                reasons[item] = 'undercut'
+            elif now - price[1] >= stale_after:
+                reasons[item] = 'stale'
+        return reasons
+
+    def known_prices(self, inventory: OwnedItem, reasons: dict[str, str]) -> dict[str, int]:
+        """
+        Returns the saved price of every item that does not need to be looked up again
+        """
+
+        return {item: self.prices[item][0] for item in inventory if item not in reasons and item in self.prices}
+
+    def update(self, inventory: OwnedItem, priced: dict[str, list], plan: ReconciliationPlan,
+               report: MutationReport) -> None:
+        """
+        Records the outcome of a run
+
+        Args:
+            inventory (OwnedItem): Items and quantities the run priced
+            priced (dict[str, list]): Prices found by the run and when they were found (cached prices keep
+                the time they were fetched, so that they are not taken for fresh ones)
+            plan (ReconciliationPlan): Mutations the run sent
+            report (MutationReport): Outcome of the mutations (failed ones are not recorded as listed)
+        """
+
+        self.inventory = dict(inventory)
+        self.prices = {item: price for item, price in self.prices.items() if item in inventory}
+        for item, (price, found_at) in priced.items():
+            self.prices[item] = [price, found_at]
+
+        failed = {result.item for result in report.failed}
+        ranked = ranked_names(inventory)
+        orders = {order.inventory_key(ranked): [order.platinum, order.quantity] for order in plan.unchanged}
+        orders |= {update.order.inventory_key(ranked): [update.price, update.quantity] for update in plan.to_update
+                   if update.order.item_key not in failed}
+        orders |= {item: [price, quantity] for item, price, quantity in plan.to_create if item not in failed}
+        self.orders = orders
@@ -1,60 +1,484 @@
+import argparse
+import json
 import os
+import tempfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
 
 from dotenv import load_dotenv
 
-from database.google_sheets import OwnedItem
+from database.buy_scan import SetToComplete, print_buy_report, scan_sets_to_complete
+from database.catalogue import ItemDatabase, sync_catalogue
+from database.google_sheets import SHEET, OwnedItem
 from database.google_sheets import get_prime_items_to_sell, get_items_to_sell, get_mods_to_sell
-from database.local import get_item_id_from_file
+from database.google_sheets import get_prime_sets_to_complete
+from database.local import ItemCatalogue
+from database.price_cache import PriceCache, DEFAULT_TTL, price_cache_path
 from database.query import find_most_expensive_items_to_sell
+from database.reconcile import MutationReport, ReconciliationPlan, plan_reconciliation, apply_reconciliation
+from database.reprice_state import RepriceState, reprice_state_path
 
 from warframe_market import warframe_market
+from warframe_market.cassette import REPLAY, use_cassette
+from warframe_market.live_feed import connect_live_feed
+from warframe_market.metrics import registry
+from warframe_market.order_books import SharedOrderBooks
+from warframe_market.order_stream import ranked_item, split_ranked_item
+from warframe_market.profiling import WorkflowProfiler
 
-# Load credentials for Warframe warframe_market
-load_dotenv()
-EMAIL = os.environ.get('EMAIL')
-PASSWORD = os.environ.get('PASSWORD')
-PROFILE_NAME = os.environ.get('PROFILE_NAME')
-
-# Login to warframe.market
-token = warframe_market.login_to_warframe_market(EMAIL, PASSWORD)
-
-# Grab existing orders
-print(f'Receiving orders...')
-existing_orders = warframe_market.get_existing_orders(PROFILE_NAME)
-
-# If we have active sell orders, delete them
-if len(existing_orders):
-    print(f'Orders found: {len(existing_orders)}. Deleting')
-    for existing_order in existing_orders:
-        print(f'Deleting order {existing_order.order_id}')
-        _ = warframe_market.delete_existing_order(token, existing_order)
-else:
-    print('No ordered to delete - skipping')
-
-# Check inventory status
-print(f'Preparing to find new orders - Standard items')
-standard_items: OwnedItem = get_items_to_sell()
-print(f'Preparing to find new orders - Prime items')
-prime_items: OwnedItem = get_prime_items_to_sell()
-
-# TODO: Mods need also a mod_rank, need to remake selling function
-# print(f'Preparing to find new orders - Mods')
-# mods: OwnedItem = get_mods_to_sell()
-mods = {}
-
-combined_items: OwnedItem = standard_items | prime_items | mods
-
-# Find the best (most expensive) items we can sell
-print(f'Querying warframe.market for current prices')
-best_deals = find_most_expensive_items_to_sell(PROFILE_NAME, combined_items, 20)
-
-# Loop through the items, find their IDs and place the orders for the quantity we hold
-for deal in best_deals:
-    item_id = get_item_id_from_file(deal[0])
-    if item_id == "Not found":
-        item_id = warframe_market.get_item_id_from_market(deal[0])
-    price = int(deal[1])
-    quantity = int(deal[2])
-    new_order = warframe_market.NewPrimeOrder(item_id, price, quantity)
-    print(f'Adding order: {item_id}')
-    _ = warframe_market.create_new_order(token, new_order)
+if TYPE_CHECKING:
+    # numpy is only imported by the commands that record price history
+    from database.price_history import PriceHistory
+
+NUM_DEALS = 20
+
+
+@dataclass
+class Account:
+    """
+    warframe.market account repriced from its own inventory sheet
+    """
+    email: str
+    password: str
+    profile: str
+    sheet: str = SHEET
+    num: int = NUM_DEALS
+
+
+@dataclass
+class PricedAccount:
+    """
+    Outcome of pricing one account, before its mutations are sent
+    """
+    token: str
+    plan: ReconciliationPlan
+    inventory: OwnedItem
+    priced: dict[str, list]  # Item -> [price, unix time it was found]
+
+
+def load_accounts(path: str) -> list[Account]:
+    """
+    Reads the accounts to reprice from a JSON file
+
+    Args:
+        path (str): File holding a list of accounts
+            (e.g. [{"email": "...", "password": "...", "profile": "...", "sheet": "Warframe"}])
+
+    Returns:
+        list[Account]: The accounts, in file order
+    """
+
+    with open(path, 'r') as f:
+        entries = json.load(f)
+    try:
+        accounts = [Account(**entry) for entry in entries]
+    except (TypeError, KeyError) as e:
+        raise SystemExit(f'{path}: invalid account entry ({e})')
+    profiles = [account.profile for account in accounts]
+    if len(set(profiles)) != len(profiles):
+        raise SystemExit(f'{path} lists a profile more than once')
+    return accounts
+
+
+def plan_reprice(email: str, password: str, profile: str, num: int, price_cache: PriceCache,
+                 price_history: 'PriceHistory', live_feed: str = None, sheet: str = SHEET,
+                 state: RepriceState = None) -> PricedAccount:
+    """
+    Prices the inventory of one account and works out the mutations its sell orders need
+
+    Args:
+        email (str): Email used to login to warframe.market
+        password (str): Password used to login to warframe.market
+        profile (str): In-game profile name
+        num (int): Number of orders to keep listed
+        price_cache (PriceCache): Cache of lowest prices
+        price_history (PriceHistory): Store receiving every fetched order book
+        live_feed (str): Order-book feed server (host:port) answering price lookups instead of polling
+        sheet (str): Google Sheet holding the inventory of the account
+        state (RepriceState): Last run of the account, only the items that may have changed are priced again
+
+    Returns:
+        PricedAccount: JWT token of the account, the mutations to send and the prices found
+    """
+
+    # Login to warframe.market
+    token = warframe_market.login_to_warframe_market(email, password)
+
+    # Grab existing orders
+    print(f'Receiving orders...')
+    existing_orders = warframe_market.get_existing_orders(profile)
+
+    if existing_orders is None:
+        raise SystemExit('Could not receive existing orders - aborting')
+    print(f'Orders found: {len(existing_orders)}')
+
+    # Check inventory status
+    print(f'Preparing to find new orders - Standard items')
+    standard_items: OwnedItem = get_items_to_sell(sheet)
+    print(f'Preparing to find new orders - Prime items')
+    prime_items: OwnedItem = get_prime_items_to_sell(sheet)
+
+    print(f'Preparing to find new orders - Mods')
+    mods: OwnedItem = get_mods_to_sell(sheet)
+
+    combined_items: OwnedItem = standard_items | prime_items | mods
+
+    to_price: OwnedItem = combined_items
+    known = []
+    if state is not None:
+        reasons = state.items_to_reprice(combined_items, existing_orders)
+        to_price = {item: quantity for item, quantity in combined_items.items() if item in reasons}
+        known = [[item, price, combined_items[item]]
+                 for item, price in state.known_prices(combined_items, reasons).items()]
+        counts = Counter(reasons.values())
+        print(f'Incremental run: pricing {len(to_price)} of {len(combined_items)} items'
+              + (f' ({", ".join(f"{reason}: {count}" for reason, count in sorted(counts.items()))})' if counts else ''))
+
+    feed = None
+    if live_feed:
+        feed = connect_live_feed(live_feed, {split_ranked_item(item)[0] for item in to_price})
+    warframe_market.set_live_feed(feed)
+
+    # Find the best (most expensive) items we can sell
+    print(f'Querying warframe.market for current prices')
+    priced = {}
+    warframe_market.add_order_book_listener(price_history.record)
+    try:
+        best_deals = find_most_expensive_items_to_sell(profile, to_price, num, cache=price_cache,
+                                                       history=price_history, known=known, priced=priced)
+    finally:
+        warframe_market.remove_order_book_listener(price_history.record)
+        if feed is not None:
+            warframe_market.set_live_feed(None)
+            feed.close()
+
+    # Only touch the orders whose price or quantity changed
+    plan = plan_reconciliation(existing_orders, best_deals)
+    print(f'Orders to create: {len(plan.to_create)}, update: {len(plan.to_update)}, '
+          f'delete: {len(plan.to_delete)}, unchanged: {len(plan.unchanged)}')
+    return PricedAccount(token, plan, combined_items, priced)
+
+
+def reprice(email: str, password: str, profile: str, num: int = NUM_DEALS, price_cache: PriceCache = None,
+            price_history: 'PriceHistory' = None, catalogue: ItemCatalogue = None,
+            live_feed: str = None, sheet: str = SHEET, books: SharedOrderBooks = None,
+            state: RepriceState = None, incremental: bool = False) -> ReconciliationPlan:
+    """
+    Prices the inventory and brings our warframe.market sell orders in line with the best deals
+
+    Args:
+        email (str): Email used to login to warframe.market
+        password (str): Password used to login to warframe.market
+        profile (str): In-game profile name
+        num (int): Number of orders to keep listed
+        price_cache (PriceCache): Cache of lowest prices (defaults to the local cache)
+        price_history (PriceHistory): Store receiving every fetched order book (defaults to the local store)
+        catalogue (ItemCatalogue): Item ID lookup (defaults to the local database)
+        live_feed (str): Order-book feed server (host:port) answering price lookups instead of polling
+        sheet (str): Google Sheet holding the inventory
+        books (SharedOrderBooks): Keeps the snapshot of every order book fetched during the run
+        state (RepriceState): Updated with what this run priced and listed
+        incremental (bool): Only price the items that may have changed since the run recorded in state
+
+    Returns:
+        ReconciliationPlan: The mutations that were sent
+    """
+
+    if price_cache is None:
+        price_cache = PriceCache()
+    if price_history is None:
+        from database.price_history import PriceHistory
+        price_history = PriceHistory()
+
+    warframe_market.set_shared_order_books(books or SharedOrderBooks(warframe_market.fetch_order_book_snapshot))
+    try:
+        account = plan_reprice(email, password, profile, num, price_cache, price_history, live_feed, sheet,
+                               state if incremental else None)
+    finally:
+        warframe_market.set_shared_order_books(None)
+    report = apply_reconciliation(account.token, account.plan, catalogue, profile=profile)
+    if state is not None:
+        state.update(account.inventory, account.priced, account.plan, report)
+
+    price_cache.close()
+    print(price_cache.report())
+    return account.plan
+
+
+def reprice_accounts(accounts: list[Account], price_caches: dict[str, PriceCache],
+                     price_history: 'PriceHistory' = None, catalogue: ItemCatalogue = None,
+                     live_feed: str = None, states: dict[str, RepriceState] = None,
+                     incremental: bool = False, books: SharedOrderBooks = None) -> dict[str, MutationReport]:
+    """
+    Reprices several accounts, fetching the order book of an item once for all of them
+    Accounts are priced one after the other from the shared books (each leaving out its own orders),
+    then the mutations of every account are sent concurrently through the shared client
+
+    Args:
+        accounts (list[Account]): Accounts to reprice
+        price_caches (dict[str, PriceCache]): Cache of lowest prices per profile
+        price_history (PriceHistory): Store receiving every fetched order book (defaults to the local store)
+        catalogue (ItemCatalogue): Item ID lookup (defaults to the local database)
+        live_feed (str): Order-book feed server (host:port) answering price lookups instead of polling
+        states (dict[str, RepriceState]): Last run per profile, updated with what this run priced and listed
+        incremental (bool): Only price the items that may have changed since the runs recorded in states
+        books (SharedOrderBooks): Keeps the snapshot of every order book fetched during the run
+
+    Returns:
+        dict[str, MutationReport]: Outcome of the mutations per profile
+    """
+
+    if price_history is None:
+        from database.price_history import PriceHistory
+        price_history = PriceHistory()
+
+    books = books or SharedOrderBooks(warframe_market.fetch_order_book_snapshot)
+    warframe_market.set_shared_order_books(books)
+    states = states or {}
+    priced = {}
+    try:
+        for account in accounts:
+            print(f'Pricing {account.profile} ({account.sheet})')
+            state = states.get(account.profile)
+            priced[account.profile] = plan_reprice(account.email, account.password, account.profile, account.num,
+                                                   price_caches[account.profile], price_history, live_feed,
+                                                   account.sheet, state if incremental else None)
+    finally:
+        warframe_market.set_shared_order_books(None)
+    print(f'Order books fetched: {books.fetches} for {books.lookups} lookups across {len(accounts)} profiles')
+
+    with ThreadPoolExecutor(max_workers=len(priced) or 1) as executor:
+        futures = {profile: executor.submit(apply_reconciliation, account.token, account.plan, catalogue,
+                                            profile=profile)
+                   for profile, account in priced.items()}
+        reports = {profile: future.result() for profile, future in futures.items()}
+
+    for profile, report in reports.items():
+        if profile in states:
+            account = priced[profile]
+            states[profile].update(account.inventory, account.priced, account.plan, report)
+        price_caches[profile].close()
+        print(f'{profile}: {report.summary()}, {price_caches[profile].report()}')
+    return reports
+
+
+def buy_scan(profile: str, sheet: str = SHEET, books: SharedOrderBooks = None) -> list[SetToComplete]:
+    """
+    Prices the missing prime parts and prints the sets ranked by what completing them costs
+
+    Args:
+        profile (str): In-game profile name
+        sheet (str): Google Sheet holding the inventory
+        books (SharedOrderBooks): Order books already fetched during the run, read instead of fetched again
+
+    Returns:
+        list[SetToComplete]: Sets that can be completed now, cheapest first, then the ones missing a seller
+    """
+
+    missing = get_prime_sets_to_complete(sheet)
+    parts = len({item for items in missing.values() for item in items})
+    print(f'Missing prime parts: {parts} in {len(missing)} sets')
+    books = books or SharedOrderBooks(warframe_market.fetch_order_book_snapshot)
+    fetches = books.fetches
+    warframe_market.set_shared_order_books(books)
+    try:
+        sets = scan_sets_to_complete(profile, missing)
+    finally:
+        warframe_market.set_shared_order_books(None)
+    print_buy_report(sets)
+    fetched = books.fetches - fetches
+    print(f'Order books: {fetched} fetched, {parts - fetched} already fetched during the run')
+    return sets
+
+
+def _environment_flag(name: str, default: str = '') -> bool:
+    return os.environ.get(name, default).lower() in ('1', 'true', 'yes')
+
+
+def resolve_item_name(name: str, database: ItemDatabase) -> str:
+    """
+    Turns a name typed on the command line into a URL name, keeping a rank suffix (e.g. 'Flow@10' -> flow@10)
+
+    Args:
+        name (str): URL name or display name (e.g. 'Mirage Prime Systems')
+        database (ItemDatabase): Synced item catalogue
+
+    Returns:
+        str: URL name (unchanged while the catalogue is empty), or None when the catalogue does not know the item
+    """
+
+    item, rank = split_ranked_item(name)
+    found = database.get(item)
+    if found is not None:
+        return found.url_name if rank is None else ranked_item(found.url_name, rank)
+    if not len(database):
+        return name
+
+    suggestions = database.fuzzy(item)
+    print(f'{item} is not in the catalogue' + (f', did you mean: {", ".join(suggestions)}?' if suggestions else ''))
+    return None
+
+
+def command_reprice(args: argparse.Namespace) -> None:
+    accounts = load_accounts(args.accounts) if args.accounts else None
+    profiles = [account.profile for account in accounts] if accounts else [None]
+    price_history = None
+    history_directory = None
+    states = {}
+    if args.cassette is not None:
+        # Every item is priced from the tape: the caches and the recorded history start empty
+        from database.price_history import PriceHistory
+        history_directory = tempfile.TemporaryDirectory()
+        price_caches = {profile: PriceCache(':memory:') for profile in profiles}
+        price_history = PriceHistory(history_directory.name)
+    else:
+        price_caches = {profile: PriceCache(price_cache_path(profile),
+                                            ttl=float(os.environ.get('PRICE_CACHE_TTL', DEFAULT_TTL)),
+                                            stale_while_revalidate=_environment_flag('PRICE_CACHE_STALE'))
+                        for profile in profiles}
+        # Every run records its state, so that the next one can be incremental
+        states = {profile: RepriceState.load(reprice_state_path(profile)) for profile in profiles}
+        # At most one small version check a day, so item IDs never have to be looked up one by one
+        changed = sync_catalogue()
+        if changed:
+            print(f'Item catalogue updated: {changed} items added or changed')
+
+    # Kept for the whole run, so that the buy scan reads the order books the repricing fetched
+    books = SharedOrderBooks(warframe_market.fetch_order_book_snapshot)
+    try:
+        if accounts:
+            reprice_accounts(accounts, price_caches, price_history=price_history, live_feed=os.environ.get('LIVE_FEED'),
+                             states=states, incremental=args.incremental, books=books)
+        else:
+            reprice(args.email, args.password, args.profile, args.num, price_cache=price_caches[None],
+                    price_history=price_history, live_feed=os.environ.get('LIVE_FEED'), books=books,
+                    state=states.get(None), incremental=args.incremental)
+        for profile, state in states.items():
+            state.save(reprice_state_path(profile))
+        if args.buy_scan:
+            for account in accounts or [Account(args.email, args.password, args.profile)]:
+                buy_scan(account.profile, account.sheet, books)
+    finally:
+        if history_directory is not None:
+            history_directory.cleanup()
+
+
+def command_orders_list(args: argparse.Namespace) -> None:
+    orders = warframe_market.get_existing_orders(args.profile)
+    if orders is None:
+        raise SystemExit('Could not receive existing orders')
+    for order in sorted(orders, key=lambda order: order.platinum, reverse=True):
+        print(f'{order.item_key:<45} {order.platinum:>6}p x{order.quantity:<3} {order.order_id}')
+    print(f'{len(orders)} orders')
+
+
+def command_prices(args: argparse.Namespace) -> None:
+    database = ItemDatabase()
+    for name in args.items:
+        key = resolve_item_name(name, database)
+        if key is None:
+            continue
+        item, rank = split_ranked_item(key)
+        book = warframe_market.get_order_book_snapshot(item)
+        if book is None:
+            print(f'{key}: could not be priced')
+            continue
+        lowest = book.lowest(args.profile, rank)
+        if lowest is None:
+            print(f'{key}: nobody is selling in game')
+            continue
+        following = [price for price in (book.kth_cheapest(k, args.profile, rank) for k in (2, 3)) if price is not None]
+        spread = book.spread(args.profile, rank)
+        print(f'{key}: {lowest}p' + (f' (then {", ".join(f"{price}p" for price in following)})' if following else '') +
+              f', {book.depth(lowest, args.profile, rank)} for sale at that price' +
+              (f', spread {spread}p' if spread is not None else ', no buyers in game'))
+
+
+def command_buy_scan(args: argparse.Namespace) -> None:
+    buy_scan(args.profile)
+
+
+def command_sync_catalogue(args: argparse.Namespace) -> None:
+    database = ItemDatabase()
+    changed = database.sync(args.force)
+    if changed is None:
+        raise SystemExit(f'Could not sync the catalogue, keeping {len(database)} known items')
+    print(f'Catalogue synced: {len(database)} items, {changed} added or changed')
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Manage warframe.market orders from the Google Sheets inventory')
+    parser.add_argument('--profile', default=os.environ.get('PROFILE_NAME'), help='In-game profile name')
+    parser.add_argument('--profiler', action='store_true', default=_environment_flag('PROFILER'),
+                        help='Profile the run (CPU, allocations, flame graph stacks) into PROFILES_DIR')
+    parser.set_defaults(command=command_reprice, num=NUM_DEALS, accounts=os.environ.get('ACCOUNTS'),
+                        incremental=_environment_flag('REPRICE_INCREMENTAL'), buy_scan=False)
+    commands = parser.add_subparsers(title='commands')
+
+    reprice_parser = commands.add_parser('reprice', help='Bring our sell orders in line with the best deals (default)')
+    reprice_parser.add_argument('--num', type=int, default=NUM_DEALS, help='Number of orders to keep listed')
+    reprice_parser.add_argument('--accounts', default=os.environ.get('ACCOUNTS'),
+                                help='JSON file listing several accounts to reprice together')
+    reprice_parser.add_argument('--incremental', action='store_true', default=_environment_flag('REPRICE_INCREMENTAL'),
+                                help='Only price the items that may have changed since the last run')
+    reprice_parser.add_argument('--buy-scan', action='store_true',
+                                help='Then price the missing prime parts from the order books the run fetched')
+    reprice_parser.set_defaults(command=command_reprice)
+
+    orders_parser = commands.add_parser('orders', help='Inspect our orders')
+    orders_commands = orders_parser.add_subparsers(title='orders commands', required=True)
+    orders_commands.add_parser('list', help='List our sell orders').set_defaults(command=command_orders_list)
+
+    prices_parser = commands.add_parser('prices', help='Show the lowest online sell price of items')
+    prices_parser.add_argument('items', nargs='+', help='URL or display names, mods as name@rank')
+    prices_parser.set_defaults(command=command_prices)
+
+    buy_scan_parser = commands.add_parser('buy-scan', help='Rank prime sets by the cost of their missing parts')
+    buy_scan_parser.set_defaults(command=command_buy_scan)
+
+    sync_parser = commands.add_parser('sync-catalogue', help='Download the warframe.market item list')
+    sync_parser.add_argument('--force', action='store_true', help='Download the item list even if it did not change')
+    sync_parser.set_defaults(command=command_sync_catalogue)
+    return parser
+
+
+def main(argv: list[str] = None) -> None:
+    # Load credentials for Warframe warframe_market
+    load_dotenv()
+    args = build_parser().parse_args(argv)
+    args.email = os.environ.get('EMAIL')
+    args.password = os.environ.get('PASSWORD')
+    args.cassette = os.environ.get('CASSETTE')
+    cassette_mode = os.environ.get('CASSETTE_MODE', REPLAY)
+    metrics_directory = os.environ.get('METRICS_DIR', 'metrics')
+    profiles_directory = os.environ.get('PROFILES_DIR', 'profiles')
+
+    registry.enabled = os.environ.get('METRICS_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+    cassette = None
+    if args.cassette is not None:
+        cassette = use_cassette(args.cassette, cassette_mode)
+        warframe_market.set_sleeps_enabled(not cassette.replaying)
+
+    profiler = WorkflowProfiler() if args.profiler else None
+    if profiler is not None:
+        profiler.start()
+    try:
+        args.command(args)
+    finally:
+        if profiler is not None:
+            profiler.stop()
+            paths = profiler.write(profiles_directory, args.command.__name__.removeprefix('command_'))
+            print(f'Profile written to {paths["summary"]}, flame graph stacks in {paths["stacks"]}')
+        if cassette is not None:
+            cassette.save()
+            print(f'Cassette {args.cassette} ({cassette_mode}): {len(cassette.interactions)} requests, '
+                  f'{cassette.misses} not on the tape')
+        if registry.enabled:
+            summary_path, textfile_path = registry.write(metrics_directory)
+            print(f'Metrics written to {summary_path} and {textfile_path}')
+
+
+if __name__ == '__main__':
+    main()
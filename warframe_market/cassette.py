@@ -0,0 +1,238 @@
+import gzip
+import json
+import os
+import threading
+from collections import deque
+from http import HTTPStatus
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+RECORD = 'record'
+REPLAY = 'replay'
+KEPT_HEADERS = ('Content-Type', 'Authorization', 'ETag', 'Retry-After')
+SECRET_PATHS = ('/auth/signin',)  # Requests carrying credentials, recorded without their body
+RECORDED_TOKEN = 'JWT recorded-token'  # Stands in for the tokens handed out while recording
+
+
+class CassetteMiss(requests.ConnectionError):
+    """
+    Raised in replay mode for a request that was not recorded
+    """
+
+
+def request_key(method: str, url: str, body) -> str:
+    """
+    Identifies a request independently of the host it was sent to
+
+    Args:
+        method (str): HTTP method
+        url (str): Full request URL
+        body: Request body (str, bytes or None)
+
+    Returns:
+        str: Method, path with query string and body (left out for the SECRET_PATHS)
+    """
+
+    parts = urlsplit(url)
+    path = f'{parts.path}?{parts.query}' if parts.query else parts.path
+    if parts.path.endswith(SECRET_PATHS):
+        body = None
+    if isinstance(body, bytes):
+        body = body.decode('utf-8', 'replace')
+    return f'{method} {path} {body or ""}'
+
+
+def _without_secrets(key: str) -> str:
+    # Cassettes recorded before credentials were left out still have the sign-in body in the key
+    method, path, _ = f'{key} '.split(' ', 2)
+    return f'{method} {path} ' if urlsplit(path).path.endswith(SECRET_PATHS) else key
+
+
+class Cassette:
+    """
+    Captured warframe.market responses and Google Sheets ranges, stored as gzipped JSON lines
+    In record mode real traffic passes through and is captured; in replay mode it is answered from the file.
+    Identical requests are answered in the order they were recorded, the last answer is repeated afterwards
+    """
+
+    def __init__(self, path: str, mode: str = REPLAY):
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f'Unknown cassette mode: {mode}')
+        self.path = path
+        self.mode = mode
+        self.interactions: list[dict] = []
+        self.sheets: dict[str, list[list[str]]] = {}
+        self.misses = 0
+        self._responses: dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+        if mode == REPLAY:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    entry = json.loads(line)
+                    if entry['type'] == 'sheets':
+                        self.sheets[entry['range']] = entry['values']
+                    else:
+                        self.interactions.append(entry)
+                        entry['key'] = _without_secrets(entry['key'])
+                        self._responses.setdefault(entry['key'], deque()).append(entry)
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == REPLAY
+
+    def attach(self, session: requests.Session) -> None:
+        """
+        Mounts the cassette on a session, wrapping its adapters (and their retries) when recording
+        """
+
+        for prefix in ('https://', 'http://'):
+            if self.mode == RECORD:
+                session.mount(prefix, _RecordingAdapter(self, session.get_adapter(prefix)))
+            else:
+                session.mount(prefix, _ReplayAdapter(self))
+
+    def record(self, request: requests.PreparedRequest, response: requests.Response) -> None:
+        """
+        Captures an exchange, without credentials: sign-in bodies are left out and tokens are replaced
+        """
+
+        headers = {name: response.headers[name] for name in KEPT_HEADERS if name in response.headers}
+        if 'Authorization' in headers:
+            headers['Authorization'] = RECORDED_TOKEN
+        secret = urlsplit(request.url).path.endswith(SECRET_PATHS)
+        entry = {
+            'type': 'http',
+            'key': request_key(request.method, request.url, request.body),
+            'status': response.status_code,
+            'headers': headers,
+            # The sign-in answer describes the account, the token in its header is all the client reads
+            'content': '' if secret else response.content.decode('utf-8', 'replace'),
+        }
+        with self._lock:
+            self.interactions.append(entry)
+
+    def record_sheet(self, range_name: str, values: list[list[str]]) -> None:
+        with self._lock:
+            self.sheets[range_name] = values
+
+    def sheet(self, range_name: str) -> list[list[str]]:
+        """
+        Returns a recorded Google Sheets range
+
+        Args:
+            range_name (str): Range including the worksheet (e.g. 'Prime!A2:R109')
+
+        Returns:
+            list[list[str]]: Recorded rows
+        """
+
+        if range_name not in self.sheets:
+            raise CassetteMiss(f'Range {range_name} is not in cassette {self.path}')
+        return self.sheets[range_name]
+
+    def replay(self, request: requests.PreparedRequest) -> requests.Response:
+        key = request_key(request.method, request.url, request.body)
+        with self._lock:
+            recorded = self._responses.get(key)
+            if not recorded:
+                self.misses += 1
+                raise CassetteMiss(f'{key.strip()} is not in cassette {self.path}', request=request)
+            entry = recorded.popleft() if len(recorded) > 1 else recorded[0]
+
+        response = requests.Response()
+        response.status_code = entry['status']
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response._content = entry['content'].encode('utf-8')
+        response._content_consumed = True
+        response.encoding = 'utf-8'
+        response.url = request.url
+        response.request = request
+        try:
+            response.reason = HTTPStatus(entry['status']).phrase
+        except ValueError:
+            response.reason = ''
+        return response
+
+    def save(self) -> None:
+        """
+        Writes the recorded traffic (record mode only), replacing the file atomically
+        """
+
+        if self.mode != RECORD:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            entries = [{'type': 'sheets', 'range': name, 'values': values} for name, values in self.sheets.items()]
+            entries += self.interactions
+        with gzip.open(f'{self.path}.tmp', 'wt', encoding='utf-8') as f:
+            for entry in entries:
+                f.write(json.dumps(entry, separators=(',', ':')) + '\n')
+        os.replace(f'{self.path}.tmp', self.path)
+
+
+class _RecordingAdapter(BaseAdapter):
+    def __init__(self, cassette: Cassette, adapter: BaseAdapter):
+        super().__init__()
+        self.cassette = cassette
+        self.adapter = adapter
+
+    def send(self, request, **kwargs):
+        response = self.adapter.send(request, **kwargs)
+        self.cassette.record(request, response)
+        return response
+
+    def close(self) -> None:
+        self.adapter.close()
+
+
+class _ReplayAdapter(BaseAdapter):
+    def __init__(self, cassette: Cassette):
+        super().__init__()
+        self.cassette = cassette
+
+    def send(self, request, **kwargs):
+        return self.cassette.replay(request)
+
+    def close(self) -> None:
+        pass
+
+
+_cassette: Cassette = None
+
+
+def get_cassette() -> Cassette:
+    """
+    Returns the cassette in use, or None when traffic goes to the real services
+    """
+
+    return _cassette
+
+
+def use_cassette(path: str, mode: str = REPLAY, client=None) -> Cassette:
+    """
+    Routes warframe.market traffic (and Google Sheets reads) through a cassette
+
+    Args:
+        path (str): Cassette file (e.g. cassettes/run.jsonl.gz)
+        mode (str): 'record' to capture real traffic, 'replay' to answer from the file
+        client (MarketClient): Client to attach to (defaults to the shared client)
+
+    Returns:
+        Cassette: The cassette, call save() on it after recording
+    """
+
+    global _cassette
+    from warframe_market.client import get_client
+
+    client = client or get_client()
+    _cassette = Cassette(path, mode)
+    _cassette.attach(client.session)
+    # Always sign in, so that the sign-in is on the tape whether or not a token was cached
+    client.token_cache = None
+    return _cassette
@@ -0,0 +1,249 @@
+import base64
+import json
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from warframe_market.governor import THROTTLE_STATUSES, RateGovernor, get_governor, parse_retry_after
+from warframe_market.metrics import registry
+
+WARFRAME_MARKET_API = os.environ.get('WARFRAME_MARKET_API', 'https://api.warframe.market/v1')
+TOKEN_CACHE = '.warframe_market_token.json'
+DEFAULT_TOKEN_LIFETIME = 12 * 60 * 60  # Used when the JWT does not carry an expiry
+TOKEN_EXPIRY_MARGIN = 5 * 60
+DEFAULT_POOL_SIZE = 10
+DEFAULT_RETRIES = 3
+DEFAULT_THROTTLE_RETRIES = 5
+DEFAULT_BACKOFF = 0.5
+DEFAULT_TIMEOUT = 10
+
+warframe_market_standard_headers = {
+        'Content-Type': 'application/json',
+        'Authorization': 'JWT',
+        'Accept': 'application/json',
+        'auth_type': 'header',
+        'language': 'en',
+        'platform': 'pc',
+    }
+
+
+def token_expiry(token: str) -> float:
+    """
+    Reads the expiry time from a warframe.market JWT
+
+    Args:
+        token (str): Authorization header as returned by warframe.market (e.g. 'JWT eyJ...')
+
+    Returns:
+        float: Unix timestamp after which the token can no longer be used
+    """
+
+    try:
+        payload = token.split()[-1].split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(payload))
+        return float(claims['exp'])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return time.time() + DEFAULT_TOKEN_LIFETIME
+
+
+class MarketClient:
+    """
+    Persistent connection to warframe.market
+    Owns a pooled keep-alive session, paces requests through the shared rate governor,
+    retries transient failures with backoff and reuses the JWT token across runs until it expires.
+    A token the API rejects (401) is dropped, the account signs in again and the call is sent once more
+    """
+
+    def __init__(self, base_url: str = WARFRAME_MARKET_API, token_cache: str = TOKEN_CACHE,
+                 pool_size: int = DEFAULT_POOL_SIZE, retries: int = DEFAULT_RETRIES,
+                 backoff: float = DEFAULT_BACKOFF, timeout: float = DEFAULT_TIMEOUT,
+                 governor: RateGovernor = None, throttle_retries: int = DEFAULT_THROTTLE_RETRIES):
+        self.base_url = base_url.rstrip('/')
+        self.governor = governor or get_governor()
+        self.throttle_retries = throttle_retries
+        # Catalogue data (ducats, ranks, tags) is only served by the v2 API
+        self.v2_url = self.base_url[:-len('/v1')] + '/v2' if self.base_url.endswith('/v1') else self.base_url
+        self.token_cache = token_cache
+        self.timeout = timeout
+        self._credentials: dict[str, tuple[str, str]] = {}  # Token -> email and password it was issued for
+        self._renewed: dict[str, str] = {}  # Rejected token -> token that replaced it
+        self._auth_lock = threading.Lock()
+
+        # 429 and 503 are left to the governor, which slows every request down instead of just this one
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=(500, 502, 504),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.headers.update(warframe_market_standard_headers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def request(self, method: str, path: str, auth_token: str = None, **kwargs) -> requests.Response:
+        """
+        Sends a request to the warframe.market API through the pooled session
+        Waits for the rate governor first and sends the request again (after Retry-After) when throttled
+
+        Args:
+            method (str): HTTP method (e.g. 'GET')
+            path (str): Path relative to the API root (e.g. '/items/mirage_prime_systems/orders') or a full URL
+            auth_token (str): JWT token for authenticated calls
+
+        Returns:
+            requests.Response: The response, status is not checked
+        """
+
+        if auth_token:
+            # Callers may still hold a token that was rejected and replaced
+            auth_token = self._renewed.get(auth_token, auth_token)
+            kwargs['headers'] = kwargs.get('headers', {}) | {'Authorization': auth_token}
+        kwargs.setdefault('timeout', self.timeout)
+        url = path if '://' in path else f'{self.base_url}{path}'
+
+        response = self._send(method, url, **kwargs)
+        if response.status_code == 401 and auth_token in self._credentials:
+            renewed = self._renew_token(auth_token)
+            if renewed is not None:
+                response.close()
+                kwargs['headers'] = kwargs['headers'] | {'Authorization': renewed}
+                response = self._send(method, url, **kwargs)
+        return response
+
+    def _send(self, method: str, url: str, **kwargs) -> requests.Response:
+        for attempt in range(self.throttle_retries + 1):
+            sent_at = self.governor.acquire()
+            response = self.session.request(method, url, **kwargs)
+            if response.status_code not in THROTTLE_STATUSES:
+                self.governor.on_success()
+                return response
+
+            registry.throttled()
+            self.governor.on_throttle(sent_at, parse_retry_after(response.headers.get('Retry-After')))
+            if attempt < self.throttle_retries:
+                response.close()
+        return response
+
+    def login(self, email: str, password: str) -> str:
+        """
+        Returns a JWT token for email, signing in only when no valid cached token exists
+
+        Args:
+            email (str): Email used to login to warframe.market
+            password (str): Password used to login to warframe.market
+
+        Returns:
+            str: JWT token needed for authenticated calls to warframe.market API
+        """
+
+        cached = self._read_token_cache().get(email)
+        if cached and cached['expires_at'] - TOKEN_EXPIRY_MARGIN > time.time():
+            self._credentials[cached['token']] = (email, password)
+            return cached['token']
+
+        data = {
+            'email': email,
+            'password': password,
+            'auth_type': 'header',
+        }
+        response = self.request('POST', '/auth/signin', data=json.dumps(data))
+        response.raise_for_status()
+        token = response.headers['Authorization']
+        self._write_token_cache(email, token)
+        self._credentials[token] = (email, password)
+        return token
+
+    def _renew_token(self, token: str) -> str:
+        """
+        Signs in again after the API rejected a token, once for all the calls that were sent with it
+
+        Args:
+            token (str): Rejected token
+
+        Returns:
+            str: The new token, or None when signing in failed
+        """
+
+        with self._auth_lock:
+            if token in self._renewed:
+                return self._renewed[token]
+            email, password = self._credentials[token]
+            self.forget_token(email)
+            try:
+                renewed = self.login(email, password)
+            except requests.RequestException as err:
+                print(f'Could not sign in again after the token was rejected: {err}')
+                return None
+            self._renewed[token] = renewed
+            return renewed
+
+    def forget_token(self, email: str) -> None:
+        """
+        Drops the cached token for email (e.g. after the API rejected it)
+
+        Args:
+            email (str): Email the token was issued for
+        """
+
+        tokens = self._read_token_cache()
+        if tokens.pop(email, None) is not None:
+            self._save_token_cache(tokens)
+
+    def _read_token_cache(self) -> dict:
+        if not self.token_cache:
+            return {}
+        try:
+            with open(self.token_cache, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_token_cache(self, email: str, token: str) -> None:
+        tokens = self._read_token_cache()
+        tokens[email] = {'token': token, 'expires_at': token_expiry(token)}
+        self._save_token_cache(tokens)
+
+    def _save_token_cache(self, tokens: dict) -> None:
+        if not self.token_cache:
+            return
+        temporary = f'{self.token_cache}.tmp'
+        with open(os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as f:
+            json.dump(tokens, f)
+        os.replace(temporary, self.token_cache)
+
+
+_default_client: MarketClient = None
+
+
+def get_client() -> MarketClient:
+    """
+    Returns the client shared by the module-level API functions, creating it on first use
+
+    Returns:
+        MarketClient: The shared client
+    """
+
+    global _default_client
+    if _default_client is None:
+        _default_client = MarketClient()
+    return _default_client
+
+
+def set_client(client: MarketClient) -> None:
+    """
+    Replaces the client shared by the module-level API functions
+
+    Args:
+        client (MarketClient): Client to use from now on
+    """
+
+    global _default_client
+    _default_client = client
@@ -0,0 +1,111 @@
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+from warframe_market.metrics import registry
+
+INITIAL_RATE = 2.5  # Requests per second, the old fixed 0.4s pause
+MIN_RATE = 0.5
+MAX_RATE = 10.0
+RATE_INCREASE = 0.1  # Added to the rate after every successful request
+RATE_DECREASE = 0.5  # Factor applied to the rate when the API pushes back
+THROTTLE_STATUSES = (429, 503)
+
+
+def parse_retry_after(value: str) -> float:
+    """
+    Reads a Retry-After header, given either in seconds or as an HTTP date
+
+    Args:
+        value (str): Header value (e.g. '2' or 'Wed, 21 Oct 2015 07:28:00 GMT')
+
+    Returns:
+        float: Seconds to wait, or None when the header is missing or invalid
+    """
+
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RateGovernor:
+    """
+    Paces every request sent to warframe.market with an additive-increase, multiplicative-decrease rate
+    Each success raises the rate a little, each 429 or 503 halves it and honors Retry-After,
+    so runs go as fast as the API allows and back off as soon as it pushes back
+    """
+
+    def __init__(self, rate: float = INITIAL_RATE, min_rate: float = MIN_RATE, max_rate: float = MAX_RATE,
+                 increase: float = RATE_INCREASE, decrease: float = RATE_DECREASE):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.enabled = True
+        self.throttled = 0
+        self._next_slot = 0.0
+        self._blocked_until = 0.0
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """
+        Blocks until the next request may be sent and reserves its slot
+
+        Returns:
+            float: Time (monotonic) the slot was granted, to be passed to on_throttle()
+        """
+
+        if not self.enabled:
+            return time.monotonic()
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot, self._blocked_until)
+            self._next_slot = slot + 1 / self.rate
+        if slot > now:
+            with registry.timer('rate_limit_wait'):
+                time.sleep(slot - now)
+        return slot
+
+    def on_success(self) -> None:
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttle(self, sent_at: float, retry_after: float = None) -> None:
+        """
+        Slows down after a 429 or 503
+
+        Args:
+            sent_at (float): Slot returned by acquire() for the rejected request
+            retry_after (float): Seconds the API asked us to wait
+        """
+
+        with self._lock:
+            self.throttled += 1
+            now = time.monotonic()
+            # Requests already in flight when the rate was cut do not cut it again
+            if sent_at >= self._last_decrease:
+                self.rate = max(self.min_rate, self.rate * self.decrease)
+                self._last_decrease = now
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+            self._next_slot = max(self._next_slot, now + 1 / self.rate)
+
+
+_governor = RateGovernor()
+
+
+def get_governor() -> RateGovernor:
+    """
+    Returns the governor shared by every client talking to warframe.market
+    """
+
+    return _governor
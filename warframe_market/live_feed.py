@@ -0,0 +1,241 @@
+import bisect
+import json
+import socket
+import statistics
+import threading
+import time
+from typing import Iterable
+
+from warframe_market.order_stream import OrderBookSummary
+
+
+class LiveOrderBook:
+    """
+    Incrementally maintained order book of a single item
+    Online sell orders are kept sorted by price so the lowest one is found without a scan
+    """
+
+    def __init__(self):
+        self.orders: dict[str, dict] = {}
+        self._sell: list[tuple[int, str]] = []
+
+    def __len__(self) -> int:
+        return len(self.orders)
+
+    def apply(self, event: str, order: dict) -> None:
+        """
+        Applies an add, update or remove event
+
+        Args:
+            event (str): 'add', 'update' or 'remove'
+            order (dict): Order in the warframe.market format (only 'id' is needed for removals)
+        """
+
+        self._discard(order['id'])
+        if event in ('add', 'update'):
+            self.orders[order['id']] = order
+            if self._eligible(order):
+                bisect.insort(self._sell, (int(order['platinum']), order['id']))
+
+    def set_user_status(self, user: str, status: str) -> None:
+        """
+        Updates the status of every order of a user (e.g. when they go offline)
+        """
+
+        for order in [order for order in self.orders.values() if order['user']['ingame_name'] == user]:
+            self.apply('update', order | {'user': order['user'] | {'status': status}})
+
+    def sell_orders(self, profile: str, rank: int = None) -> Iterable[dict]:
+        """
+        Yields online sell orders from other sellers (of mods at rank, when given), cheapest first
+        """
+
+        for _, order_id in self._sell:
+            order = self.orders[order_id]
+            if order['user']['ingame_name'] != profile \
+                    and (rank is None or int(order.get('mod_rank') or 0) == rank):
+                yield order
+
+    def lowest_price(self, profile: str, rank: int = None) -> int:
+        return next((int(order['platinum']) for order in self.sell_orders(profile, rank)), None)
+
+    def summary(self, profile: str) -> OrderBookSummary:
+        orders = list(self.sell_orders(profile))
+        if not orders:
+            return OrderBookSummary(None, None, 0, 0)
+        prices = [int(order['platinum']) for order in orders]
+        volume = sum(int(order.get('quantity', 1)) for order in orders)
+        return OrderBookSummary(prices[0], statistics.median(prices), volume, len(prices))
+
+    def _discard(self, order_id: str) -> None:
+        previous = self.orders.pop(order_id, None)
+        if previous is not None and self._eligible(previous):
+            index = bisect.bisect_left(self._sell, (int(previous['platinum']), order_id))
+            if index < len(self._sell) and self._sell[index][1] == order_id:
+                del self._sell[index]
+
+    @staticmethod
+    def _eligible(order: dict) -> bool:
+        return order['order_type'] == 'sell' and order['user']['status'] == 'ingame'
+
+
+class LiveFeed:
+    """
+    Subscriber keeping an in-memory order book for every item we hold, fed by push events
+    instead of polling /items/{item}/orders
+
+    Messages are JSON objects, one per line:
+        {"type": "subscribe", "items": [...]}                  sent by us once connected
+        {"type": "snapshot", "item": ..., "orders": [...]}     full book, resets the item
+        {"type": "add" | "update" | "remove", "item": ..., "order": {...}}
+        {"type": "status", "user": ..., "status": "ingame" | "online" | "offline"}
+    """
+
+    def __init__(self, items: Iterable[str]):
+        self.items = set(items)
+        self.books: dict[str, LiveOrderBook] = {}
+        self.events = 0
+        self.last_event: float = None
+        self.connected = False
+        self._lock = threading.Lock()
+        self._socket: socket.socket = None
+        self._thread: threading.Thread = None
+
+    def has(self, item: str) -> bool:
+        """
+        Tells whether the book of an item is live and can answer price queries
+        """
+
+        return self.connected and item in self.books
+
+    def lowest_price(self, item: str, profile: str, rank: int = None) -> int:
+        with self._lock:
+            book = self.books.get(item)
+            return book.lowest_price(profile, rank) if book is not None else None
+
+    def summary(self, item: str, profile: str) -> OrderBookSummary:
+        with self._lock:
+            book = self.books.get(item)
+            return book.summary(profile) if book is not None else None
+
+    def handle(self, message: dict) -> None:
+        """
+        Applies a single feed message to the order books
+
+        Args:
+            message (dict): Decoded message (see the class docstring for the format)
+        """
+
+        kind = message.get('type')
+        with self._lock:
+            if kind == 'snapshot' and message['item'] in self.items:
+                book = self.books[message['item']] = LiveOrderBook()
+                for order in message['orders']:
+                    book.apply('add', order)
+            elif kind in ('add', 'update', 'remove') and message['item'] in self.books:
+                self.books[message['item']].apply(kind, message['order'])
+            elif kind == 'status':
+                for book in self.books.values():
+                    book.set_user_status(message['user'], message['status'])
+            else:
+                return
+            self.events += 1
+            self.last_event = time.time()
+
+    def consume(self, lines: Iterable[str]) -> None:
+        """
+        Applies messages from any line-based transport until it is exhausted
+
+        Args:
+            lines (Iterable[str]): JSON messages, one per line
+        """
+
+        for line in lines:
+            if line.strip():
+                self.handle(json.loads(line))
+
+    def connect(self, host: str, port: int, timeout: float = 10) -> 'LiveFeed':
+        """
+        Connects to a feed server, subscribes to our items and applies events in a background thread
+
+        Args:
+            host (str): Feed server host
+            port (int): Feed server port
+            timeout (float): Connection timeout in seconds
+
+        Returns:
+            LiveFeed: self, for chaining
+        """
+
+        self._socket = socket.create_connection((host, port), timeout=timeout)
+        self._socket.settimeout(None)
+        subscription = json.dumps({'type': 'subscribe', 'items': sorted(self.items)}) + '\n'
+        self._socket.sendall(subscription.encode())
+        self.connected = True
+
+        def receive() -> None:
+            try:
+                with self._socket.makefile('r', encoding='utf-8') as lines:
+                    self.consume(lines)
+            except (OSError, ValueError) as err:
+                print(f'Live feed disconnected: {err}')
+            finally:
+                self.connected = False
+
+        self._thread = threading.Thread(target=receive, name='live-feed', daemon=True)
+        self._thread.start()
+        return self
+
+    def wait_for(self, items: Iterable[str] = None, timeout: float = 10) -> bool:
+        """
+        Waits until the snapshots of items (all subscribed items by default) have arrived
+
+        Returns:
+            bool: True when every book is available
+        """
+
+        wanted = set(items or self.items)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                if wanted <= set(self.books):
+                    return True
+            if not self.connected:
+                return False
+            time.sleep(0.01)
+        return False
+
+    def close(self) -> None:
+        self.connected = False
+        if self._socket is not None:
+            try:
+                self._socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._socket.close()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+
+
+def connect_live_feed(address: str, items: Iterable[str], timeout: float = 10) -> LiveFeed:
+    """
+    Connects to a feed server and waits for the initial snapshots
+
+    Args:
+        address (str): Feed server as host:port
+        items (Iterable[str]): Items to subscribe to
+        timeout (float): Seconds to wait for the connection and the snapshots
+
+    Returns:
+        LiveFeed: The connected feed, or None when it could not be reached
+    """
+
+    host, _, port = address.rpartition(':')
+    try:
+        feed = LiveFeed(items).connect(host, int(port), timeout)
+    except (OSError, ValueError) as err:
+        print(f'Could not connect to the live feed at {address}: {err}')
+        return None
+    if not feed.wait_for(timeout=timeout):
+        print(f'Live feed is missing snapshots, those items will be polled')
+    return feed
@@ -0,0 +1,234 @@
+import bisect
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRIC_PREFIX = 'warframe_market'
+
+_current_endpoint: contextvars.ContextVar[str] = contextvars.ContextVar('current_endpoint', default=None)
+
+
+class Histogram:
+    """
+    Latency histogram with fixed upper bounds (in seconds), as used by Prometheus
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+    def cumulative(self) -> list[tuple[str, int]]:
+        """
+        Returns (upper bound, cumulative count) pairs including the +Inf bucket
+        """
+        pairs = []
+        running = 0
+        for bound, count in zip([*map(str, self.buckets), '+Inf'], self.counts):
+            running += count
+            pairs.append((bound, running))
+        return pairs
+
+
+class EndpointMetrics:
+    """
+    Counters and latency histogram for a single endpoint (or timed activity such as sleeping)
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.throttled = 0
+        self.latency = Histogram()
+
+    def as_dict(self) -> dict:
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'throttled': self.throttled,
+            'seconds': round(self.latency.total, 6),
+            'mean_seconds': round(self.latency.total / self.latency.count, 6) if self.latency.count else 0,
+            'buckets': dict(self.latency.cumulative()),
+        }
+
+
+class MetricsRegistry:
+    """
+    Collects per-endpoint metrics for a run
+    While disabled every hook returns immediately, so instrumentation costs a single attribute check
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.started = time.time()
+        self._endpoints: dict[str, EndpointMetrics] = {}
+        self._lock = threading.Lock()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._endpoints.clear()
+            self.started = time.time()
+
+    def observe(self, endpoint: str, seconds: float, error: bool = False) -> None:
+        """
+        Records one call of an endpoint
+
+        Args:
+            endpoint (str): Endpoint name (e.g. 'item_orders')
+            seconds (float): Duration of the call
+            error (bool): Whether the call failed
+        """
+
+        if not self.enabled:
+            return
+        with self._lock:
+            metrics = self._endpoints.setdefault(endpoint, EndpointMetrics())
+            metrics.calls += 1
+            metrics.errors += error
+            metrics.latency.observe(seconds)
+
+    def throttled(self, count: int = 1, endpoint: str = None) -> None:
+        """
+        Records throttled (429 or 503) responses, attributed to the endpoint currently being called
+
+        Args:
+            count (int): Number of throttled responses
+            endpoint (str): Endpoint name (defaults to the instrumented call in progress)
+        """
+
+        endpoint = endpoint or _current_endpoint.get()
+        if not self.enabled or not count or endpoint is None:
+            return
+        with self._lock:
+            self._endpoints.setdefault(endpoint, EndpointMetrics()).throttled += count
+
+    @contextmanager
+    def timer(self, endpoint: str) -> Iterator[None]:
+        """
+        Times a block of code (e.g. a sleep or a Sheets read) as a call of endpoint
+
+        Args:
+            endpoint (str): Name the duration is recorded under
+        """
+
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(endpoint, time.perf_counter() - start)
+
+    def summary(self) -> dict:
+        """
+        Returns all metrics as a JSON-serialisable dictionary
+        """
+
+        with self._lock:
+            endpoints = {name: metrics.as_dict() for name, metrics in sorted(self._endpoints.items())}
+        return {
+            'started': self.started,
+            'duration_seconds': round(time.time() - self.started, 6),
+            'endpoints': endpoints,
+        }
+
+    def prometheus(self) -> str:
+        """
+        Returns all metrics in the Prometheus text exposition format
+        """
+
+        with self._lock:
+            endpoints = sorted(self._endpoints.items())
+
+        lines = [
+            f'# HELP {METRIC_PREFIX}_calls_total Calls per endpoint',
+            f'# TYPE {METRIC_PREFIX}_calls_total counter',
+        ]
+        lines += [f'{METRIC_PREFIX}_calls_total{{endpoint="{name}"}} {metrics.calls}' for name, metrics in endpoints]
+        lines += [
+            f'# HELP {METRIC_PREFIX}_errors_total Failed calls per endpoint',
+            f'# TYPE {METRIC_PREFIX}_errors_total counter',
+        ]
+        lines += [f'{METRIC_PREFIX}_errors_total{{endpoint="{name}"}} {metrics.errors}' for name, metrics in endpoints]
+        lines += [
+            f'# HELP {METRIC_PREFIX}_throttled_total Responses with status 429 or 503 per endpoint',
+            f'# TYPE {METRIC_PREFIX}_throttled_total counter',
+        ]
+        lines += [f'{METRIC_PREFIX}_throttled_total{{endpoint="{name}"}} {metrics.throttled}'
+                  for name, metrics in endpoints]
+        lines += [
+            f'# HELP {METRIC_PREFIX}_duration_seconds Call duration per endpoint',
+            f'# TYPE {METRIC_PREFIX}_duration_seconds histogram',
+        ]
+        for name, metrics in endpoints:
+            for bound, count in metrics.latency.cumulative():
+                lines.append(f'{METRIC_PREFIX}_duration_seconds_bucket{{endpoint="{name}",le="{bound}"}} {count}')
+            lines.append(f'{METRIC_PREFIX}_duration_seconds_sum{{endpoint="{name}"}} {metrics.latency.total}')
+            lines.append(f'{METRIC_PREFIX}_duration_seconds_count{{endpoint="{name}"}} {metrics.latency.count}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, directory: str) -> tuple[str, str]:
+        """
+        Writes the JSON summary and the Prometheus textfile
+
+        Args:
+            directory (str): Output directory (e.g. the node_exporter textfile directory)
+
+        Returns:
+            tuple[str, str]: Paths of the JSON summary and the Prometheus textfile
+        """
+
+        os.makedirs(directory, exist_ok=True)
+        outputs = (
+            (os.path.join(directory, f'{METRIC_PREFIX}.json'), json.dumps(self.summary(), indent=2)),
+            (os.path.join(directory, f'{METRIC_PREFIX}.prom'), self.prometheus()),
+        )
+        for path, content in outputs:
+            # Written atomically so a scraper never reads a half-written file
+            with open(f'{path}.tmp', 'w') as f:
+                f.write(content)
+            os.replace(f'{path}.tmp', path)
+        return outputs[0][0], outputs[1][0]
+
+
+registry = MetricsRegistry()
+
+
+def instrumented(endpoint: str) -> Callable:
+    """
+    Decorates an API function so that its calls, failures (a None result) and duration are recorded
+
+    Args:
+        endpoint (str): Name the calls are recorded under (e.g. 'item_orders')
+    """
+
+    def decorator(function: Callable) -> Callable:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not registry.enabled:
+                return function(*args, **kwargs)
+
+            token = _current_endpoint.set(endpoint)
+            start = time.perf_counter()
+            result = None
+            try:
+                result = function(*args, **kwargs)
+                return result
+            finally:
+                registry.observe(endpoint, time.perf_counter() - start, error=result is None)
+                _current_endpoint.reset(token)
+        return wrapper
+    return decorator
@@ -0,0 +1,287 @@
+import statistics
+import threading
+from array import array
+from bisect import bisect_right
+from typing import Callable, Iterable, Iterator
+
+from warframe_market.order_stream import OrderBookSummary
+
+STATUSES = ('ingame', 'online', 'offline')
+IN_GAME = ('ingame',)
+
+
+class BookSide:
+    """
+    One side (sell or buy) of an order book, sorted by price: best offer first
+    Every column is a typed array, sellers are stored as indexes into the snapshot's seller list
+    """
+
+    __slots__ = ('prices', 'quantities', 'statuses', 'ranks', 'sellers', '_ascending')
+
+    def __init__(self, rows: list[tuple[int, int, int, int, int]], ascending: bool):
+        rows.sort(key=lambda row: row[0], reverse=not ascending)
+        self.prices = array('l', (row[0] for row in rows))
+        self.quantities = array('l', (row[1] for row in rows))
+        self.statuses = array('b', (row[2] for row in rows))
+        self.ranks = array('b', (row[3] for row in rows))
+        self.sellers = array('l', (row[4] for row in rows))
+        self._ascending = ascending
+
+    def __len__(self) -> int:
+        return len(self.prices)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(column.itemsize * len(column)
+                   for column in (self.prices, self.quantities, self.statuses, self.ranks, self.sellers))
+
+    def matching(self, excluded: int = -1, statuses: set[int] = None, rank: int = None,
+                 end: int = None) -> Iterator[int]:
+        """
+        Yields the positions of the orders passing the filters, best price first
+
+        Args:
+            excluded (int): Seller index to leave out (-1 keeps everybody)
+            statuses (set[int]): Status indexes to keep (None keeps every status)
+            rank (int): Mod rank to keep (None keeps every rank)
+            end (int): Position to stop at
+        """
+
+        for position in range(len(self.prices) if end is None else end):
+            if self.sellers[position] == excluded:
+                continue
+            if statuses is not None and self.statuses[position] not in statuses:
+                continue
+            if rank is not None and self.ranks[position] != rank:
+                continue
+            yield position
+
+    def end_at(self, price: int) -> int:
+        """
+        Returns the position after the last order priced at or below price (ascending sides only)
+        """
+
+        return bisect_right(self.prices, price)
+
+
+class OrderBookSnapshot:
+    """
+    Compact copy of a full order book (both sides, every seller status) kept in memory
+    Questions about the book (k-th cheapest price, depth, spread, the view of a given profile)
+    are answered from the snapshot, so trying another pricing strategy does not cost a request
+    """
+
+    def __init__(self, orders: Iterable[dict]):
+        self.sellers: list[str] = []
+        self._seller_index: dict[str, int] = {}
+        sell, buy = [], []
+        for order in orders:
+            status = order['user'].get('status')
+            row = (int(order['platinum']), int(order.get('quantity', 1)),
+                   STATUSES.index(status) if status in STATUSES else len(STATUSES) - 1,
+                   int(order.get('mod_rank') or 0), self._seller(order['user']['ingame_name']))
+            (sell if order['order_type'] == 'sell' else buy).append(row)
+        self.sell = BookSide(sell, ascending=True)
+        self.buy = BookSide(buy, ascending=False)
+
+    def __len__(self) -> int:
+        return len(self.sell) + len(self.buy)
+
+    @property
+    def nbytes(self) -> int:
+        return self.sell.nbytes + self.buy.nbytes
+
+    def kth_cheapest(self, k: int, profile: str = None, rank: int = None,
+                     statuses: tuple[str, ...] = IN_GAME) -> int:
+        """
+        Returns the price of the k-th cheapest sell order
+
+        Args:
+            k (int): 1 for the cheapest order, 2 for the next one...
+            profile (str): Profile whose own orders are left out
+            rank (int): Only count sellers of this mod rank
+            statuses (tuple[str, ...]): Seller statuses to count (None counts everybody)
+
+        Returns:
+            int: Price or None when fewer than k orders match
+        """
+
+        for count, position in enumerate(self.sell.matching(*self._filters(profile, statuses), rank), 1):
+            if count == k:
+                return self.sell.prices[position]
+        return None
+
+    def lowest(self, profile: str = None, rank: int = None, statuses: tuple[str, ...] = IN_GAME) -> int:
+        return self.kth_cheapest(1, profile, rank, statuses)
+
+    def cheapest_offer(self, profile: str = None, rank: int = None,
+                       statuses: tuple[str, ...] = IN_GAME) -> tuple[str, int, int]:
+        """
+        Returns the cheapest sell order, to buy from
+
+        Args:
+            profile (str): Profile whose own orders are left out
+            rank (int): Only count sellers of this mod rank
+            statuses (tuple[str, ...]): Seller statuses to count (None counts everybody)
+
+        Returns:
+            tuple[str, int, int]: Seller, price and quantity, or None when nobody matching is selling
+        """
+
+        position = next(self.sell.matching(*self._filters(profile, statuses), rank), None)
+        if position is None:
+            return None
+        return self.sellers[self.sell.sellers[position]], self.sell.prices[position], self.sell.quantities[position]
+
+    def highest_bid(self, profile: str = None, rank: int = None, statuses: tuple[str, ...] = IN_GAME) -> int:
+        """
+        Returns the best buy order price, or None when nobody matching is buying
+        """
+
+        position = next(self.buy.matching(*self._filters(profile, statuses), rank), None)
+        return self.buy.prices[position] if position is not None else None
+
+    def depth(self, price: int, profile: str = None, rank: int = None, statuses: tuple[str, ...] = IN_GAME) -> int:
+        """
+        Returns the quantity offered at or below a price
+
+        Args:
+            price (int): Highest price counted
+            profile (str): Profile whose own orders are left out
+            rank (int): Only count sellers of this mod rank
+            statuses (tuple[str, ...]): Seller statuses to count (None counts everybody)
+
+        Returns:
+            int: Number of items for sale at that price or cheaper
+        """
+
+        end = self.sell.end_at(price)
+        return sum(self.sell.quantities[position]
+                   for position in self.sell.matching(*self._filters(profile, statuses), rank, end))
+
+    def spread(self, profile: str = None, rank: int = None, statuses: tuple[str, ...] = IN_GAME) -> int:
+        """
+        Returns the gap between the cheapest sell order and the best buy order
+
+        Returns:
+            int: Lowest sell price minus highest buy price, or None when a side is empty
+        """
+
+        lowest = self.lowest(profile, rank, statuses)
+        bid = self.highest_bid(profile, rank, statuses)
+        return lowest - bid if lowest is not None and bid is not None else None
+
+    def summary(self, profile: str = None, rank: int = None) -> OrderBookSummary:
+        """
+        Summarizes the sell orders of sellers in game, as summarize_sell_orders does for a streamed response
+
+        Args:
+            profile (str): Profile whose own orders are left out
+            rank (int): Only count sellers of this mod rank
+
+        Returns:
+            OrderBookSummary: Lowest and median price, volume and sellers (lowest and median are None if nobody sells)
+        """
+
+        positions = list(self.sell.matching(*self._filters(profile, IN_GAME), rank))
+        if not positions:
+            return OrderBookSummary(None, None, 0, 0)
+        prices = [self.sell.prices[position] for position in positions]
+        return OrderBookSummary(prices[0], statistics.median(prices),
+                                sum(self.sell.quantities[position] for position in positions), len(positions))
+
+    def summaries_by_rank(self, profile: str = None) -> dict[int, OrderBookSummary]:
+        """
+        Summarizes the sell orders of sellers in game separately for every mod rank
+
+        Returns:
+            dict[int, OrderBookSummary]: Summary per rank, ranks nobody else sells at are left out
+        """
+
+        ranks = sorted({self.sell.ranks[position] for position in self.sell.matching(*self._filters(profile, IN_GAME))})
+        return {rank: self.summary(profile, rank) for rank in ranks}
+
+    def _seller(self, name: str) -> int:
+        index = self._seller_index.get(name)
+        if index is None:
+            index = self._seller_index[name] = len(self.sellers)
+            self.sellers.append(name)
+        return index
+
+    def _filters(self, profile: str, statuses: tuple[str, ...]) -> tuple[int, set[int]]:
+        excluded = self._seller_index.get(profile, -1) if profile is not None else -1
+        return excluded, {STATUSES.index(status) for status in statuses} if statuses is not None else None
+
+
+class SharedOrderBooks:
+    """
+    Order-book snapshots fetched at most once per run and shared by every lookup (and every profile being repriced)
+    The summary for a profile, which leaves out that profile's own orders, is derived from the snapshot
+    """
+
+    def __init__(self, fetch: Callable[[str], OrderBookSnapshot]):
+        self.fetch = fetch
+        self.fetches = 0
+        self.lookups = 0
+        self._books: dict[str, OrderBookSnapshot] = {}
+        self._locks: dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._books)
+
+    def __contains__(self, item: str) -> bool:
+        return item in self._books
+
+    @property
+    def nbytes(self) -> int:
+        with self._lock:
+            return sum(book.nbytes for book in self._books.values())
+
+    def snapshot(self, item: str) -> tuple[OrderBookSnapshot, bool]:
+        """
+        Returns the snapshot of an item, fetching its order book on first use
+        Concurrent lookups of the same item wait for a single fetch
+
+        Args:
+            item (str): Name of the item (e.g. mirage_prime_systems)
+
+        Returns:
+            tuple[OrderBookSnapshot, bool]: Snapshot (None when the fetch failed) and whether this call fetched it
+        """
+
+        with self._lock:
+            self.lookups += 1
+            lock = self._locks.setdefault(item, threading.Lock())
+        with lock:
+            if item in self._books:
+                return self._books[item], False
+            book = self.fetch(item)
+            with self._lock:
+                self.fetches += 1
+                if book is not None:
+                    self._books[item] = book
+            return book, True
+
+    def summary(self, profile: str, item: str) -> tuple[OrderBookSummary, bool]:
+        """
+        Summarizes the online sell side of an item as seen by profile
+
+        Returns:
+            tuple[OrderBookSummary, bool]: Summary (None when the fetch failed) and whether the book was fetched
+        """
+
+        book, fetched = self.snapshot(item)
+        return (book.summary(profile) if book is not None else None), fetched
+
+    def summaries_by_rank(self, profile: str, mod: str) -> tuple[dict[int, OrderBookSummary], bool]:
+        """
+        Summarizes the online sell side of a mod per rank as seen by profile
+
+        Returns:
+            tuple[dict[int, OrderBookSummary], bool]: Summary per rank (None when the fetch failed)
+            and whether the book was fetched
+        """
+
+        book, fetched = self.snapshot(mod)
+        return (book.summaries_by_rank(profile) if book is not None else None), fetched
@@ -0,0 +1,317 @@
+import codecs
+import heapq
+import json
+import statistics
+from dataclasses import dataclass
+from typing import Iterable, Iterator
+
+ORDERS_KEY = '"orders"'
+CHUNK_SIZE = 64 * 1024
+WHITESPACE = ' \t\n\r'
+RANK_SEPARATOR = '@'
+
+
+class _TextBuffer:
+    """
+    Decoded text of a byte stream, filled on demand and trimmed as it is consumed
+    """
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self.text = ''
+        self.position = 0
+        self.exhausted = False
+
+    def read_more(self) -> bool:
+        if self.exhausted:
+            return False
+        try:
+            chunk = self._decoder.decode(next(self._chunks))
+        except StopIteration:
+            chunk = self._decoder.decode(b'', final=True)
+            self.exhausted = True
+        self.text = self.text[self.position:] + chunk
+        self.position = 0
+        return True
+
+    def next_character(self) -> str:
+        while True:
+            while self.position < len(self.text) and self.text[self.position] in WHITESPACE:
+                self.position += 1
+            if self.position < len(self.text):
+                return self.text[self.position]
+            if not self.read_more():
+                return ''
+
+    def expect(self, character: str) -> None:
+        if self.next_character() != character:
+            raise ValueError(f'Malformed order book: expected {character!r} at offset {self.position}')
+        self.position += 1
+
+
+@dataclass
+class OrderBookSummary:
+    """
+    Condensed view of the online sell side of an order book
+    """
+    lowest: int
+    median: float
+    volume: int
+    sellers: int
+
+
+def ranked_item(item: str, rank: int) -> str:
+    """
+    Returns the key identifying a mod at a given rank (e.g. 'flow@10')
+    Ranked keys are priced, cached and listed separately from the other ranks of the same mod
+
+    Args:
+        item (str): URL name of the mod (e.g. flow)
+        rank (int): Mod rank
+
+    Returns:
+        str: Rank-qualified key
+    """
+
+    return f'{item}{RANK_SEPARATOR}{rank}'
+
+
+def split_ranked_item(key: str) -> tuple[str, int]:
+    """
+    Splits a key made by ranked_item into the URL name and the rank
+
+    Args:
+        key (str): Item name, optionally rank-qualified (e.g. 'flow@10' or 'mirage_prime_systems')
+
+    Returns:
+        tuple[str, int]: URL name and rank (None for unranked items)
+    """
+
+    item, separator, rank = key.partition(RANK_SEPARATOR)
+    return (item, int(rank)) if separator else (key, None)
+
+
+def ranked_names(keys: Iterable[str]) -> set[str]:
+    """
+    Returns the URL names of the items that are keyed by rank (mods)
+
+    Args:
+        keys (Iterable[str]): Item names, optionally rank-qualified (e.g. inventory or deal keys)
+
+    Returns:
+        set[str]: URL names of the rank-qualified keys (e.g. {'flow'} for ['flow@10', 'mirage_prime_systems'])
+    """
+
+    return {item for item, rank in map(split_ranked_item, keys) if rank is not None}
+
+
+def iter_orders(chunks: Iterable[bytes]) -> Iterator[dict]:
+    """
+    Decodes the orders of an /items/{item}/orders response one at a time
+    Only the order being decoded and the unread part of the current chunk are held in memory
+
+    Args:
+        chunks (Iterable[bytes]): Raw response body (e.g. response.iter_content(CHUNK_SIZE))
+
+    Returns:
+        Iterator[dict]: Orders in the order they appear in the response
+    """
+
+    buffer = _TextBuffer(chunks)
+    decoder = json.JSONDecoder()
+
+    while True:
+        index = buffer.text.find(ORDERS_KEY, buffer.position)
+        if index >= 0:
+            buffer.position = index + len(ORDERS_KEY)
+            break
+        # Keep enough of the tail to match a key split across two chunks
+        buffer.position = max(buffer.position, len(buffer.text) - len(ORDERS_KEY))
+        if not buffer.read_more():
+            raise ValueError('Malformed order book: no orders found')
+
+    buffer.expect(':')
+    buffer.expect('[')
+
+    while True:
+        character = buffer.next_character()
+        if character == ']':
+            return
+        if character == ',':
+            buffer.position += 1
+            continue
+        if character == '':
+            raise ValueError('Malformed order book: truncated response')
+
+        while True:
+            try:
+                order, buffer.position = decoder.raw_decode(buffer.text, buffer.position)
+                break
+            except json.JSONDecodeError:
+                # The order is split across chunks, decode again once the rest has arrived
+                if not buffer.read_more():
+                    raise
+        yield order
+
+
+def iter_online_sell_orders(chunks: Iterable[bytes], profile: str) -> Iterator[dict]:
+    """
+    Yields every sell order from a seller that is in game and is not us
+
+    Args:
+        chunks (Iterable[bytes]): Raw response body
+        profile (str): Our profile name on warframe.market (so we don't undercut ourselves)
+
+    Returns:
+        Iterator[dict]: Orders in response order
+    """
+
+    for order in iter_orders(chunks):
+        if order['order_type'] == 'sell' \
+                and order['user']['status'] == 'ingame' \
+                and order['user']['ingame_name'] != profile:
+            yield order
+
+
+def iter_online_sell_prices(chunks: Iterable[bytes], profile: str) -> Iterator[int]:
+    """
+    Yields the price of every sell order from a seller that is in game and is not us
+
+    Args:
+        chunks (Iterable[bytes]): Raw response body
+        profile (str): Our profile name on warframe.market (so we don't undercut ourselves)
+
+    Returns:
+        Iterator[int]: Prices in response order
+    """
+
+    for order in iter_online_sell_orders(chunks, profile):
+        yield int(order['platinum'])
+
+
+def lowest_sell_price(chunks: Iterable[bytes], profile: str) -> int:
+    """
+    Returns the lowest online sell price in a single pass over the response
+
+    Args:
+        chunks (Iterable[bytes]): Raw response body
+        profile (str): Our profile name on warframe.market
+
+    Returns:
+        int: Lowest price or None if nobody else is selling in game
+    """
+
+    return min(iter_online_sell_prices(chunks, profile), default=None)
+
+
+def lowest_sell_prices(chunks: Iterable[bytes], profile: str, k: int) -> list[int]:
+    """
+    Returns the k lowest online sell prices in a single pass over the response
+
+    Args:
+        chunks (Iterable[bytes]): Raw response body
+        profile (str): Our profile name on warframe.market
+        k (int): Number of prices to keep
+
+    Returns:
+        list[int]: Up to k prices, cheapest first
+    """
+
+    return heapq.nsmallest(k, iter_online_sell_prices(chunks, profile))
+
+
+def iter_online_sell_offers(chunks: Iterable[bytes]) -> Iterator[tuple[str, int, int, int]]:
+    """
+    Yields the seller, price, quantity and mod rank of every sell order from a seller that is in game
+    Our own orders are included, so the result can be shared by several profiles (see summarize_offers)
+
+    Args:
+        chunks (Iterable[bytes]): Raw response body
+
+    Returns:
+        Iterator[tuple[str, int, int, int]]: Offers in response order (rank is 0 for unranked items)
+    """
+
+    for order in iter_orders(chunks):
+        if order['order_type'] == 'sell' and order['user']['status'] == 'ingame':
+            yield (order['user']['ingame_name'], int(order['platinum']), int(order.get('quantity', 1)),
+                   int(order.get('mod_rank') or 0))
+
+
+def summarize_offers(offers: Iterable[tuple[str, int, int, int]], profile: str) -> OrderBookSummary:
+    """
+    Returns the lowest and median price and the volume on offer from everybody but profile
+
+    Args:
+        offers (Iterable[tuple[str, int, int, int]]): Offers as yielded by iter_online_sell_offers
+        profile (str): Our profile name on warframe.market
+
+    Returns:
+        OrderBookSummary: Summary of the sell side (lowest and median are None if nobody is selling)
+    """
+
+    prices = []
+    volume = 0
+    for seller, price, quantity, _ in offers:
+        if seller != profile:
+            prices.append(price)
+            volume += quantity
+
+    if not prices:
+        return OrderBookSummary(None, None, 0, 0)
+    return OrderBookSummary(min(prices), statistics.median(prices), volume, len(prices))
+
+
+def summarize_offers_by_rank(offers: Iterable[tuple[str, int, int, int]], profile: str) -> dict[int, OrderBookSummary]:
+    """
+    Summarizes the offers from everybody but profile separately for every mod rank
+
+    Args:
+        offers (Iterable[tuple[str, int, int, int]]): Offers as yielded by iter_online_sell_offers
+        profile (str): Our profile name on warframe.market
+
+    Returns:
+        dict[int, OrderBookSummary]: Summary per rank, ranks nobody else sells at are left out
+    """
+
+    prices: dict[int, list[int]] = {}
+    volumes: dict[int, int] = {}
+    for seller, price, quantity, rank in offers:
+        if seller != profile:
+            prices.setdefault(rank, []).append(price)
+            volumes[rank] = volumes.get(rank, 0) + quantity
+
+    return {rank: OrderBookSummary(min(bucket), statistics.median(bucket), volumes[rank], len(bucket))
+            for rank, bucket in sorted(prices.items())}
+
+
+def summarize_sell_orders(chunks: Iterable[bytes], profile: str) -> OrderBookSummary:
+    """
+    Returns the lowest and median online sell price and the volume on offer in a single pass
+    Only the prices are kept while the response is read
+
+    Args:
+        chunks (Iterable[bytes]): Raw response body
+        profile (str): Our profile name on warframe.market
+
+    Returns:
+        OrderBookSummary: Summary of the sell side (lowest and median are None if nobody is selling)
+    """
+
+    return summarize_offers(iter_online_sell_offers(chunks), profile)
+
+
+def summarize_sell_orders_by_rank(chunks: Iterable[bytes], profile: str) -> dict[int, OrderBookSummary]:
+    """
+    Summarizes the online sell side separately for every mod rank, in a single pass
+
+    Args:
+        chunks (Iterable[bytes]): Raw response body
+        profile (str): Our profile name on warframe.market
+
+    Returns:
+        dict[int, OrderBookSummary]: Summary per rank, ranks nobody else sells at are left out
+    """
+
+    return summarize_offers_by_rank(iter_online_sell_offers(chunks), profile)
@@ -0,0 +1,210 @@
+import cProfile
+import io
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from types import FrameType
+
+SAMPLE_INTERVAL = 0.005  # Seconds between two stack samples
+TOP_FUNCTIONS = 25
+TOP_ALLOCATIONS = 15
+TRACEMALLOC_FRAMES = 1
+
+# Parts of the workflow the summary breaks the time down into: (file suffix, function name or None for any)
+CATEGORIES = {
+    'find_lowest_price_for_item': (('warframe_market/warframe_market.py', 'find_lowest_price_for_item'),
+                                   ('warframe_market/warframe_market.py', 'find_lowest_prices_by_rank')),
+    'json decoding': (('json/decoder.py', None),),
+    'sheets reads': (('database/google_sheets.py', 'load_inventory_snapshot'),
+                     ('database/google_sheets.py', 'read_data_from_sheet')),
+    'sleeps': (('warframe_market/governor.py', 'acquire'),
+               ('urllib3/util/retry.py', 'sleep')),
+    'order mutations': (('warframe_market/warframe_market.py', 'delete_existing_order'),
+                        ('warframe_market/warframe_market.py', 'create_new_order'),
+                        ('warframe_market/warframe_market.py', 'update_existing_order')),
+}
+
+
+def frame_label(frame: FrameType) -> str:
+    """
+    Names a stack frame for the collapsed-stack file (e.g. find_lowest_price_for_item (warframe_market.py:187))
+    """
+
+    code = frame.f_code
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+def thread_label(thread: threading.Thread) -> str:
+    """
+    Names a thread without its counter, so that the workers of a pool are merged in the flame graph
+    """
+
+    if thread is None:
+        return 'unknown thread'
+    return re.sub(r'[-_\d]+$', '', thread.name) or thread.name
+
+
+class WorkflowProfiler:
+    """
+    Profiles a whole run: stacks of every thread are sampled at a fixed interval (wall-clock time, written as
+    collapsed stacks for flame graph tools), the main thread runs under cProfile and allocations are traced
+    with tracemalloc. The summary breaks the sampled time down into the CATEGORIES of the workflow
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL, categories: dict[str, tuple] = None):
+        self.interval = interval
+        self.categories = CATEGORIES if categories is None else categories
+        self.stacks: Counter[tuple[str, ...]] = Counter()
+        self.category_samples: Counter[str] = Counter()  # Thread samples per category
+        self.category_ticks: Counter[str] = Counter()  # Sampling rounds where any thread was in the category
+        self.samples = 0
+        self.ticks = 0
+        self.threads: set[str] = set()
+        self.elapsed = 0.0
+        self.peak_memory = 0
+        self.memory_snapshot: tracemalloc.Snapshot = None
+        self._profile = cProfile.Profile()
+        self._started = 0.0
+        self._stop = threading.Event()
+        self._sampler: threading.Thread = None
+
+    def __enter__(self) -> 'WorkflowProfiler':
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+        self._stop.clear()
+        self._sampler = threading.Thread(target=self._sample_loop, name='profiler', daemon=True)
+        self._started = time.perf_counter()
+        self._sampler.start()
+        self._profile.enable()
+
+    def stop(self) -> None:
+        self._profile.disable()
+        self.elapsed = time.perf_counter() - self._started
+        self._stop.set()
+        self._sampler.join()
+        self.peak_memory = tracemalloc.get_traced_memory()[1]
+        self.memory_snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+        ))
+        tracemalloc.stop()
+
+    def _sample_loop(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            threads = {thread.ident: thread for thread in threading.enumerate()}
+            categories = set()
+            for ident, frame in sys._current_frames().items():
+                if ident != own:
+                    categories |= self._record(thread_label(threads.get(ident)), frame)
+            self.category_ticks.update(categories)
+            self.ticks += 1
+
+    def _record(self, thread: str, frame: FrameType) -> set[str]:
+        labels = []
+        categories = set()
+        while frame is not None:
+            labels.append(frame_label(frame))
+            categories.update(self._categories_of(frame))
+            frame = frame.f_back
+        labels.append(thread)
+        self.stacks[tuple(reversed(labels))] += 1
+        self.category_samples.update(categories)
+        self.threads.add(thread)
+        self.samples += 1
+        return categories
+
+    def _categories_of(self, frame: FrameType) -> list[str]:
+        filename = frame.f_code.co_filename.replace(os.sep, '/')
+        name = frame.f_code.co_name
+        return [category for category, matchers in self.categories.items()
+                if any(filename.endswith(suffix) and function in (None, name) for suffix, function in matchers)]
+
+    def breakdown(self) -> dict[str, tuple[float, float]]:
+        """
+        Returns the time spent in every category
+        A sample counts for every category found on its stack (e.g. JSON decoding inside find_lowest_price_for_item)
+
+        Returns:
+            dict[str, tuple[float, float]]: Category -> (seconds summed over threads,
+            seconds of wall time during which at least one thread was in it)
+        """
+
+        # Sampling rounds take a little longer than the interval, the measured period is used instead
+        period = self.elapsed / self.ticks if self.ticks else 0.0
+        return {category: (self.category_samples[category] * period, self.category_ticks[category] * period)
+                for category in self.categories}
+
+    def collapsed_stacks(self) -> str:
+        """
+        Returns the samples in the collapsed-stack format read by flamegraph.pl, speedscope and inferno
+        """
+
+        return ''.join(f'{";".join(stack)} {count}\n' for stack, count in sorted(self.stacks.items()))
+
+    def summary(self, title: str = None) -> str:
+        lines = [f'Profile of {title}' if title else 'Profile', '']
+        lines.append(f'Wall time: {self.elapsed:.2f}s, {self.samples} samples every {self.interval * 1000:g}ms '
+                     f'from {len(self.threads)} threads ({", ".join(sorted(self.threads))})')
+        lines.append('')
+        lines.append('Time by part of the workflow (nested parts count in both):')
+        lines.append(f'  {"":<28} {"thread time":>11} {"wall time":>10} {"share":>7}')
+        for category, (thread_seconds, wall_seconds) in self.breakdown().items():
+            share = wall_seconds / self.elapsed if self.elapsed else 0.0
+            lines.append(f'  {category:<28} {thread_seconds:>10.2f}s {wall_seconds:>9.2f}s {share:>7.1%}')
+
+        stream = io.StringIO()
+        pstats.Stats(self._profile, stream=stream).sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+        lines.append('')
+        lines.append(f'CPU profile of the main thread, top {TOP_FUNCTIONS} by cumulative time:')
+        lines.append(stream.getvalue().strip('\n'))
+
+        lines.append('')
+        lines.append(f'Memory: {self.peak_memory / 1024 / 1024:.1f}MB traced at peak, '
+                     f'top {TOP_ALLOCATIONS} allocations still held at the end:')
+        for statistic in self.memory_snapshot.statistics('lineno')[:TOP_ALLOCATIONS]:
+            frame = statistic.traceback[0]
+            lines.append(f'  {statistic.size / 1024:>9.1f}KB {statistic.count:>7} blocks  '
+                         f'{frame.filename}:{frame.lineno}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, directory: str, name: str) -> dict[str, str]:
+        """
+        Writes the collapsed stacks, the cProfile statistics, the tracemalloc snapshot and the text summary
+
+        Args:
+            directory (str): Output directory
+            name (str): Name of the run, used in the file names (e.g. reprice)
+
+        Returns:
+            dict[str, str]: Kind of output -> path
+        """
+
+        os.makedirs(directory, exist_ok=True)
+        stem = os.path.join(directory, f'{name}-{time.strftime("%Y%m%d-%H%M%S")}')
+        paths = {
+            'summary': f'{stem}.txt',
+            'stacks': f'{stem}.collapsed',
+            'cpu': f'{stem}.pstats',
+            'memory': f'{stem}.tracemalloc',
+        }
+        with open(paths['summary'], 'w') as f:
+            f.write(self.summary(name))
+        with open(paths['stacks'], 'w') as f:
+            f.write(self.collapsed_stacks())
+        self._profile.dump_stats(paths['cpu'])
+        self.memory_snapshot.dump(paths['memory'])
+        return paths
@@ -1,21 +1,22 @@
-import requests
 import json
 
 from dataclasses import dataclass
-from time import sleep
+from typing import Callable, Collection
 from requests.exceptions import HTTPError
 
-WARFRAME_MARKET_API = 'https://api.warframe.market/v1'
-DEFAULT_SLEEP = 0.4
+from warframe_market.client import WARFRAME_MARKET_API, get_client, warframe_market_standard_headers
+from warframe_market.governor import get_governor
+from warframe_market.live_feed import LiveFeed
+from warframe_market.metrics import instrumented, registry
+from warframe_market.order_books import OrderBookSnapshot, SharedOrderBooks
+from warframe_market.order_stream import CHUNK_SIZE, OrderBookSummary, ranked_item, split_ranked_item
+from warframe_market.order_stream import iter_orders, summarize_sell_orders, summarize_sell_orders_by_rank
 
-warframe_market_standard_headers = {
-        'Content-Type': 'application/json',
-        'Authorization': 'JWT',
-        'Accept': 'application/json',
-        'auth_type': 'header',
-        'language': 'en',
-        'platform': 'pc',
-    }
+NO_SELLER_PRICE = 100000  # I assume nothing sells for this much!!!
+
+_live_feed: LiveFeed = None
+_shared_books: SharedOrderBooks = None
+_order_book_listeners: list[Callable[[str, OrderBookSummary], None]] = []
 
 
 @dataclass
@@ -30,6 +31,27 @@ class ExistingPrimeOrder:
     item_id: str
     item_url: str
     ducats: int = None
+    mod_rank: int = None
+
+    @property
+    def item_key(self) -> str:
+        """
+        Item name, rank-qualified whenever the order has a rank (see ranked_item)
+        """
+        return self.item_url if self.mod_rank is None else ranked_item(self.item_url, self.mod_rank)
+
+    def inventory_key(self, ranked: Collection[str]) -> str:
+        """
+        Item name as the inventory keys it: rank-qualified only for the items held by rank
+        Other rankable items (e.g. arcanes listed on the Items sheet) keep their bare name, whatever their rank
+
+        Args:
+            ranked (Collection[str]): URL names of the items held by rank (see ranked_names)
+
+        Returns:
+            str: Key matching the inventory and the deals (e.g. 'flow@10' or 'arcane_energize')
+        """
+        return ranked_item(self.item_url, self.mod_rank or 0) if self.item_url in ranked else self.item_url
 
 
 @dataclass
@@ -40,8 +62,44 @@ class NewPrimeOrder:
     item_id: str
     price: int
     quantity: int
+    rank: int = None
 
 
+def set_sleeps_enabled(enabled: bool) -> None:
+    """
+    Turns request pacing on or off (off when replaying a cassette, as nothing is rate limited)
+
+    Args:
+        enabled (bool): Whether requests wait for the rate governor
+    """
+
+    get_governor().enabled = enabled
+
+
+def add_order_book_listener(listener: Callable[[str, OrderBookSummary], None]) -> None:
+    """
+    Registers a callback that receives every order book fetched by find_lowest_price_for_item
+
+    Args:
+        listener (Callable[[str, OrderBookSummary], None]): Called with the item name and its summary
+    """
+
+    _order_book_listeners.append(listener)
+
+
+def remove_order_book_listener(listener: Callable[[str, OrderBookSummary], None]) -> None:
+    """
+    Unregisters a callback added with add_order_book_listener
+
+    Args:
+        listener (Callable[[str, OrderBookSummary], None]): The registered callback
+    """
+
+    if listener in _order_book_listeners:
+        _order_book_listeners.remove(listener)
+
+
+@instrumented('signin')
 def login_to_warframe_market(email: str, password: str) -> str:
     """
     Logins to warframe.warframe_market and returns a JWT token for authenticated calls
@@ -50,18 +108,8 @@ def login_to_warframe_market(email: str, password: str) -> str:
         str: JWT token needed for authenticated calls to warframe.warframe_market API
     """
 
-    data = {
-        'email': email,
-        'password': password,
-        'auth_type': 'header',
-    }
-
     try:
-        response = requests.post(f'{WARFRAME_MARKET_API}/auth/signin',
-                                 headers=warframe_market_standard_headers, data=json.dumps(data))
-        response.raise_for_status()
-        authentication_token = response.headers["Authorization"]
-        return authentication_token
+        return get_client().login(email, password)
 
     except HTTPError as http_err:
         print(f'HTTP Error occurred: {http_err}')
@@ -69,6 +117,7 @@ def login_to_warframe_market(email: str, password: str) -> str:
         print(f'Error occurred: {err}')
 
 
+@instrumented('profile_orders')
 def get_existing_orders(profile: str) -> list[ExistingPrimeOrder]:
     """
     Get all selling orders for profile from warframe.warframe_market API
@@ -81,8 +130,7 @@ def get_existing_orders(profile: str) -> list[ExistingPrimeOrder]:
     """
 
     try:
-        response = requests.get(f'{WARFRAME_MARKET_API}/profile/{profile}/orders',
-                                headers=warframe_market_standard_headers)
+        response = get_client().request('GET', f'/profile/{profile}/orders')
         response.raise_for_status()
         data = response.json()
         clean_json = data['payload']['sell_orders']
@@ -95,6 +143,7 @@ def get_existing_orders(profile: str) -> list[ExistingPrimeOrder]:
                 line['item']['id'],
                 line['item']['url_name'],
                 line['item'].get('ducats'),
+                line.get('mod_rank'),
             ))
         return existing_orders
 
@@ -104,35 +153,155 @@ def get_existing_orders(profile: str) -> list[ExistingPrimeOrder]:
         print(f'Error occurred: {err}')
 
 
+def set_live_feed(feed: LiveFeed) -> None:
+    """
+    Answers price lookups from a live order-book feed (for the items it holds) instead of polling
+
+    Args:
+        feed (LiveFeed): Connected feed, or None to always poll warframe.market
+    """
+
+    global _live_feed
+    _live_feed = feed
+
+
+def set_shared_order_books(books: SharedOrderBooks) -> None:
+    """
+    Keeps a snapshot of every fetched order book for the run, shared by all lookups and profiles
+
+    Args:
+        books (SharedOrderBooks): Books shared for the run, or None to fetch a summary per lookup
+    """
+
+    global _shared_books
+    _shared_books = books
+
+
+def find_lowest_price_locally(profile: str, item: str) -> int:
+    """
+    Returns the lowest price for an item from the live feed, without any network call
+
+    Args:
+        profile (str): Our profile name on warframe.market (so we don't undercut ourselves)
+        item (str): Name of the item (e.g. mirage_prime_systems), rank-qualified for mods (e.g. flow@10)
+
+    Returns:
+        int: Lowest price, or None when the live feed does not hold the item
+    """
+
+    item, rank = split_ranked_item(item)
+    if _live_feed is None or not _live_feed.has(item):
+        return None
+    with registry.timer('live_feed'):
+        lowest_price = _live_feed.lowest_price(item, profile, rank)
+    return lowest_price if lowest_price is not None else NO_SELLER_PRICE
+
+
 def find_lowest_price_for_item(profile: str, item: str) -> int:
     """
     Returns the lowest price for an item on warframe.warframe_market
+    Answered from the live feed when it holds the item, otherwise the order book is fetched
 
     Args:
-        item (str): Name of the item (e.g. mirage_prime_systems)
+        item (str): Name of the item (e.g. mirage_prime_systems), rank-qualified for mods (e.g. flow@10)
         profile (str): Our profile name on warframe.market (so we don't undercut ourselves)
 
     Returns:
        int: Returns the lowest price
     """
 
+    lowest_price = find_lowest_price_locally(profile, item)
+    if lowest_price is not None:
+        return lowest_price
+
+    mod, rank = split_ranked_item(item)
+    if rank is not None:
+        prices = find_lowest_prices_by_rank(profile, mod)
+        return prices.get(rank, NO_SELLER_PRICE) if prices is not None else None
+
+    if _shared_books is not None:
+        summary, fetched = _shared_books.summary(profile, item)
+    else:
+        summary, fetched = fetch_order_book_summary(profile, item), True
+    if summary is None:
+        return None
+
+    # A shared book is only reported by the profile that fetched it
+    if fetched:
+        for listener in _order_book_listeners:
+            listener(item, summary)
+
+    return summary.lowest if summary.lowest is not None else NO_SELLER_PRICE
+
+
+def find_lowest_prices_by_rank(profile: str, mod: str) -> dict[int, int]:
+    """
+    Returns the lowest price of a mod at every rank it is sold at, from a single order-book request
+
+    Args:
+        profile (str): Our profile name on warframe.market (so we don't undercut ourselves)
+        mod (str): URL name of the mod (e.g. flow)
+
+    Returns:
+        dict[int, int]: Lowest price per rank (ranks nobody sells at are left out)
+    """
+
+    if _shared_books is not None:
+        summaries, fetched = _shared_books.summaries_by_rank(profile, mod)
+    else:
+        summaries, fetched = fetch_order_book_summaries_by_rank(profile, mod), True
+    if summaries is None:
+        return None
+
+    if fetched:
+        for rank, summary in summaries.items():
+            for listener in _order_book_listeners:
+                listener(ranked_item(mod, rank), summary)
+
+    return {rank: summary.lowest for rank, summary in summaries.items()}
+
+
+@instrumented('item_orders')
+def fetch_order_book_summaries_by_rank(profile: str, mod: str) -> dict[int, OrderBookSummary]:
+    """
+    Fetches the order book of a mod and summarizes its online sell side per rank while streaming it
+
+    Args:
+        profile (str): Our profile name on warframe.market (so we don't undercut ourselves)
+        mod (str): URL name of the mod (e.g. flow)
+
+    Returns:
+        dict[int, OrderBookSummary]: Summary per rank
+    """
+
     try:
-        sleep(DEFAULT_SLEEP)
-        response = requests.get(f'{WARFRAME_MARKET_API}/items/{item}/orders', headers=warframe_market_standard_headers)
-        response.raise_for_status()
-        data = response.json()
-        orders = data['payload']['orders']
-        lowest_price = 100000  # I assume nothing sells for this much!!!
+        with get_client().request('GET', f'/items/{mod}/orders', stream=True) as response:
+            response.raise_for_status()
+            return summarize_sell_orders_by_rank(response.iter_content(CHUNK_SIZE), profile)
 
-        for order in orders:
-            if order['order_type'] == 'sell' \
-                    and order['user']['status'] == 'ingame' \
-                    and order['user']['ingame_name'] != profile:
+    except HTTPError as http_err:
+        print(f'HTTP Error occurred: {http_err}')
+    except Exception as err:
+        print(f'Error occurred: {err}')
 
-                if int(order['platinum']) < lowest_price:
-                    lowest_price = int(order['platinum'])
 
-        return lowest_price
+@instrumented('item_orders')
+def fetch_order_book_summary(profile: str, item: str) -> OrderBookSummary:
+    """
+    Fetches the order book of an item and summarizes its online sell side while streaming it
+
+    Args:
+        profile (str): Our profile name on warframe.market (so we don't undercut ourselves)
+        item (str): Name of the item (e.g. mirage_prime_systems)
+
+    Returns:
+        OrderBookSummary: Lowest and median price and volume of the sell side
+    """
+
+    try:
+        with get_client().request('GET', f'/items/{item}/orders', stream=True) as response:
+            response.raise_for_status()
+            return summarize_sell_orders(response.iter_content(CHUNK_SIZE), profile)
 
     except HTTPError as http_err:
         print(f'HTTP Error occurred: {http_err}')
@@ -140,28 +309,63 @@ def find_lowest_price_for_item(profile: str, item: str) -> int:
         print(f'Error occurred: {err}')
 
 
-def delete_existing_order(auth_token: str, order: ExistingPrimeOrder) -> str:
+@instrumented('item_orders')
+def fetch_order_book_snapshot(item: str) -> OrderBookSnapshot:
+    """
+    Fetches the full order book of an item (both sides, every seller) into a compact snapshot
+
+    Args:
+        item (str): Name of the item (e.g. mirage_prime_systems)
+
+    Returns:
+        OrderBookSnapshot: Sorted snapshot of the book
+    """
+
+    try:
+        with get_client().request('GET', f'/items/{item}/orders', stream=True) as response:
+            response.raise_for_status()
+            return OrderBookSnapshot(iter_orders(response.iter_content(CHUNK_SIZE)))
+
+    except HTTPError as http_err:
+        print(f'HTTP Error occurred: {http_err}')
+    except Exception as err:
+        print(f'Error occurred: {err}')
+
+
+def get_order_book_snapshot(item: str) -> OrderBookSnapshot:
+    """
+    Returns the snapshot of an item, from the books shared for the run when there are any
+
+    Args:
+        item (str): Name of the item (e.g. mirage_prime_systems)
+
+    Returns:
+        OrderBookSnapshot: Snapshot of the book, or None when it could not be fetched
+    """
+
+    if _shared_books is not None:
+        return _shared_books.snapshot(item)[0]
+    return fetch_order_book_snapshot(item)
+
+
+@instrumented('delete_order')
+def delete_existing_order(auth_token: str, order: ExistingPrimeOrder, raise_errors: bool = False) -> str:
     """
     Deletes an existing warframe.warframe_market order
 
     Args:
         auth_token (str): JWT Authentication token
-        order (ExistingPrimeOrder): Order to be updated
+        order (ExistingPrimeOrder): Order to be deleted
+        raise_errors (bool): Raise failures instead of printing them, so the caller can retry
 
     Returns:
         str: Order ID of the deleted order
     """
 
     order_id = order.order_id
-    authorization_header = {
-        'Authorization': auth_token,
-    }
-
-    update_headers = warframe_market_standard_headers | authorization_header
 
     try:
-        sleep(DEFAULT_SLEEP)
-        response = requests.delete(f'{WARFRAME_MARKET_API}/profile/orders/{order_id}', headers=update_headers)
+        response = get_client().request('DELETE', f'/profile/orders/{order_id}', auth_token)
         response.raise_for_status()
         response_data = response.json()
         deleted_order = response_data['payload']['order_id']
@@ -169,54 +373,58 @@ def delete_existing_order(auth_token: str, order: ExistingPrimeOrder) -> str:
         return deleted_order
 
     except HTTPError as http_err:
+        if raise_errors:
+            raise
         print(f'HTTP Error occurred: {http_err}')
     except Exception as err:
+        if raise_errors:
+            raise
         print(f'Error occurred: {err}')
 
 
-def create_new_order(auth_token: str, item: NewPrimeOrder) -> str:
+@instrumented('create_order')
+def create_new_order(auth_token: str, item: NewPrimeOrder, raise_errors: bool = False) -> str:
     """
     Sells an item on warframe.warframe_market
 
     Args:
         auth_token (str): JWT Token
-        item (NewPrimeOrder): An object containing item_id, price and quantity
+        item (NewPrimeOrder): An object containing item_id, price, quantity and the rank for mods
+        raise_errors (bool): Raise failures instead of printing them, so the caller can retry
     Returns:
         str: Date that the sell order was accepted
     """
 
-    authorization_header = {
-        'Authorization': auth_token,
-    }
-
-    update_headers = warframe_market_standard_headers | authorization_header
-
     data = {
         'item_id': item.item_id,
         'order_type': 'sell',
         'platinum': item.price,
         'quantity': item.quantity,
     }
-    
-    mod_data = {
-        'mod_rank' : 0,
-    }
+
+    if item.rank is not None:
+        data['mod_rank'] = item.rank
 
     try:
-        sleep(DEFAULT_SLEEP)
-        response = requests.post(f'{WARFRAME_MARKET_API}/profile/orders', headers=update_headers, data=json.dumps(data))
+        response = get_client().request('POST', '/profile/orders', auth_token, data=json.dumps(data))
         response.raise_for_status()
         data = response.json()
         order_created = data['payload']['order']['creation_date']
         return order_created
 
     except HTTPError as http_err:
+        if raise_errors:
+            raise
         print(f'HTTP Error occurred: {http_err}')
     except Exception as err:
+        if raise_errors:
+            raise
         print(f'Error occurred: {err}')
 
 
-def update_existing_order(auth_token: str, order: ExistingPrimeOrder, price: int) -> str:
+@instrumented('update_order')
+def update_existing_order(auth_token: str, order: ExistingPrimeOrder, price: int, quantity: int = None,
+                          raise_errors: bool = False) -> str:
     """
     Updates an existing warframe.warframe_market order
 
@@ -224,37 +432,40 @@ def update_existing_order(auth_token: str, order: ExistingPrimeOrder, price: int
         auth_token (str): JWT Authentication token
         order (ExistingPrimeOrder): Order to be updated
         price (int): Target price
+        quantity (int): Target quantity (keeps the current quantity when omitted)
+        raise_errors (bool): Raise failures instead of printing them, so the caller can retry
 
     Returns:
         str: Timestamp of the updated order
     """
 
     order_id = order.order_id
-    authorization_header = {
-        'Authorization': auth_token,
-    }
-
-    update_headers = warframe_market_standard_headers | authorization_header
 
     data = {
         'platinum': price,
     }
 
+    if quantity is not None:
+        data['quantity'] = quantity
+
     try:
-        sleep(DEFAULT_SLEEP)
-        response = requests.put(f'{WARFRAME_MARKET_API}/profile/orders/{order_id}',
-                                headers=update_headers, data=json.dumps(data))
+        response = get_client().request('PUT', f'/profile/orders/{order_id}', auth_token, data=json.dumps(data))
         response.raise_for_status()
         response_data = response.json()
         confirmation_date = response_data['payload']['order']['last_update']
         return confirmation_date
 
     except HTTPError as http_err:
+        if raise_errors:
+            raise
         print(f'HTTP Error occurred: {http_err}')
     except Exception as err:
+        if raise_errors:
+            raise
         print(f'Error occurred: {err}')
 
 
+@instrumented('item')
 def get_item_id_from_market(item: str) -> str:
     """
     Return the id of an item when provided the name (e.g: hikou_prime_blueprint)
@@ -266,8 +477,7 @@ def get_item_id_from_market(item: str) -> str:
         str: ID of the item on warframe.warframe_market (e.g: '5a2feeb1c2c9e90cbdaa23d2')
     """
     try:
-        response = requests.get(f'{WARFRAME_MARKET_API}/items/{item}', headers=warframe_market_standard_headers)
-        sleep(DEFAULT_SLEEP)
+        response = get_client().request('GET', f'/items/{item}')
         response.raise_for_status()
         data = response.json()
         item_id = data['payload']['item']['id']
@@ -279,6 +489,51 @@ def get_item_id_from_market(item: str) -> str:
         print(f'Error occurred: {err}')
 
 
+@instrumented('catalogue_version')
+def get_catalogue_version() -> str:
+    """
+    Returns the current version of the warframe.market item list, which changes whenever items are added or edited
+
+    Returns:
+        str: Version hash of the item collection
+    """
+    try:
+        client = get_client()
+        response = client.request('GET', f'{client.v2_url}/versions')
+        response.raise_for_status()
+        return response.json()['data']['collections']['items']
+
+    except HTTPError as http_err:
+        print(f'HTTP Error occurred: {http_err}')
+    except Exception as err:
+        print(f'Error occurred: {err}')
+
+
+@instrumented('items')
+def get_all_items_from_market(etag: str = None) -> tuple[list[dict], str]:
+    """
+    Downloads the complete item list in a single request
+
+    Args:
+        etag (str): ETag of the previously downloaded list, to skip the download when nothing changed
+
+    Returns:
+        tuple[list[dict], str]: Items (None when unchanged since etag) and the ETag of the list
+    """
+    try:
+        client = get_client()
+        headers = {'If-None-Match': etag} if etag else {}
+        response = client.request('GET', f'{client.v2_url}/items', headers=headers)
+        if response.status_code == 304:
+            return None, etag
+        response.raise_for_status()
+        return response.json()['data'], response.headers.get('ETag')
+
+    except HTTPError as http_err:
+        print(f'HTTP Error occurred: {http_err}')
+    except Exception as err:
+        print(f'Error occurred: {err}')
+
 
 if __name__ == '__main__':
     # print(find_lowest_price_for_item('nekros_prime_systems', 'Kaeriyana'))